@@ -0,0 +1,186 @@
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from aiflib import codec
+from aiflib.config import Config
+from aiflib.formats import is_parquet
+from aiflib.logger import Logger, UiPathUsageException
+
+PREDICTION_COLUMN = "prediction"
+
+# Model of a scoring worker process, see _init_worker
+_worker_model = None
+
+
+def _init_worker(workers):
+    global _worker_model
+    from aiflib.model import Model
+    _worker_model = Model(is_infer_only = True)
+    # The workers share the CPU budget
+    _worker_model.limit_threads(workers)
+
+
+def _score_chunk(data):
+    return _worker_model.predict_array(data)
+
+
+class ChunkReader:
+    """
+    Reads input files in chunks of at most `chunk_rows` rows, decoded into the feature
+    matrix of the model (in training column order) and the optional id column.
+    Only the feature columns and the id column are parsed. Empty chunks are skipped.
+    """
+    def __init__(self, schema, chunk_rows, id_column = None):
+        self.config = Config()
+        self.schema = schema
+        self.chunk_rows = chunk_rows
+        self.id_column = id_column
+        # dtype of the id column in the input, known even when it has no rows
+        self.id_dtype = np.dtype(object)
+
+    def wanted(self, name):
+        return name == self.id_column or self.schema is None or name in self.schema.columns
+
+    def split(self, frame, path):
+        ids = None
+        if self.id_column is not None:
+            if self.id_column not in frame.columns:
+                raise UiPathUsageException(f"Id column [{self.id_column}] not found in [{path}]")
+            ids = frame[self.id_column].to_numpy()
+            self.id_dtype = ids.dtype
+            frame = frame.drop(columns = self.id_column)
+        if self.schema is None:
+            # Models trained before the feature list was saved expect the input columns in training order
+            frame = frame.drop(columns = self.config.target_column, errors = "ignore")
+            return frame.to_numpy(dtype = np.float64), ids
+        return codec.select_columns(frame, self.schema), ids
+
+    def read_csv(self, path):
+        chunks = pd.read_csv(path, chunksize = self.chunk_rows, usecols = self.wanted,
+                             delimiter = self.config.delimiter, encoding = self.config.encoding)
+        for frame in chunks:
+            yield self.split(frame, path)
+
+    def read_parquet(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise UiPathUsageException("Parquet input requires the optional [pyarrow] package.")
+
+        parquet = pq.ParquetFile(path)
+        columns = [name for name in parquet.schema_arrow.names if self.wanted(name)]
+        if self.id_column in columns:
+            self.id_dtype = np.dtype(parquet.schema_arrow.field(self.id_column).type.to_pandas_dtype())
+        for batch in parquet.iter_batches(batch_size = self.chunk_rows, columns = columns):
+            table = pa.Table.from_batches([batch])
+            ids = None
+            if self.id_column is not None:
+                if self.id_column not in table.column_names:
+                    raise UiPathUsageException(f"Id column [{self.id_column}] not found in [{path}]")
+                ids = table.column(self.id_column).to_numpy(zero_copy_only = False)
+                table = table.drop([self.id_column])
+            yield codec.arrow_table_to_array(table, self.schema), ids
+
+    def read(self, paths):
+        for path in paths:
+            reader = self.read_parquet if is_parquet(path) else self.read_csv
+            for data, ids in reader(path):
+                # A CSV file with a header only is read as one empty chunk
+                if len(data):
+                    yield data, ids
+
+
+class PredictionWriter:
+    """Appends predictions chunk by chunk to a CSV or Parquet file."""
+    def __init__(self, path, id_column = None):
+        self.config = Config()
+        self.path = path
+        self.id_column = id_column
+        self.rows = 0
+        self._parquet_writer = None
+        if os.path.isfile(path):
+            os.remove(path)
+
+    def frame(self, predictions, ids):
+        columns = {}
+        if self.id_column is not None:
+            columns[self.id_column] = ids
+        columns[PREDICTION_COLUMN] = predictions
+        return pd.DataFrame(columns)
+
+    def write(self, predictions, ids = None):
+        frame = self.frame(predictions, ids)
+        if is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index = False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode = "a", header = self.rows == 0, index = False, sep = self.config.delimiter)
+        self.rows += len(frame)
+
+    def close(self, id_dtype = object):
+        """An empty input gives a CSV header only or an empty Parquet table, with ids of `id_dtype`."""
+        if self.rows == 0 and self._parquet_writer is None:
+            self.write(np.empty(0), np.empty(0, dtype = id_dtype))
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def score_files(paths, output_path, id_column = None, workers = None, chunk_rows = None):
+    """
+    Stream the rows of CSV / Parquet files through the trained pipeline and write the
+    predictions to `output_path` (CSV, or Parquet by extension) in input order.
+
+    Chunks are scored by a pool of `workers` processes forked after the model is
+    loaded. At most two chunks per worker are read ahead of the writer, so memory
+    stays bounded by the chunk size whatever the size of the input.
+    """
+    from aiflib.model import preload
+    config = Config()
+    logger = Logger(__name__)
+    workers = workers or config.score_workers
+    chunk_rows = chunk_rows or config.score_chunk_rows
+
+    model = preload()
+    if not model.is_trained():
+        raise UiPathUsageException("Batch scoring requires a trained model in the model/ folder.")
+    reader = ChunkReader(model.input_schema, chunk_rows, id_column)
+    writer = PredictionWriter(output_path, id_column)
+
+    start = perf_counter()
+    try:
+        if workers <= 1:
+            for data, ids in reader.read(paths):
+                writer.write(model.predict_array(data), ids)
+                logger.verbose(f"Scored [{writer.rows}] rows")
+        else:
+            # Forked workers share the preloaded model with this process
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(workers, mp_context = context, initializer = _init_worker,
+                                     initargs = (workers,)) as pool:
+                pending = deque()
+                for data, ids in reader.read(paths):
+                    pending.append((pool.submit(_score_chunk, data), ids))
+                    if len(pending) >= 2 * workers:
+                        future, chunk_ids = pending.popleft()
+                        writer.write(future.result(), chunk_ids)
+                        logger.verbose(f"Scored [{writer.rows}] rows")
+                while pending:
+                    future, chunk_ids = pending.popleft()
+                    writer.write(future.result(), chunk_ids)
+    finally:
+        writer.close(reader.id_dtype)
+
+    elapsed = perf_counter() - start
+    logger.info(f"Scored [{writer.rows}] rows in [{elapsed:.1f}] seconds "
+                f"([{writer.rows / max(elapsed, 1e-9):.0f}] rows/sec), predictions written to [{output_path}]")
+    return writer.rows
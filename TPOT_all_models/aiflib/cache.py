@@ -0,0 +1,102 @@
+import threading
+import numpy as np
+
+from collections import OrderedDict
+from time import monotonic
+
+
+def row_keys(data):
+    """
+    One key per row: the bytes of the row as float64, with -0.0 written as 0.0 and
+    every NaN written as the same NaN, so that rows which predict the same get the
+    same key. The dict holding the entries hashes these keys.
+    """
+    rows = np.ascontiguousarray(data, dtype = np.float64) + 0.
+    if rows.ndim == 1:
+        rows = rows.reshape(1, -1)
+    missing = np.isnan(rows)
+    if missing.any():
+        rows[missing] = np.nan
+    buffer, width = rows.tobytes(), rows.shape[1] * rows.itemsize
+    return [buffer[start:start + width] for start in range(0, len(buffer), width)]
+
+
+class PredictionCache:
+    """
+    In-process LRU cache of the prediction of single rows.
+
+    At most `max_rows` predictions are kept, the least recently used are evicted
+    first. Predictions older than `ttl` seconds are recomputed (ttl = 0: no expiry).
+    The cache belongs to one version of the model, see `clear`.
+    """
+    def __init__(self, max_rows, ttl = 0.):
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self, version = None):
+        """Drop every entry, e.g. because the model they were predicted by has changed."""
+        with self._lock:
+            self._entries.clear()
+            self.version = version
+
+    def predict(self, data, predict):
+        """
+        Predictions for the rows of `data`, calling `predict` only on the rows that are
+        not cached. A row repeated within `data` is predicted once.
+        """
+        keys = row_keys(data)
+        predictions = np.empty(len(keys), dtype = np.float64)
+        missed = {}
+        now = monotonic()
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if entry[1] is None or entry[1] > now:
+                        self._entries.move_to_end(key)
+                        predictions[i] = entry[0]
+                        self.hits += 1
+                        continue
+                    del self._entries[key]
+                    self.expirations += 1
+                self.misses += 1
+                missed.setdefault(key, []).append(i)
+
+        if not missed:
+            return predictions
+
+        # Score the first occurrence of every missed row
+        first = np.fromiter((rows[0] for rows in missed.values()), dtype = np.intp, count = len(missed))
+        scored = np.asarray(predict(np.asarray(data)[first]), dtype = np.float64).ravel()
+
+        expires = now + self.ttl if self.ttl > 0 else None
+        with self._lock:
+            for (key, rows), value in zip(missed.items(), scored):
+                predictions[rows] = value
+                self._entries[key] = (value, expires)
+            while len(self._entries) > self.max_rows:
+                self._entries.popitem(last = False)
+                self.evictions += 1
+        return predictions
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "rows": len(self._entries),
+            "max_rows": self.max_rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,279 @@
+import io
+import json
+import numpy as np
+
+from itertools import chain
+from operator import itemgetter
+
+from aiflib.logger import UiPathUsageException
+
+# Payload formats understood by Model.predict
+JSON = "json"
+NPY = "npy"
+ARROW = "arrow"
+
+_NPY_MAGIC = b"\x93NUMPY"
+_ARROW_FILE_MAGIC = b"ARROW1"
+_ARROW_STREAM_MAGIC = b"\xff\xff\xff\xff"
+
+
+def detect_input_format(payload):
+    """
+    Guess the format of a prediction payload from its leading bytes.
+    Text payloads and anything that is not recognised as binary are JSON.
+    """
+    if not isinstance(payload, (bytes, bytearray, memoryview)):
+        return JSON
+    head = bytes(payload[:8])
+    if head.startswith(_NPY_MAGIC):
+        return NPY
+    if head.startswith(_ARROW_FILE_MAGIC) or head.startswith(_ARROW_STREAM_MAGIC):
+        return ARROW
+    return JSON
+
+
+class InputSchema:
+    """
+    Training feature columns, in the order the fitted pipeline expects them.
+
+    Missing features are filled with NaN (and later imputed) when fill_missing
+    is set, and rejected otherwise.
+    """
+    def __init__(self, columns, dtype=np.float64, fill_missing=True):
+        self.columns = list(columns)
+        self.dtype = np.dtype(dtype)
+        self.fill_missing = fill_missing
+        if len(self.columns) == 1:
+            name = self.columns[0]
+            self.row_getter = lambda record: (record[name],)
+        else:
+            self.row_getter = itemgetter(*self.columns)
+
+    def missing_feature(self, name):
+        return UiPathUsageException(f"Input is missing feature [{name}] and missing features are rejected "
+                                    f"by this model. Expected features: {self.columns}")
+
+
+def decode_records(records, schema):
+    """
+    Parse a list of JSON records straight into a matrix in training column order.
+    Keys that are not training features are ignored.
+    """
+    n_rows, n_columns = len(records), len(schema.columns)
+    try:
+        # Fast path: every record holds every feature as a number
+        values = chain.from_iterable(map(schema.row_getter, records))
+        data = np.fromiter(values, dtype=schema.dtype, count=n_rows * n_columns)
+        return data.reshape(n_rows, n_columns)
+    except (KeyError, TypeError, ValueError):
+        pass
+
+    # Slow path: missing keys, nulls or numbers sent as strings, filled column by column
+    data = np.empty((n_rows, n_columns), dtype=schema.dtype)
+    for i, name in enumerate(schema.columns):
+        if schema.fill_missing:
+            data[:, i] = [record.get(name) for record in records]
+        else:
+            try:
+                data[:, i] = [record[name] for record in records]
+            except KeyError:
+                raise schema.missing_feature(name)
+    return data
+
+
+def decode_json(payload, schema=None):
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        payload = bytes(payload).decode("utf-8")
+    if schema is not None:
+        records = json.loads(payload)
+        if isinstance(records, list) and all(isinstance(record, dict) for record in records):
+            return decode_records(records, schema)
+
+    # Other orientations understood by pandas, which the record decoder does not need
+    import pandas as pd
+    frame = pd.read_json(io.StringIO(payload))
+    if schema is None:
+        return frame.values
+    return select_columns(frame, schema)
+
+
+def select_columns(frame, schema):
+    if not schema.fill_missing:
+        for name in schema.columns:
+            if name not in frame.columns:
+                raise schema.missing_feature(name)
+    return frame.reindex(columns=schema.columns).to_numpy(dtype=schema.dtype)
+
+
+def decode_npy(payload, schema=None):
+    """
+    Wrap a .npy payload without copying it. The columns must be in training order.
+    """
+    buffer = io.BytesIO(payload)
+    version = np.lib.format.read_magic(buffer)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(buffer)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(buffer)
+    else:
+        return np.atleast_2d(np.load(io.BytesIO(payload), allow_pickle=False))
+    if dtype.hasobject:
+        raise UiPathUsageException("Binary input must hold a numeric array, got dtype [object].")
+    count = int(np.prod(shape)) if shape else 1
+    data = np.frombuffer(payload, dtype=dtype, count=count, offset=buffer.tell())
+    data = data.reshape(shape, order="F" if fortran_order else "C")
+    if data.ndim == 1:
+        data = data.reshape(1, -1)
+    if schema is not None and data.shape[1] != len(schema.columns):
+        raise UiPathUsageException(f"Binary input has [{data.shape[1]}] columns, the model expects "
+                                   f"[{len(schema.columns)}] features in the order {schema.columns}")
+    return data
+
+
+def read_arrow_table(payload):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise UiPathUsageException("Arrow input requires the optional [pyarrow] package.")
+
+    source = pa.py_buffer(payload)
+    if bytes(payload[:6]) == _ARROW_FILE_MAGIC:
+        return pa.ipc.open_file(source).read_all()
+    return pa.ipc.open_stream(source).read_all()
+
+
+def arrow_table_to_array(table, schema=None):
+    """
+    Copy the columns of an Arrow table once into a column-major float matrix.
+    Nulls become NaN so they reach the imputer of the fitted pipeline.
+    """
+    if schema is None:
+        schema = InputSchema(table.column_names)
+    data = np.empty((table.num_rows, len(schema.columns)), dtype=schema.dtype, order="F")
+    for i, name in enumerate(schema.columns):
+        if name in table.column_names:
+            data[:, i] = table.column(name).to_numpy(zero_copy_only=False)
+        elif schema.fill_missing:
+            data[:, i] = np.nan
+        else:
+            raise schema.missing_feature(name)
+    return data
+
+
+def decode_arrow(payload, schema=None):
+    return arrow_table_to_array(read_arrow_table(payload), schema)
+
+
+_DECODERS = {
+    JSON: decode_json,
+    NPY: decode_npy,
+    ARROW: decode_arrow,
+}
+
+
+def decode_input(payload, schema=None):
+    return _DECODERS[detect_input_format(payload)](payload, schema)
+
+
+def encode_npy(data):
+    """Serialize a matrix as a .npy payload accepted by Model.predict."""
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(data), allow_pickle=False)
+    return buffer.getvalue()
+
+
+# Response formats of Model.predict
+FLOAT32 = "float32"
+FLOAT64 = "float64"
+
+OUTPUT_FORMATS = [JSON, FLOAT32, FLOAT64, ARROW]
+CONTENT_TYPES = {
+    JSON: "application/json",
+    FLOAT32: "application/octet-stream",
+    FLOAT64: "application/octet-stream",
+    ARROW: "application/vnd.apache.arrow.stream",
+}
+
+_DIGITS = np.frombuffer(b"0123456789", dtype=np.uint8)
+_POWERS_OF_TEN = 10 ** np.arange(19, dtype=np.int64)
+# Below this many values json.dumps is faster than the vectorized encoder
+_VECTORIZED_MIN_SIZE = 400
+
+
+def encode_json_floats(values, precision):
+    """
+    JSON array of `values` rounded to `precision` decimals (trailing zeros dropped),
+    written digit by digit with array operations instead of one Python float per value.
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    scale = 10. ** precision
+    if (len(values) < _VECTORIZED_MIN_SIZE or not np.isfinite(values).all()
+            or np.abs(values).max() * scale >= 9e18):
+        # Small batches, NaN, infinity and numbers too large for int64 are written by json.dumps
+        return json.dumps(np.round(values, precision).tolist())
+
+    scaled = np.rint(np.abs(values) * scale).astype(np.int64)
+    negative = (values < 0) & (scaled != 0)
+    # Digits written per value, with leading zeros up to the units digit
+    n_digits = np.maximum(np.searchsorted(_POWERS_OF_TEN, scaled, side="right"), precision + 1)
+    # Trailing zeros of the decimals are not written
+    trailing = np.zeros(len(values), dtype=np.int64)
+    quotient = scaled.copy()
+    for k in range(precision):
+        next_quotient = quotient // 10
+        trailing += (trailing == k) & (quotient == next_quotient * 10)
+        quotient = next_quotient
+    decimals = precision - trailing
+
+    lengths = negative + (n_digits - precision) + np.where(decimals > 0, decimals + 1, 0)
+    # Each value is followed by a comma, the last one by the closing bracket
+    starts = np.empty(len(values), dtype=np.int64)
+    starts[0] = 1
+    np.cumsum(lengths[:-1] + 1, out=starts[1:])
+    starts[1:] += 1
+    size = int(starts[-1] + lengths[-1]) + 1
+    # One spare byte at the end receives the digits that are not written
+    buffer = np.empty(size + 1, dtype=np.uint8)
+    buffer[0], buffer[size - 1] = ord("["), ord("]")
+    buffer[(starts + lengths)[:-1]] = ord(",")
+    buffer[starts[negative]] = ord("-")
+
+    units = starts + negative + n_digits - precision - 1
+    buffer[units[decimals > 0] + 1] = ord(".")
+    quotient = scaled.copy()
+    for k in range(int(n_digits.max())):
+        # Decimal digits sit one position further right, after the point
+        position = units + (precision - k + (k < precision))
+        position[(k >= n_digits) | (k < trailing)] = size
+        # Integer division by a constant is much faster than the remainder in NumPy
+        next_quotient = quotient // 10
+        buffer[position] = _DIGITS[quotient - next_quotient * 10]
+        quotient = next_quotient
+    return buffer[:size].tobytes().decode("ascii")
+
+
+def encode_predictions(predictions, output_format=JSON, precision=0):
+    """
+    Serialize predictions as a JSON list (shortest round-trip representation when
+    precision is 0), raw little-endian float32 / float64 values or an Arrow IPC
+    stream with a single "prediction" column.
+    """
+    if output_format == JSON:
+        if precision > 0:
+            return encode_json_floats(predictions, precision)
+        return json.dumps(predictions.tolist())
+    if output_format == FLOAT32:
+        return np.ascontiguousarray(predictions, dtype="<f4").tobytes()
+    if output_format == FLOAT64:
+        return np.ascontiguousarray(predictions, dtype="<f8").tobytes()
+    if output_format == ARROW:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise UiPathUsageException("Arrow output requires the optional [pyarrow] package.")
+        table = pa.table({"prediction": np.asarray(predictions, dtype=np.float64).ravel()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    raise UiPathUsageException(f"Output format must be one of {OUTPUT_FORMATS}, got [{output_format}]")
@@ -0,0 +1,159 @@
+import numpy as np
+
+from sklearn.pipeline import Pipeline
+from aiflib import trees
+
+# Estimators whose prediction is X @ coef_ + intercept_
+_LINEAR_MODELS = set([
+    "RidgeCV", "ElasticNetCV", "LassoLarsCV", "LinearSVR", "SGDRegressor",
+    "Ridge", "ElasticNet", "Lasso", "LassoLars", "LinearRegression",
+])
+
+
+class UnsupportedStep(Exception):
+    pass
+
+
+def flatten_steps(estimator):
+    """List the estimators of a (possibly nested) pipeline in the order they are applied."""
+    if isinstance(estimator, Pipeline):
+        steps = []
+        for _, step in estimator.steps:
+            if step is None or step == "passthrough":
+                continue
+            steps.extend(flatten_steps(step))
+        return steps
+    return [estimator]
+
+
+class AffineModel:
+    """
+    A chain of imputer, per-feature scalers and a linear model folded into
+    predictions = fill_nan(X) @ coef + intercept.
+    """
+    def __init__(self, fill_values, coef, intercept):
+        self.fill_values = fill_values
+        self.coef = coef
+        self.intercept = intercept
+
+    def predict(self, X):
+        X = np.asarray(X)
+        missing = np.isnan(X)
+        if missing.any():
+            X = np.where(missing, self.fill_values, X)
+        return X @ self.coef + self.intercept
+
+
+class _AffineFolder:
+    """
+    Tracks the transform applied so far to every feature as x' = scale * x + shift.
+    """
+    def __init__(self, n_features):
+        self.scale = np.ones(n_features)
+        self.shift = np.zeros(n_features)
+        self.fill_values = None
+
+    def then(self, scale, shift):
+        self.scale = self.scale * scale
+        self.shift = self.shift * scale + shift
+
+    def impute(self, imputer):
+        if getattr(imputer, "add_indicator", False) or np.isnan(imputer.statistics_).any():
+            # The indicator adds columns and all-NaN columns are dropped by the imputer
+            raise UnsupportedStep("SimpleImputer with indicator or dropped columns")
+        if self.fill_values is not None:
+            # NaN were already filled by an earlier imputer
+            return
+        if (self.scale == 0).any():
+            raise UnsupportedStep("SimpleImputer after a constant feature")
+        # Fill values of the original (unscaled) features
+        self.fill_values = (imputer.statistics_ - self.shift) / self.scale
+
+    def apply(self, step):
+        name = type(step).__name__
+        if name == "SimpleImputer":
+            self.impute(step)
+        elif name == "StandardScaler":
+            # mean_ is fitted even with with_mean=False, where it is not subtracted
+            mean = step.mean_ if step.with_mean and step.mean_ is not None else 0.
+            scale = step.scale_ if step.with_std and step.scale_ is not None else 1.
+            self.then(1. / scale, -mean / scale)
+        elif name == "RobustScaler":
+            center = step.center_ if step.with_centering and step.center_ is not None else 0.
+            scale = step.scale_ if step.with_scaling and step.scale_ is not None else 1.
+            self.then(1. / scale, -center / scale)
+        elif name == "MinMaxScaler":
+            if getattr(step, "clip", False):
+                raise UnsupportedStep("MinMaxScaler with clip=True")
+            self.then(step.scale_, step.min_)
+        elif name == "MaxAbsScaler":
+            self.then(1. / step.scale_, 0.)
+        else:
+            raise UnsupportedStep(name)
+
+    def finish(self, estimator):
+        name = type(estimator).__name__
+        if name not in _LINEAR_MODELS:
+            raise UnsupportedStep(name)
+        coef = np.asarray(estimator.coef_, dtype = np.float64)
+        if coef.ndim != 1:
+            raise UnsupportedStep(f"{name} with multiple targets")
+        intercept = float(np.ravel(estimator.intercept_)[0]) if np.size(estimator.intercept_) else 0.
+        fill_values = self.fill_values if self.fill_values is not None else np.full(len(coef), np.nan)
+        return AffineModel(
+            fill_values = fill_values,
+            coef = self.scale * coef,
+            intercept = float(self.shift @ coef) + intercept,
+            )
+
+
+def compile_affine(steps, n_features):
+    folder = _AffineFolder(n_features)
+    for step in steps[:-1]:
+        folder.apply(step)
+    return folder.finish(steps[-1])
+
+
+def compile_trees(steps):
+    """
+    Keep the transformers of the pipeline and flatten its final tree model.
+    """
+    try:
+        ensemble = trees.FlatTreeEnsemble.from_estimator(steps[-1])
+    except ValueError as e:
+        raise UnsupportedStep(str(e))
+    return trees.TreeEnsemblePipeline(steps[:-1], ensemble)
+
+
+def compile_pipeline(pipeline, X_check, logger = None, rtol = 1e-6):
+    """
+    Export a fitted pipeline to a precomputed kernel with the same predictions.
+
+    Returns None when the pipeline has a step that cannot be compiled or when the
+    kernel does not reproduce the predictions of the pipeline on X_check, in which
+    case the sklearn pipeline should be used.
+    """
+    steps = flatten_steps(pipeline)
+    try:
+        if trees.is_supported(steps[-1]):
+            compiled = compile_trees(steps)
+        else:
+            compiled = compile_affine(steps, X_check.shape[1])
+    except (UnsupportedStep, AttributeError) as e:
+        if logger is not None:
+            logger.info(f"Pipeline cannot be compiled, unsupported step [{e}]. Using the scikit-learn pipeline.")
+        return None
+
+    # Equivalence check against the scikit-learn pipeline
+    expected = pipeline.predict(X_check)
+    actual = compiled.predict(X_check)
+    tolerance = rtol * max(1., float(np.max(np.abs(expected))) if len(expected) else 1.)
+    if not np.allclose(actual, expected, rtol = rtol, atol = tolerance):
+        if logger is not None:
+            logger.info("Compiled pipeline does not reproduce the scikit-learn predictions. "
+                        "Using the scikit-learn pipeline.")
+        return None
+
+    if logger is not None:
+        logger.info(f"Compiled pipeline to [{type(compiled).__name__}].")
+    return compiled
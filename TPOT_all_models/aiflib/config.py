@@ -1,7 +1,9 @@
+import json
 import logging
 import os
 import numpy as np
 from functools import partial
+from aiflib.cpu_budget import available_cpus
 
 class ConfigValidator:
     class __Singleton:
@@ -71,6 +73,29 @@ def os_param(name, default, condition, message):
         return os.environ[name]
     return os.environ.get(name, default)
 
+def os_json(name, default, condition, message):
+    if name in os.environ:
+        try:
+            value = json.loads(os.environ[name])
+        except ValueError:
+            ConfigValidator().log(f"Bad usage, parameter [{name}] should be parseable as JSON defaulting to value [{default}]")
+            return default
+        if not condition(value):
+            ConfigValidator().log(f"Bad usage, parameter [{name}], {message}, defaulting to [{default}]")
+            return default
+        return value
+    return default
+
+_ROW_FILTER_OPERATORS = {"==": 1, "!=": 1, "<": 1, "<=": 1, ">": 1, ">=": 1, "in": 1, "not in": 1, "is null": 0, "not null": 0}
+
+def is_row_filter(value):
+    """A list of [column, operator] or [column, operator, value] conditions."""
+    return isinstance(value, list) and all(
+        isinstance(condition, list) and len(condition) >= 2 and isinstance(condition[0], str)
+        and condition[1] in _ROW_FILTER_OPERATORS and len(condition) == 2 + _ROW_FILTER_OPERATORS[condition[1]]
+        and (condition[1] not in ("in", "not in") or isinstance(condition[2], list))
+        for condition in value)
+
 def os_flag(name, default="false"):
     if name in os.environ:
         if os.environ[name].lower() not in ["true", "false"]:
@@ -88,6 +113,19 @@ class Config:
         "target_column", "csv_name", "encoding", "encoding", "scoring", "max_time_mins", "warm_start",
         "generations", "population_size", "offspring_size", "mutation_rate", "crossover_rate",
         "cv", "subsample", "max_eval_time_mins", "early_stop", "random_seed", "percentage_evaluate",
+        "search_space_pruning", "search_fidelity", "halving_factor", "halving_min_rows",
+        "pipeline_score_cache", "pipeline_score_cache_max_entries",
+        "min_gain_per_min", "gain_window", "reserve_refit_time",
+        "executor", "executor_workers", "worker_threads", "worker_memory_mb", "dask_scheduler_address",
+        "shared_training_data", "shared_data_directory",
+        "missing_features", "input_dtype", "batch_max_size", "batch_max_wait_ms", "batch_max_queue",
+        "request_timeout_ms", "compile_pipeline", "tree_engine_max_rows",
+        "mmap_model", "prediction_cache_size", "prediction_cache_ttl", "score_workers", "score_chunk_rows",
+        "output_format", "output_precision", "read_workers", "predict_threads",
+        "dataset_cache", "dataset_cache_max_mb", "data_dtype",
+        "search_subdirectories", "row_filter",
+        "fused_pipeline", "write_split_csv", "split_format", "split_checksum",
+        "search_sample", "search_sample_rows", "search_strata", "refit_sample_rows", "refit_partial_fit",
     ])
 
     def __init__(self):
@@ -113,6 +151,56 @@ class Config:
         self.encoding = os_param(
             "encoding", "utf-8", unconditional, ""
         )
+        # Data files are found by extension, see aiflib/readers.py
+        self.search_subdirectories = os_flag(
+            "search_subdirectories", "true"
+        )
+        # Rows read, e.g. [["target", "not null"], ["region", "in", ["eu", "us"]], ["f1", ">=", 0]]
+        self.row_filter = os_json(
+            "row_filter", None, is_row_filter,
+            "row filter must be a JSON list of [column, operator] or [column, operator, value] conditions, "
+            f"operators are {list(_ROW_FILTER_OPERATORS)}"
+        )
+        self.read_workers = os_int(
+            "read_workers", available_cpus(), lambda x: x > 0,
+            "number of processes parsing csv files must be greater than 0"
+        )
+        # Numeric feature columns are stored as float32 when it is lossless ("auto") or always ("float32")
+        permissible_data_dtypes = ["auto", "float32", "float64"]
+        self.data_dtype = os_param(
+            "data_dtype", "auto", lambda x: x in permissible_data_dtypes,
+            f"dtype of the feature columns must be one of [{permissible_data_dtypes}]"
+        )
+        # Parsed csv files are kept in artifacts_directory/dataset_cache, off by default as the
+        # artifacts directory is uploaded with the trained model
+        self.dataset_cache = os_flag(
+            "dataset_cache", "false"
+        )
+        self.dataset_cache_max_mb = os_int(
+            "dataset_cache_max_mb", 2048, lambda x: x >= 0,
+            "size of the dataset cache in MB must be greater than or equal to 0"
+        )
+        # Streaming training mode: the pipeline search runs on a sample drawn while reading the files
+        permissible_search_samples = ["none", "uniform", "stratified"]
+        self.search_sample = os_param(
+            "search_sample", "none", lambda x: x in permissible_search_samples,
+            f"sampling of the training data for the pipeline search must be one of [{permissible_search_samples}]"
+        )
+        self.search_sample_rows = os_int(
+            "search_sample_rows", 100000, lambda x: x > 0,
+            "number of rows sampled for the pipeline search must be greater than 0"
+        )
+        self.search_strata = os_int(
+            "search_strata", 10, lambda x: x >= 2 and x <= 1000,
+            "number of target quantile bins of a stratified sample must be between 2 and 1000"
+        )
+        self.refit_sample_rows = os_int(
+            "refit_sample_rows", 1000000, lambda x: x >= 0,
+            "number of rows sampled to refit the best pipeline on must be greater than or equal to 0"
+        )
+        self.refit_partial_fit = os_flag(
+            "refit_partial_fit", "true"
+        )
         #####################################
         #       Basic model parameters      #
         #####################################
@@ -130,6 +218,9 @@ class Config:
         self.warm_start = os_flag(
             "warm_start", "false"
         )
+        self.compile_pipeline = os_flag(
+            "compile_pipeline", "false"
+        )
 
         #####################################
         #     Advanced model parameters     #
@@ -173,6 +264,73 @@ class Config:
         )
         self.seed = os_int(
             "random_seed", 0, unconditional, "")
+        # The search ends once the best score gains less than min_gain_per_min of itself per minute
+        self.min_gain_per_min = os_float(
+            "min_gain_per_min", 0.0, lambda x: x >= 0,
+            "relative gain of the best score per minute must be greater than or equal to 0 (0 = never stop)"
+        )
+        self.gain_window = os_int(
+            "gain_window", 3, lambda x: x > 0,
+            "number of generations the gain per minute is measured over must be greater than 0"
+        )
+        # Part of max_time_mins is kept for fitting the best pipeline after the search
+        self.reserve_refit_time = os_flag(
+            "reserve_refit_time", "true"
+        )
+        # "halving" scores the pipelines of a generation by successive halving over growing row budgets
+        permissible_search_fidelities = ["full", "halving"]
+        self.search_fidelity = os_param(
+            "search_fidelity", "full", lambda x: x in permissible_search_fidelities,
+            f"evaluation of the candidate pipelines must be one of [{permissible_search_fidelities}]"
+        )
+        self.halving_factor = os_int(
+            "halving_factor", 3, lambda x: x >= 2 and x <= 10,
+            "fraction of pipelines promoted to the next rung of successive halving must be an integer between 2 and 10"
+        )
+        self.halving_min_rows = os_int(
+            "halving_min_rows", 1000, lambda x: x > 0,
+            "number of rows of the first rung of successive halving must be greater than 0"
+        )
+        # Scores of evaluated pipelines are kept across runs in artifacts_directory/pipeline_scores.sqlite
+        self.pipeline_score_cache = os_flag(
+            "pipeline_score_cache", "true"
+        )
+        self.pipeline_score_cache_max_entries = os_int(
+            "pipeline_score_cache_max_entries", 100000, lambda x: x > 0,
+            "number of cached pipeline scores must be greater than 0"
+        )
+        # Where the pipelines of the search are cross-validated, see aiflib/executors.py
+        permissible_executors = ["local", "dask", "isolated"]
+        self.executor = os_param(
+            "executor", "local", lambda x: x in permissible_executors,
+            f"executor of the pipeline search must be one of [{permissible_executors}]"
+        )
+        self.executor_workers = os_int(
+            "executor_workers", 0, lambda x: x >= 0,
+            "number of workers evaluating pipelines must be greater than or equal to 0 (0 = as many as the CPU budget allows)"
+        )
+        self.worker_threads = os_int(
+            "worker_threads", 1, lambda x: x >= 0,
+            "number of threads of a worker evaluating pipelines must be greater than or equal to 0 (0 = the CPU budget divided among the workers)"
+        )
+        self.worker_memory_mb = os_int(
+            "worker_memory_mb", 0, lambda x: x >= 0,
+            "memory limit of a worker evaluating pipelines in MB must be greater than or equal to 0 (0 = no limit)"
+        )
+        self.dask_scheduler_address = os_param(
+            "dask_scheduler_address", "", unconditional, ""
+        )
+        # Training data and folds are written once to memory-mapped files the workers read from
+        self.shared_training_data = os_flag(
+            "shared_training_data", "true"
+        )
+        self.shared_data_directory = os_param(
+            "shared_data_directory", "", unconditional, ""
+        )
+        # Operators too expensive or useless for the profiled training data are left out of the search
+        self.search_space_pruning = os_flag(
+            "search_space_pruning", "true"
+        )
 
         #####################################
         #      Process Data Parameters      #
@@ -204,7 +362,107 @@ class Config:
         
         # Check if test data has been selected from the UI
         self.test_data_from_ui = not is_folder_empty(self.test_data_directory)
+
+        # The split of process_data is kept in memory and read by train and evaluate in the same process
+        self.fused_pipeline = os_flag(
+            "fused_pipeline", "true"
+        )
+        # File format and checksum of train / test split files, read back natively by the DataManager
+        permissible_split_formats = ["csv", "csv.gz", "csv.zst", "parquet"]
+        self.split_format = os_param(
+            "split_format", "csv", lambda x: x in permissible_split_formats,
+            f"file format of the train and test split must be one of [{permissible_split_formats}]"
+        )
+        permissible_checksums = ["md5", "blake2b", "crc32", "xxhash", "none"]
+        self.split_checksum = os_param(
+            "split_checksum", "md5", lambda x: x in permissible_checksums,
+            f"checksum of the train and test split files must be one of [{permissible_checksums}]"
+        )
+        permissible_split_csv_writes = ["async", "sync", "false"]
+        self.write_split_csv = os_param(
+            "write_split_csv", "async", lambda x: x in permissible_split_csv_writes,
+            f"writing of train.csv and test.csv in a fused pipeline must be one of [{permissible_split_csv_writes}]"
+        )
         
+        #####################################
+        #        Inference Parameters       #
+        #####################################
+
+        permissible_missing_features = ["nan", "reject"]
+        self.missing_features = os_param(
+            "missing_features", "nan", lambda x: x in permissible_missing_features,
+            f"handling of features missing from the prediction input must be one of [{permissible_missing_features}]"
+        )
+        # "auto" decodes the prediction input to the dtype the model was trained on
+        permissible_input_dtypes = ["auto", "float64", "float32"]
+        self.input_dtype = os_param(
+            "input_dtype", "auto", lambda x: x in permissible_input_dtypes,
+            f"dtype of the decoded prediction input must be one of [{permissible_input_dtypes}]"
+        )
+        permissible_output_formats = ["json", "float32", "float64", "arrow"]
+        self.output_format = os_param(
+            "output_format", "json", lambda x: x in permissible_output_formats,
+            f"format of the predictions returned must be one of [{permissible_output_formats}]"
+        )
+        self.output_precision = os_int(
+            "output_precision", 0, lambda x: 0 <= x <= 15,
+            "number of decimals of JSON predictions must be between 0 and 15 (0 = shortest exact representation)"
+        )
+
+        # The flattened tree engine outruns scikit-learn on small batches only
+        self.tree_engine_max_rows = os_int(
+            "tree_engine_max_rows", 100, lambda x: x >= 0,
+            "largest batch predicted with the tree engine must be greater than or equal to 0"
+        )
+
+        self.mmap_model = os_flag(
+            "mmap_model", "true"
+        )
+
+        # BLAS / OpenMP threads of a serving or batch scoring process
+        self.predict_threads = os_int(
+            "predict_threads", 0, lambda x: x >= 0,
+            "number of threads of a prediction process must be greater than or equal to 0 (0 = the CPU budget divided among the processes)"
+        )
+
+        # Row-level prediction cache, disabled when its size is 0
+        self.prediction_cache_size = os_int(
+            "prediction_cache_size", 0, lambda x: x >= 0,
+            "number of cached prediction rows must be greater than or equal to 0"
+        )
+        self.prediction_cache_ttl = os_float(
+            "prediction_cache_ttl", 0.0, lambda x: x >= 0,
+            "lifetime of cached predictions in seconds must be greater than or equal to 0 (0 = no expiry)"
+        )
+
+        # Batch scoring of files with score.py
+        self.score_workers = os_int(
+            "score_workers", available_cpus(), lambda x: x > 0,
+            "number of batch scoring processes must be greater than 0"
+        )
+        self.score_chunk_rows = os_int(
+            "score_chunk_rows", 100000, lambda x: x > 0,
+            "number of rows per batch scoring chunk must be greater than 0"
+        )
+
+        # Micro-batching of concurrent requests by the asyncio serving layer
+        self.batch_max_size = os_int(
+            "batch_max_size", 256, lambda x: x > 0,
+            "maximum number of rows in a prediction batch must be greater than 0"
+        )
+        self.batch_max_wait_ms = os_float(
+            "batch_max_wait_ms", 2.0, lambda x: x >= 0,
+            "time to wait for a prediction batch to fill up must be greater than or equal to 0"
+        )
+        self.batch_max_queue = os_int(
+            "batch_max_queue", 1024, lambda x: x > 0,
+            "maximum number of queued prediction requests must be greater than 0"
+        )
+        self.request_timeout_ms = os_float(
+            "request_timeout_ms", 1000.0, lambda x: x > 0,
+            "prediction request deadline must be greater than 0"
+        )
+
         #####################################
         #        Logging Parameters         #
         #####################################
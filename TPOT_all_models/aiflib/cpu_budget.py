@@ -0,0 +1,124 @@
+import math
+import os
+from functools import lru_cache
+
+# Environment variables read by the BLAS and OpenMP libraries when they are loaded, by
+# the threadpoolctl API of the pools they size
+_THREAD_VARIABLES = {
+    "OMP_NUM_THREADS": "openmp",
+    "OPENBLAS_NUM_THREADS": "blas",
+    "MKL_NUM_THREADS": "blas",
+    "VECLIB_MAXIMUM_THREADS": "blas",
+    "NUMEXPR_NUM_THREADS": None,
+}
+# The thread variables set by limit_threads, inherited by child processes, unlike those
+# set by the operator, which limit_threads leaves alone
+_BUDGET_VARIABLES = "AIF_BUDGET_THREAD_VARIABLES"
+_CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def _read(path):
+    try:
+        with open(path) as infile:
+            return infile.read().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_directories():
+    """cgroup v2 directories of this process, innermost first, and the cgroup v1 cpu controllers."""
+    directories = []
+    for line in (_read("/proc/self/cgroup") or "").splitlines():
+        controllers, _, path = line.partition(":")[2].partition(":")
+        if controllers == "" and path:
+            # Inside a cgroup namespace the path is "/" and the cgroup is mounted at the root
+            path = path.strip("/")
+            while path:
+                directories.append(os.path.join(_CGROUP_ROOT, path))
+                path = os.path.dirname(path)
+    directories.append(_CGROUP_ROOT)
+    directories += [os.path.join(_CGROUP_ROOT, "cpu,cpuacct"), os.path.join(_CGROUP_ROOT, "cpu")]
+    return directories
+
+
+def cpu_quota():
+    """CPUs allowed by the cgroup CPU quota (v2 cpu.max or v1 cfs quota), None without a quota."""
+    quotas = []
+    for directory in _cgroup_directories():
+        maximum = _read(os.path.join(directory, "cpu.max"))
+        if maximum is not None:
+            quota, _, period = maximum.partition(" ")
+        else:
+            quota = _read(os.path.join(directory, "cpu.cfs_quota_us"))
+            period = _read(os.path.join(directory, "cpu.cfs_period_us"))
+        try:
+            if quota not in (None, "max", "-1") and int(period) > 0:
+                quotas.append(int(quota) / int(period))
+        except (TypeError, ValueError):
+            continue
+    return min(quotas) if quotas else None
+
+
+# Read once per process, every Config reads it
+@lru_cache(maxsize = None)
+def available_cpus():
+    """
+    CPUs this process may run on: those of its cpuset (CPU affinity), further limited
+    by the cgroup CPU quota. A fractional quota is rounded down, so that busy workers
+    are not throttled, but to at least 1.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not Linux
+        cpus = os.cpu_count() or 1
+    quota = cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(math.floor(quota), 1))
+    return max(cpus, 1)
+
+
+def split_cpus(workers, threads, cpus = None):
+    """
+    (processes, native threads per process) within `cpus` CPUs (default: available_cpus()).
+    workers = 0 runs as many processes of `threads` threads as fit, threads = 0 divides
+    the CPUs among the processes, both 0 run one single-threaded process per CPU.
+    """
+    cpus = cpus or available_cpus()
+    if not workers:
+        workers = max(cpus // max(threads, 1), 1)
+    if not threads:
+        threads = max(cpus // workers, 1)
+    return workers, threads
+
+
+def _budget_variables():
+    return set(filter(None, os.environ.get(_BUDGET_VARIABLES, "").split(",")))
+
+
+def preset_thread_variables():
+    """Thread variables the operator set in the environment."""
+    budget = _budget_variables()
+    return {variable for variable in _THREAD_VARIABLES if variable in os.environ and variable not in budget}
+
+
+def limit_threads(threads):
+    """
+    Cap the BLAS and OpenMP thread pools of the current process at `threads`: those
+    loaded later through the environment, those already loaded with threadpoolctl.
+    Pools whose variable the operator set (e.g. OMP_NUM_THREADS) keep that setting.
+    """
+    budget = _budget_variables()
+    preset = preset_thread_variables()
+    for variable in _THREAD_VARIABLES:
+        if variable not in preset:
+            os.environ[variable] = str(threads)
+            budget.add(variable)
+    os.environ[_BUDGET_VARIABLES] = ",".join(sorted(budget))
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    for api in sorted({api for api in _THREAD_VARIABLES.values() if api is not None}):
+        if not any(_THREAD_VARIABLES[variable] == api for variable in preset):
+            threadpool_limits(threads, user_api = api)
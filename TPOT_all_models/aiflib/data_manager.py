@@ -9,27 +9,111 @@ import pandas as pd
 import numpy as np
 import joblib
 
-from functools import reduce
-from sklearn.impute import SimpleImputer
-from sklearn.model_selection import train_test_split
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from aiflib.config import Config
+from aiflib.dataset_cache import DatasetCache
+from aiflib.dtypes import downcast_features
+from aiflib.formats import remove_other_formats, write_frame
+from aiflib.readers import reader_for
+from aiflib.sampling import Reservoir, allocate, quantile_edges
 from aiflib.logger import Logger
 
+
+# Files are parsed in chunks of about as many values, each chunk is downcast before the next
+# one is parsed so that a large file is never held as float64
+_PARSE_CHUNK_VALUES = 1 << 23
+# Target values sampled to estimate the quantile bins of a stratified sample
+_QUANTILE_SAMPLE_ROWS = 100000
+
+
+def _file_chunks(path, delimiter, encoding, columns = None, data_dtype = "float64", target_column = None,
+                 row_filter = None, chunk_values = _PARSE_CHUNK_VALUES):
+    """
+    Chunks of a data file read by the reader registered for its extension, only the
+    `columns` (all when None) of the rows passing `row_filter`, feature columns stored
+    in their planned dtype.
+    """
+    chunks = reader_for(path)(path, columns, row_filter, chunk_values, delimiter = delimiter, encoding = encoding)
+    for chunk in chunks:
+        yield downcast_features(chunk, data_dtype, exclude = [target_column])
+
+
+def _read_file(path, delimiter, encoding, columns = None, data_dtype = "float64", target_column = None,
+               row_filter = None):
+    try:
+        # Without downcasting, files are read in one piece rather than concatenated from chunks
+        frames = list(_file_chunks(path, delimiter, encoding, columns, data_dtype, target_column, row_filter,
+                                   chunk_values = None if data_dtype == "float64" else _PARSE_CHUNK_VALUES))
+    except Exception as e:
+        return e
+    # A column downcast losslessly in some chunks only is concatenated back to float64 without loss
+    return pd.concat(frames, ignore_index = True) if len(frames) > 1 else frames[0]
+
+
+def _sample_file(path, seed, reservoirs, **read_options):
+    """
+    Stream a data file through empty copies of the reservoirs. Returns the columns of
+    the file, the filled reservoirs and the number of rows read, or the exception raised.
+    """
+    rng = np.random.default_rng(seed)
+    reservoirs = [reservoir.empty() for reservoir in reservoirs]
+    n_rows = 0
+    try:
+        for chunk in _file_chunks(path, **read_options):
+            if read_options["target_column"] not in chunk.columns:
+                break
+            # The same keys for every reservoir, their samples are nested
+            keys = rng.random(len(chunk))
+            for reservoir in reservoirs:
+                reservoir.add(chunk, keys)
+            n_rows += len(chunk)
+    except Exception as e:
+        return e
+    for reservoir in reservoirs:
+        reservoir.compact()
+    return list(chunk.columns), reservoirs, n_rows
+
+
 class DataManager():
-    def __init__(self, directory):
+    def __init__(self, directory, columns = None, sample = False, data = None):
         self.config = Config()
         self.logger = Logger(__name__)
-        self.logger.info(f"Loading data from {directory}...")
+        if data is None:
+            self.logger.info(f"Loading data from {directory}...")
+        else:
+            self.logger.info(f"Using the data of {directory} kept in memory...")
         self.target_column_name = self.config.target_column
         self.feature_column_names = None
+        # Columns to read besides the target column, all columns when None
+        self.columns = None if columns is None else list(columns) + [self.target_column_name]
         self.is_single_file = self.config.csv_name is not None
+        # Sampled reading streams the files and keeps bounded samples of them only
+        self.sample = sample
+        self.refit_data = None
+        self.paths = []
+        # Seeds of the keys of the rows of `paths` (of `data`), and the rows of the sample the pipeline is fitted on
+        self.seeds = []
+        self.fitted_sample = None
+        self.n_rows = 0
+        # Frame sampled instead of the files, see sample_data
+        self.data = None
         
-        self.raw_data = self.read_all_data(directory) 
+        # A frame given as `data` (the split of process_data) is used instead of the csv files
+        if data is None:
+            self.raw_data = self.read_all_data(directory)
+        else:
+            self.raw_data = self.sample_data(data) if self.sample else data
         if self.raw_data is None: return
         self.logger.info(f"Done read [{len(self.raw_data)}] points.")
+        if self.sample:
+            self.logger.info(f"Sampled [{len(self.raw_data)}] of [{self.n_rows}] points for the pipeline search.")
 
     def read_all_data(self, directory):
-        dataframe_from_csv = self.read_all_csv(directory)
+        if self.sample:
+            dataframe_from_csv = self.sample_all_csv(directory)
+        else:
+            dataframe_from_csv = self.read_all_csv(directory)
 
         if self.is_single_file:
             if dataframe_from_csv is None:
@@ -43,43 +127,218 @@ class DataManager():
         
         return dataframe_from_csv
 
-    def read_all_csv(self, directory):
+    def list_files(self, directory):
+        """Data files with a registered reader in the directory and, with search_subdirectories, below it."""
+        if self.is_single_file:
+            return [os.path.join(directory, self.config.csv_name)]
+
+        # The split and the artifacts of a run may be written below the dataset directory, they are not read with it
+        directory = os.path.abspath(directory)
+        excluded = [os.path.join(os.path.abspath(path), "") for path in (
+            self.config.train_data_directory, self.config.test_data_directory, self.config.artifacts_directory)]
+        excluded = [path for path in excluded if not os.path.join(directory, "").startswith(path)]
 
+        pattern = os.path.join("**", "*") if self.config.search_subdirectories else "*"
+        paths = [path for path in glob.glob(os.path.join(directory, pattern), recursive = True)
+                 if reader_for(path) is not None and os.path.isfile(path)
+                 and not any(path.startswith(prefix) for prefix in excluded)]
+        return sorted(paths)
+
+    def is_valid(self, path, columns):
         help_string = " The csv file must contain a header, a target column and and at least one feature column." \
             " The target column name is set by the <input_column> variable of this run. The default value is 'target'."
 
-        paths = []
-        if self.is_single_file:
-            paths = [os.path.join(directory, self.config.csv_name)]
-        else:
-            paths = glob.glob(os.path.join(directory, "*.csv"), recursive=True)
+        if isinstance(columns, Exception):
+            self.logger.info(f"Failed to read csv [{path}] exception:\n{columns}")
+            return False
 
-        frames = []
-        for path in paths:
-            try:
-                self.logger.verbose(f"Attempting to read data from csv [{path}]"
-                                    f" with delimiter [{self.config.delimiter}]")
-                frame = pd.read_csv(path, error_bad_lines = False,
-                                    delimiter = self.config.delimiter,
-                                    encoding = self.config.encoding
-                                    )
-            except Exception as e:
-                self.logger.info(f"Failed to read csv [{path}] exception:\n{e}")
-                continue
+        if self.target_column_name not in columns:
+            self.logger.info(f"File [{path}] does not have name [{self.target_column_name}] in header"
+                             f"{list(columns)}', skipping this file." + help_string)
+            return False
+        return True
+
+    def read_all_csv(self, directory):
+        paths = self.list_files(directory)
 
-            if self.target_column_name not in frame.columns:
-                self.logger.info(f"File [{path}] does not have name [{self.target_column_name}] in header"
-                                 f"{list(frame.columns)}', skipping this file." + help_string)
+        frames = []
+        for path, frame in zip(paths, self.parse_csv_files(paths)):
+            if not self.is_valid(path, frame if isinstance(frame, Exception) else frame.columns):
                 continue
 
             frames.append(frame)
             self.logger.verbose(f"Read [{len(frame)}] data points from [{path}]\n")
 
         if len(frames) == 0: return None
-        coalesced = reduce(lambda a,b: a.append(b), frames[1:], frames[0])
-        
+        # One concatenation, appending the frames one by one copies the accumulated data every time
+        coalesced = pd.concat(frames) if len(frames) > 1 else frames[0]
+
         return coalesced
 
+    def parse_csv_files(self, paths):
+        """
+        Parse the csv files, on a process pool when there are several. Files that were
+        parsed before and have not changed since are loaded from the dataset cache.
+        Returns a frame or the exception raised while parsing for every path, in the
+        order of `paths`.
+        """
+        read_options = self.read_options()
+        frames = [None] * len(paths)
+        keys = [None] * len(paths)
+        cache = None
+        if self.config.dataset_cache:
+            cache = DatasetCache(os.path.join(self.config.artifacts_directory, "dataset_cache"),
+                                 self.config.dataset_cache_max_mb * 1024 * 1024)
+            for i, path in enumerate(paths):
+                try:
+                    keys[i] = cache.key(path, **read_options)
+                except OSError:
+                    continue
+                frames[i] = cache.load(keys[i])
+                if frames[i] is not None:
+                    self.logger.verbose(f"Read [{path}] from the dataset cache")
+
+        missed = [i for i, frame in enumerate(frames) if frame is None]
+        for i in missed:
+            self.logger.verbose(f"Attempting to read data from csv [{paths[i]}]"
+                                f" with delimiter [{self.config.delimiter}]")
+        parsed = list(self.map_files(partial(_read_file, **read_options), [paths[i] for i in missed]))
+
+        for i, frame in zip(missed, parsed):
+            frames[i] = frame
+            if cache is not None and keys[i] is not None and not isinstance(frame, Exception):
+                cache.store(keys[i], frame, paths[i])
+        if cache is not None and missed:
+            cache.evict()
+        return frames
+
+    def read_options(self, columns = None):
+        return dict(
+            delimiter = self.config.delimiter,
+            encoding = self.config.encoding,
+            columns = self.columns if columns is None else columns,
+            data_dtype = self.config.data_dtype,
+            target_column = self.target_column_name,
+            row_filter = self.config.row_filter,
+            )
+
+    def map_files(self, function, paths, *arguments):
+        """Results of function(path, *arguments) in the order of `paths`, on a process pool when there are several."""
+        workers = min(self.config.read_workers, len(paths))
+        if workers <= 1:
+            yield from map(function, paths, *arguments)
+            return
+        with ProcessPoolExecutor(workers) as pool:
+            yield from pool.map(function, paths, *arguments, chunksize = max(1, len(paths) // (4 * workers)))
+
+    def sample_files(self, paths, reservoirs, columns = None):
+        """
+        Stream the files through the reservoirs, merging the samples of each file as it is
+        read. Files are sampled with their own random generator, seeded from the random
+        seed and their position, so the samples do not depend on the number of workers.
+        Keeps the valid paths in `paths` and their seeds in `seeds`, returns their number of rows.
+        """
+        seeds = [self.seed(i) for i in range(len(paths))]
+        sample = partial(_sample_file, reservoirs = reservoirs, **self.read_options(columns))
+        valid_paths, valid_seeds, n_rows = [], [], 0
+        for path, seed, result in zip(paths, seeds, self.map_files(sample, paths, seeds)):
+            if not self.is_valid(path, result if isinstance(result, Exception) else result[0]):
+                continue
+            _, sampled, rows = result
+            for reservoir, part in zip(reservoirs, sampled):
+                reservoir.merge(part)
+            valid_paths.append(path)
+            valid_seeds.append(seed)
+            n_rows += rows
+            self.logger.verbose(f"Sampled [{rows}] data points from [{path}]\n")
+        self.paths, self.seeds = valid_paths, valid_seeds
+        return n_rows
+
+    def seed(self, position):
+        """Seed of the random keys of the rows of the file at `position`."""
+        return [self.config.seed % (1 << 32), position]
+
+    def sample_frame(self, frame, reservoirs):
+        """Add the rows of a frame kept in memory to the reservoirs, keyed as a single file. Returns its number of rows."""
+        keys = np.random.default_rng(self.seed(0)).random(len(frame))
+        for reservoir in reservoirs:
+            reservoir.add(frame, keys)
+        self.seeds = [self.seed(0)]
+        return len(frame)
+
+    def sample_all_csv(self, directory):
+        """
+        Sample the csv files without holding them in memory: a uniform or target-stratified
+        sample of search_sample_rows rows for the pipeline search, and a uniform sample of
+        refit_sample_rows rows to fit the best pipeline on, both drawn in one pass.
+        """
+        paths = self.list_files(directory)
+        return self.draw_samples(lambda reservoirs, columns = None: self.sample_files(paths, reservoirs, columns))
+
+    def sample_data(self, data):
+        """The samples of sample_all_csv drawn from a frame kept in memory, the split of process_data."""
+        self.data = data
+        return self.draw_samples(lambda reservoirs, columns = None: self.sample_frame(
+            data if columns is None else data[columns], reservoirs))
+
+    def draw_samples(self, fill):
+        """
+        Search sample, and refit sample in refit_data, of the rows that fill(reservoirs, columns)
+        streams through the reservoirs. `fill` returns the number of rows it streamed.
+        """
+        target = self.target_column_name
+        search_rows = self.config.search_sample_rows
+
+        edges, quotas = (), [search_rows]
+        if self.config.search_sample == "stratified":
+            # Target quantiles and the share of every quantile bin, from a sample of the target column
+            targets = Reservoir([_QUANTILE_SAMPLE_ROWS], target)
+            fill([targets], columns = [target])
+            if targets.sample() is not None:
+                values = targets.sample()[target].to_numpy(dtype = np.float64)
+                edges = quantile_edges(values, self.config.search_strata)
+                shares = np.bincount(np.searchsorted(edges, values, side = "right"), minlength = len(edges) + 1)
+                quotas = allocate(search_rows, shares)
+
+        reservoirs = [Reservoir(quotas, target, edges)]
+        if self.config.refit_sample_rows > search_rows:
+            reservoirs.append(Reservoir([self.config.refit_sample_rows], target))
+        self.n_rows = fill(reservoirs)
+
+        search_sample = reservoirs[0].sample()
+        if search_sample is None:
+            return None
+        # No refit when the search sample already holds every row
+        if len(reservoirs) > 1 and self.n_rows > len(search_sample):
+            self.refit_data = reservoirs[1].sample()
+        # The best pipeline is fitted on the refit sample if there is one, on the search sample otherwise
+        self.fitted_sample = (reservoirs[1] if self.refit_data is not None else reservoirs[0]).selection()
+        return search_sample
+
+    def iter_chunks(self):
+        """
+        Parsed chunks of every valid file read by sample_all_csv, or of the frame sampled by
+        sample_data, one at a time, without the rows of the sample the pipeline is fitted on.
+        Their keys are drawn again from the seeds of the sampling pass, in the same order.
+        """
+        if self.data is not None:
+            keys = np.random.default_rng(self.seeds[0]).random(len(self.data))
+            step = max(1, _PARSE_CHUNK_VALUES // max(1, len(self.data.columns)))
+            chunks = [(self.data.iloc[start:start + step], keys[start:start + step])
+                      for start in range(0, len(self.data), step)]
+            yield from self.unsampled(chunks)
+            return
+        for path, seed in zip(self.paths, self.seeds):
+            rng = np.random.default_rng(seed)
+            chunks = ((chunk, rng.random(len(chunk))) for chunk in _file_chunks(path, **self.read_options()))
+            yield from self.unsampled(chunks)
+
+    def unsampled(self, chunks):
+        for chunk, keys in chunks:
+            chunk = chunk[~self.fitted_sample.contains(chunk, keys)]
+            if len(chunk):
+                yield chunk
+
     def validate(self, for_train = True):
         if self.raw_data is None: 
             return False
@@ -89,25 +348,36 @@ class DataManager():
             return True
 
     @staticmethod
-    def write_dataframe(frame, name, directory = None):
+    def write_dataframe(frame, name, directory = None, rows = None):
+        """
+        Write the rows of a frame (all of them or the positions `rows`) to directory/name
+        in the split_format file format, hashing the file while it is written. Returns the
+        split_checksum hex digest of the file.
+        """
         config = Config()
         if directory is None:
-            path = os.path.join(config.artifacts_directory, f"{name}.csv")
-        else:
-            path = os.path.join(directory, f"{name}.csv")
-        frame.to_csv(path, index=False, sep = config.delimiter)
-        checksum = DataManager.checksum(path)
+            directory = config.artifacts_directory
+        remove_other_formats(directory, name, config.split_format)
+        path = os.path.join(directory, f"{name}.{config.split_format}")
+        checksum = write_frame(frame, path, config.split_format, config.split_checksum, rows = rows,
+                               delimiter = config.delimiter, encoding = config.encoding)
+        Logger(__name__).verbose(f"Wrote [{path}] with {config.split_checksum} checksum [{checksum}]")
         return checksum
 
     @staticmethod
     def checksum(path):
         hasher = hashlib.md5()
         with open(path, 'rb') as infile:
-            hasher.update(infile.read())
+            # Bounded reads, the file is not held in memory
+            for block in iter(partial(infile.read, 1 << 20), b""):
+                hasher.update(block)
         return hasher.hexdigest()
 
     def get_data(self):
         return self.raw_data
+
+    def get_refit_data(self):
+        return self.refit_data
         
     def get_target_column(self):
         return self.target_column_name
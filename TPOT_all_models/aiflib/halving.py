@@ -0,0 +1,147 @@
+import math
+from functools import partial
+from time import perf_counter
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.model_selection import check_cv
+from tpot.gp_deap import _wrapped_cross_val_score
+
+from aiflib.scheduler import ScheduledTPOTRegressor
+
+
+def rung_budgets(n_rows, factor, min_rows):
+    """Rows each candidate is cross-validated on at successive rungs, the last one all rows."""
+    budgets = [n_rows]
+    while budgets[0] // factor >= min_rows:
+        budgets.insert(0, budgets[0] // factor)
+    return budgets
+
+
+def promote(scores, factor):
+    """Positions of the best 1 / `factor` of `scores` (rounded up) promoted to the next rung, failed ones never."""
+    order = sorted(range(len(scores)), key = lambda i: scores[i], reverse = True)
+    return sorted(i for i in order[:math.ceil(len(scores) / factor)] if np.isfinite(scores[i]))
+
+
+def _timed(score, sklearn_pipeline):
+    """Score of a pipeline and the seconds its cross-validation took, measured where it runs."""
+    start = perf_counter()
+    value = score(sklearn_pipeline = sklearn_pipeline)
+    return value, perf_counter() - start
+
+
+class HalvingTPOTRegressor(ScheduledTPOTRegressor):
+    """
+    TPOTRegressor evaluating each generation by successive halving: the new pipelines
+    are cross-validated on a random subset of `halving_min_rows` rows or more, the best
+    1 / `halving_factor` of them on `halving_factor` times more rows, and so on until
+    the last ones are cross-validated on all rows. Only these get their score as fitness:
+    the pipelines dropped on the way are recorded as TPOT records invalid ones, with the
+    worst fitness, so that they stay out of the pareto front and lose every later
+    comparison. Their rung and their score there are kept in `evaluated_individuals_`
+    as "halving_rung" and "halving_score", and the time of their cross-validation at
+    that rung as "cv_seconds".
+    """
+    def __init__(self, halving_factor = 3, halving_min_rows = 1000, **kwargs):
+        self.halving_factor = halving_factor
+        self.halving_min_rows = halving_min_rows
+        super().__init__(**kwargs)
+
+    def _evaluation_settings(self):
+        # Pipelines dropped early are scored on fewer rows, their scores depend on the rungs
+        return dict(super()._evaluation_settings(), search_fidelity = "halving",
+                    halving_factor = self.halving_factor, halving_min_rows = self.halving_min_rows)
+
+    def _scores(self, pipelines, features, target, sample_weight, groups):
+        """Cross-validation scores of the pipelines and the seconds they took, yielded as they are computed."""
+        cv = check_cv(self.cv, target, classifier = self.classification)
+        score = partial(
+            _wrapped_cross_val_score,
+            features = features,
+            target = target,
+            cv = cv,
+            scoring_function = self.scoring_function,
+            sample_weight = sample_weight,
+            groups = groups,
+            timeout = max(int(self.max_eval_time_mins * 60), 1),
+            use_dask = False,
+        )
+        chunk_size = 1 if self._n_jobs == 1 else self._n_jobs * 4
+        for start in range(0, len(pipelines), chunk_size):
+            self._stop_by_max_time_mins()
+            chunk = pipelines[start:start + chunk_size]
+            if self._n_jobs == 1:
+                values = [_timed(score, pipeline) for pipeline in chunk]
+            else:
+                parallel = Parallel(n_jobs = self._n_jobs, verbose = 0, pre_dispatch = "2*n_jobs")
+                values = parallel(delayed(_timed)(score, pipeline) for pipeline in chunk)
+            for value, seconds in values:
+                yield -float("inf") if isinstance(value, str) else value, seconds
+
+    def _evaluate_individuals(self, population, features, target, sample_weight = None, groups = None):
+        individuals = [ind for ind in population if not ind.fitness.valid]
+        if self.verbosity > 0:
+            self._pbar.update(len(population) - len(individuals))
+        operator_counts, eval_individuals_str, sklearn_pipeline_list, stats_dicts = \
+            self._preprocess_individuals(individuals)
+
+        budgets = rung_budgets(len(target), self.halving_factor, self.halving_min_rows)
+        rows = np.random.RandomState(self.random_state).permutation(len(target))
+        # Highest rung reached by each candidate and its score there
+        reached = {}
+        candidates = list(range(len(sklearn_pipeline_list)))
+        interrupted = False
+        try:
+            self._stop_by_max_time_mins()
+            for rung, budget in enumerate(budgets):
+                # All rows are passed as they are, shared training data stays shared
+                subset = np.sort(rows[:budget]) if budget < len(target) else slice(None)
+                select = (lambda values: values) if budget == len(target) else (lambda values: values[subset])
+                scores = self._scores(
+                    [sklearn_pipeline_list[i] for i in candidates], select(features), select(target),
+                    None if sample_weight is None else select(np.asarray(sample_weight)),
+                    None if groups is None else select(np.asarray(groups)))
+                for i, (score, seconds) in zip(candidates, scores):
+                    reached[i] = (rung, score)
+                    self._evaluation_seconds[eval_individuals_str[i]] = seconds
+                if rung + 1 < len(budgets):
+                    candidates = [candidates[j] for j in promote([reached[i][1] for i in candidates],
+                                                                 self.halving_factor)]
+        except (KeyboardInterrupt, SystemExit, StopIteration):
+            # As TPOTRegressor does, keep the scores of this generation before stopping
+            interrupted = True
+
+        # Only the scores on all rows are compared, the candidates dropped before get the
+        # fitness TPOT gives invalid pipelines, kept for later generations as well
+        evaluated = sorted(reached)
+        dropped = {eval_individuals_str[i] for i in evaluated if reached[i][0] < len(budgets) - 1}
+        result_score_list = []
+        for i in evaluated:
+            result_score_list = self._update_val(
+                -float("inf") if eval_individuals_str[i] in dropped else reached[i][1], result_score_list)
+        operator_counts = {**operator_counts, **{ind_str: 5000. for ind_str in dropped}}
+        self._update_evaluated_individuals_(
+            result_score_list, [eval_individuals_str[i] for i in evaluated], operator_counts, stats_dicts)
+        for i in evaluated:
+            if eval_individuals_str[i] in dropped:
+                self.evaluated_individuals_[eval_individuals_str[i]].update(
+                    halving_rung = reached[i][0], halving_score = reached[i][1])
+
+        for ind in individuals:
+            ind_str = str(ind)
+            if ind_str in self.evaluated_individuals_:
+                ind.fitness.values = (
+                    self.evaluated_individuals_[ind_str]["operator_count"],
+                    self.evaluated_individuals_[ind_str]["internal_cv_score"],
+                )
+        if interrupted:
+            # As TPOTRegressor does, the individuals not evaluated get the worst fitness
+            for ind in individuals:
+                if not ind.fitness.valid:
+                    ind.fitness.values = (5000., -float("inf"))
+            self._pareto_front.update(population)
+            self._pop = population
+            raise KeyboardInterrupt
+        self._pareto_front.update(population)
+        return self._report_generation(population)
@@ -0,0 +1,244 @@
+import os
+import pickle
+import signal
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import get_context
+from multiprocessing.connection import wait
+from time import perf_counter
+
+from joblib._parallel_backends import ParallelBackendBase
+
+from aiflib.cpu_budget import limit_threads
+from aiflib.logger import Logger
+
+# Seconds between two checks of the time and memory of the running tasks
+_POLL_SECONDS = 0.1
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _resident_bytes(pid):
+    """Resident memory of a process, None where /proc is not available."""
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _serve(connection, threads):
+    """Worker loop: runs the pickled tasks received on `connection` and sends back their outcome."""
+    if hasattr(os, "setpgrp"):
+        # Own process group, killing the worker also kills the processes its task started
+        os.setpgrp()
+    limit_threads(threads)
+    while True:
+        try:
+            payload = connection.recv_bytes()
+        except EOFError:
+            return
+        try:
+            outcome = ("result", pickle.loads(payload)())
+        except BaseException as e:
+            outcome = ("error", e)
+        try:
+            message = pickle.dumps(outcome, protocol = pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            message = pickle.dumps(("error", RuntimeError(traceback.format_exc())))
+        connection.send_bytes(message)
+
+
+class _Worker:
+    def __init__(self, context, threads):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target = _serve, args = (child, threads), daemon = True)
+        self.process.start()
+        child.close()
+        # (future, payload, killed_result, description) of the running task
+        self.task = None
+        self.started = None
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (AttributeError, OSError):
+            # Not a process group leader yet, or not POSIX
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class SupervisedPool:
+    """
+    Worker processes running one task at a time under supervision. A task running
+    for more than `max_seconds`, or whose worker holds more than `max_bytes` of
+    resident memory, is killed with its worker and the processes it started; the
+    result of the task is then `killed_result(reason)` and the worker is replaced.
+    Workers are otherwise reused from task to task. Killed tasks are recorded in
+    `killed`. max_seconds = None and max_bytes = 0 set no limit.
+    """
+    def __init__(self, workers, threads = 1, max_seconds = None, max_bytes = 0):
+        self.workers = workers
+        self.threads = threads
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.killed = []
+        self.logger = Logger(__name__)
+        self._context = get_context("spawn")
+        self._lock = threading.RLock()
+        self._pending = deque()
+        self._closed = False
+        self._wake_receiver, self._wake_sender = self._context.Pipe(duplex = False)
+        self._workers = [_Worker(self._context, threads) for _ in range(workers)]
+        self._supervisor = threading.Thread(target = self._supervise, name = "pool-supervisor", daemon = True)
+        self._supervisor.start()
+
+    def submit(self, task, killed_result, description = ""):
+        """Future of the result of task(), `description` names the task in `killed`."""
+        future = Future()
+        payload = pickle.dumps(task, protocol = pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._pending.append((future, payload, killed_result, description))
+        self._wake_sender.send_bytes(b"")
+        return future
+
+    def abort(self):
+        """Drop the pending tasks and kill the running ones, their workers are replaced."""
+        with self._lock:
+            self._pending.clear()
+            for index, worker in enumerate(self._workers):
+                if worker.task is not None:
+                    worker.kill()
+                    self._workers[index] = _Worker(self._context, self.threads)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        self._wake_sender.send_bytes(b"")
+        self._supervisor.join()
+        for worker in self._workers:
+            worker.kill()
+
+    def _supervise(self):
+        while True:
+            # Futures are resolved without the lock, their callbacks may submit tasks
+            done = []
+            with self._lock:
+                if self._closed:
+                    return
+                for worker in self._workers:
+                    if worker.task is None and self._pending:
+                        self._start(worker, self._pending.popleft(), done)
+                busy = {worker.connection: worker for worker in self._workers if worker.task is not None}
+            try:
+                ready = wait(list(busy) + [self._wake_receiver], timeout = _POLL_SECONDS)
+            except (OSError, ValueError):
+                # A connection closed by abort in the meantime, its worker is already replaced
+                ready = []
+            with self._lock:
+                while self._wake_receiver.poll():
+                    self._wake_receiver.recv_bytes()
+                for connection in ready:
+                    worker = busy.get(connection)
+                    # Replaced by abort in the meantime
+                    if worker is not None and worker in self._workers:
+                        self._receive(worker, done)
+                self._check_limits(done)
+            for future, outcome, value in done:
+                if outcome == "result":
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _start(self, worker, task, done):
+        worker.task, worker.started = task, perf_counter()
+        try:
+            worker.connection.send_bytes(task[1])
+        except OSError:
+            self._kill(worker, "died", done)
+
+    def _receive(self, worker, done):
+        try:
+            outcome, value = pickle.loads(worker.connection.recv_bytes())
+        except (EOFError, OSError):
+            # Crashed in native code or killed by the system, e.g. out of memory
+            self._kill(worker, "died", done)
+            return
+        except Exception as e:
+            outcome, value = "error", e
+        done.append((worker.task[0], outcome, value))
+        worker.task = None
+
+    def _check_limits(self, done):
+        now = perf_counter()
+        for worker in self._workers:
+            if worker.task is None:
+                continue
+            if self.max_seconds is not None and now - worker.started > self.max_seconds:
+                self._kill(worker, "time", done)
+            elif self.max_bytes > 0 and (_resident_bytes(worker.process.pid) or 0) > self.max_bytes:
+                self._kill(worker, "memory", done)
+
+    def _kill(self, worker, reason, done):
+        future, _, killed_result, description = worker.task
+        seconds = perf_counter() - worker.started
+        memory = None if reason == "died" else _resident_bytes(worker.process.pid)
+        worker.kill()
+        self._workers[self._workers.index(worker)] = _Worker(self._context, self.threads)
+        self.killed.append({
+            "task": description,
+            "reason": reason,
+            "seconds": round(seconds, 1),
+            "memory_mb": None if memory is None else round(memory / 2 ** 20),
+            })
+        self.logger.info(f"Killed the evaluation of [{description}] after [{seconds:.1f}] s, "
+                         f"reason [{reason}], exit code of its worker [{worker.process.exitcode}].")
+        done.append((future, "result", killed_result(reason)))
+
+
+def _describe(batch):
+    """The pipelines evaluated by a joblib batch of TPOT evaluations."""
+    pipelines = [kwargs.get("sklearn_pipeline", func) for func, args, kwargs in getattr(batch, "items", [])]
+    return "; ".join(" ".join(repr(pipeline).split()) for pipeline in pipelines) or repr(batch)
+
+
+class SupervisedBackend(ParallelBackendBase):
+    """
+    joblib backend running every batch of a Parallel call on a SupervisedPool, which
+    outlives the call. A TPOT evaluation killed for its time is scored "Timeout", as
+    by TPOT's own timeout, one killed for its memory or crashed -inf.
+    """
+    supports_retrieve_callback = True
+
+    def __init__(self, pool, **kwargs):
+        super().__init__(**kwargs)
+        self.pool = pool
+
+    def effective_n_jobs(self, n_jobs):
+        return self.pool.workers
+
+    def configure(self, n_jobs = 1, parallel = None, **backend_kwargs):
+        self.parallel = parallel
+        return self.effective_n_jobs(n_jobs)
+
+    def submit(self, func, callback = None):
+        size = len(func) if hasattr(func, "__len__") else 1
+        future = self.pool.submit(
+            func, lambda reason: ["Timeout" if reason == "time" else -float("inf")] * size, _describe(func))
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def apply_async(self, func, callback = None):
+        # joblib before 1.3
+        future = self.submit(func, callback)
+        future.get = future.result
+        return future
+
+    def retrieve_result_callback(self, future):
+        return future.result()
+
+    def abort_everything(self, ensure_ready = True):
+        self.pool.abort()
@@ -0,0 +1,78 @@
+import copy
+
+# Above these shapes an operator costs most of the search budget for little gain
+_KNN_MAX_ROWS = 100000
+_POLYNOMIAL_MAX_FEATURES = 50
+_FAST_ICA_MAX_FEATURES = 100
+# Kernels of Nystroem defined for non-negative features only
+_NON_NEGATIVE_KERNELS = ["chi2", "additive_chi2"]
+
+KNN = "sklearn.neighbors.KNeighborsRegressor"
+POLYNOMIAL_FEATURES = "sklearn.preprocessing.PolynomialFeatures"
+FAST_ICA = "sklearn.decomposition.FastICA"
+NYSTROEM = "sklearn.kernel_approximation.Nystroem"
+ONE_HOT_ENCODER = "tpot.builtins.OneHotEncoder"
+ZERO_COUNT = "tpot.builtins.ZeroCount"
+
+
+def fold_rows(profile, cv, subsample = 1.0):
+    """Rows an estimator is fitted on in one cross-validation fold of the search."""
+    n_rows = int(profile["n_rows"] * min(1.0, subsample))
+    return n_rows - -(-n_rows // cv)
+
+
+def plan_search_space(config_dict, profile, cv, subsample = 1.0):
+    """
+    Copy of a TPOT config dict without the operators that cannot help or are too
+    expensive for the profiled data, and with hyperparameter ranges narrowed to the
+    valid ones. Returns the config dict and a list of (operator, reason) of the changes.
+    """
+    config_dict = copy.deepcopy(config_dict)
+    changes = []
+    n_rows, n_features = profile["n_rows"], profile["n_features"]
+
+    def remove(operator, reason):
+        if config_dict.pop(operator, None) is not None:
+            changes.append((operator, f"removed, {reason}"))
+
+    def narrow(operator, parameter, values, reason):
+        parameters = config_dict.get(operator)
+        if parameters is None or parameter not in parameters:
+            return
+        values, dropped = list(values), [value for value in parameters[parameter] if value not in values]
+        if not values:
+            remove(operator, reason)
+        elif dropped:
+            parameters[parameter] = values
+            kept = f"without {dropped}" if len(dropped) <= 3 else f"limited to {values[0]}..{values[-1]}"
+            changes.append((operator, f"{parameter} {kept}, {reason}"))
+
+    if n_rows > _KNN_MAX_ROWS:
+        remove(KNN, f"{n_rows} rows, more than {_KNN_MAX_ROWS}")
+    else:
+        rows = fold_rows(profile, cv, subsample)
+        if KNN in config_dict:
+            narrow(KNN, "n_neighbors", [k for k in config_dict[KNN]["n_neighbors"] if k <= rows],
+                   f"{rows} rows per cross-validation fold")
+
+    if n_features > _POLYNOMIAL_MAX_FEATURES:
+        remove(POLYNOMIAL_FEATURES,
+               f"{n_features} columns would become {n_features * (n_features + 3) // 2}")
+    if n_features > _FAST_ICA_MAX_FEATURES:
+        remove(FAST_ICA, f"{n_features} columns, more than {_FAST_ICA_MAX_FEATURES}")
+
+    minimum = [value for value in profile["min"] if value is not None]
+    if NYSTROEM in config_dict and minimum and min(minimum) < 0:
+        narrow(NYSTROEM, "kernel", [k for k in config_dict[NYSTROEM]["kernel"] if k not in _NON_NEGATIVE_KERNELS],
+               "negative feature values")
+
+    if ONE_HOT_ENCODER in config_dict:
+        # OneHotEncoder encodes the columns with at most `threshold` distinct values
+        threshold = max(config_dict[ONE_HOT_ENCODER].get("threshold", [10]))
+        if not any(2 <= count <= threshold for count in profile["n_unique"]):
+            remove(ONE_HOT_ENCODER, f"no column with 2 to {threshold} distinct values")
+
+    if not any(rate for rate in profile["zero_rate"]):
+        remove(ZERO_COUNT, "no zero values")
+
+    return config_dict, changes
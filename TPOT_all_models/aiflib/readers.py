@@ -0,0 +1,154 @@
+import os
+from contextlib import contextmanager
+from functools import reduce
+
+import pandas as pd
+
+from aiflib.logger import UiPathUsageException
+
+# Readers of data files by extension. A reader is called as
+# reader(path, columns, row_filter, chunk_values, **options) and yields frames of about
+# `chunk_values` values (the whole file when None) holding the `columns` (all columns
+# when None) of the rows that pass `row_filter`.
+_READERS = {}
+
+# Compressions of csv files, decompressed by pandas by file extension, zstd by _csv_source.
+# Compressed csv files are parsed in chunks from a correspondingly smaller size.
+_COMPRESSED = (".gz", ".bz2", ".xz", ".zst", ".zip")
+_COMPRESSION_RATIO = 4
+# Files up to this size (uncompressed) are parsed in one piece
+_WHOLE_FILE_BYTES = 1 << 26
+
+
+def register_reader(extensions, reader):
+    for extension in extensions:
+        _READERS[extension.lower()] = reader
+
+
+def reader_for(path):
+    """Reader registered for the longest extension of `path`, None for other files."""
+    name = os.path.basename(path).lower()
+    matches = [extension for extension in _READERS if name.endswith("." + extension)]
+    return _READERS[max(matches, key = len)] if matches else None
+
+
+def filter_columns(row_filter):
+    return [column for column, *_ in row_filter or ()]
+
+
+def filter_mask(frame, row_filter):
+    """Rows of a frame that pass every (column, operator[, value]) condition of a row filter."""
+    masks = []
+    for column, operator, *value in row_filter:
+        values = frame[column]
+        value = value[0] if value else None
+        if operator == "is null":
+            masks.append(values.isna())
+        elif operator == "not null":
+            masks.append(values.notna())
+        elif operator == "in":
+            masks.append(values.isin(value))
+        elif operator == "not in":
+            masks.append(~values.isin(value))
+        else:
+            masks.append({"==": values.__eq__, "!=": values.__ne__, "<": values.__lt__, "<=": values.__le__,
+                          ">": values.__gt__, ">=": values.__ge__}[operator](value))
+    return reduce(lambda a, b: a & b, masks)
+
+
+def arrow_filter(row_filter):
+    """The row filter as a pyarrow.dataset expression, evaluated against row group statistics first."""
+    import pyarrow.dataset as ds
+
+    expressions = []
+    for column, operator, *value in row_filter:
+        field = ds.field(column)
+        value = value[0] if value else None
+        if operator == "is null":
+            expressions.append(field.is_null())
+        elif operator == "not null":
+            expressions.append(field.is_valid())
+        elif operator == "in":
+            expressions.append(field.isin(value))
+        elif operator == "not in":
+            expressions.append(~field.isin(value))
+        else:
+            expressions.append({"==": field.__eq__, "!=": field.__ne__, "<": field.__lt__, "<=": field.__le__,
+                                ">": field.__gt__, ">=": field.__ge__}[operator](value))
+    return reduce(lambda a, b: a & b, expressions)
+
+
+@contextmanager
+def _csv_source(path):
+    """What pandas reads a csv file from: its path, or a decompressing stream for zstd (pandas reads .zst from 1.4)."""
+    if not path.lower().endswith(".zst"):
+        yield path
+        return
+    try:
+        import zstandard
+    except ImportError:
+        raise UiPathUsageException(f"Reading [{path}] requires the optional [zstandard] package.")
+    with open(path, "rb") as raw, zstandard.ZstdDecompressor().stream_reader(raw) as stream:
+        yield stream
+
+
+def read_csv_chunks(path, columns, row_filter, chunk_values, delimiter = ",", encoding = "utf-8"):
+    """Csv files, compressed ones decompressed on the fly. Filtered after each chunk is parsed."""
+    wanted = None if columns is None else set(columns) | set(filter_columns(row_filter))
+    read_csv = lambda source, **kwargs: pd.read_csv(source, delimiter = delimiter, encoding = encoding,
+                                                    usecols = None if wanted is None else wanted.__contains__, **kwargs)
+    size = os.path.getsize(path) * (_COMPRESSION_RATIO if path.lower().endswith(_COMPRESSED) else 1)
+    with _csv_source(path) as source:
+        if chunk_values is None or size <= _WHOLE_FILE_BYTES:
+            chunks = [read_csv(source, error_bad_lines = False)]
+        else:
+            with _csv_source(path) as header_source:
+                header = read_csv(header_source, nrows = 0)
+            chunks = read_csv(source, error_bad_lines = False,
+                              chunksize = max(1000, chunk_values // max(1, len(header.columns))))
+        for chunk in chunks:
+            if row_filter:
+                chunk = chunk[filter_mask(chunk, row_filter)].reset_index(drop = True)
+                if columns is not None:
+                    chunk = chunk[[name for name in chunk.columns if name in columns]]
+            yield chunk
+
+
+def read_arrow_chunks(path, columns, row_filter, chunk_values, file_format = "parquet"):
+    """
+    Parquet and Feather (Arrow IPC) files through pyarrow.dataset: only the requested
+    columns are read, and row groups whose statistics fail the filter are skipped.
+    """
+    try:
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise UiPathUsageException(f"Reading [{path}] requires the optional [pyarrow] package.")
+
+    dataset = ds.dataset(path, format = file_format)
+    names = [name for name in dataset.schema.names if columns is None or name in columns]
+    expression = arrow_filter(row_filter) if row_filter else None
+    if chunk_values is None:
+        yield dataset.to_table(columns = names, filter = expression).to_pandas()
+        return
+    scanner = dataset.scanner(columns = names, filter = expression,
+                              batch_size = max(1000, chunk_values // max(1, len(names))))
+    empty = True
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            empty = False
+            yield batch.to_pandas()
+    if empty:
+        yield dataset.schema.empty_table().select(names).to_pandas()
+
+
+def read_parquet_chunks(path, columns, row_filter, chunk_values, **options):
+    return read_arrow_chunks(path, columns, row_filter, chunk_values, file_format = "parquet")
+
+
+def read_feather_chunks(path, columns, row_filter, chunk_values, **options):
+    return read_arrow_chunks(path, columns, row_filter, chunk_values, file_format = "ipc")
+
+
+register_reader(["csv"] + [f"csv{extension}" for extension in _COMPRESSED], read_csv_chunks)
+register_reader(["parquet", "pq"], read_parquet_chunks)
+register_reader(["feather", "arrow", "ipc"], read_feather_chunks)
@@ -0,0 +1,145 @@
+from time import perf_counter
+
+import numpy as np
+
+from aiflib.logger import Logger
+from aiflib.score_cache import CachedTPOTRegressor
+
+# Share of the time budget the search keeps whatever the refit is expected to take
+_MIN_SEARCH_SHARE = 0.5
+
+
+class BudgetScheduler:
+    """
+    Time budget of a pipeline search. After each generation it logs the improvement
+    of the best cross-validation score, and tells the search to end once the gain of
+    the best score per minute over the last `window` generations, relative to the
+    score, is below `min_gain_per_min` (0: never).
+
+    With `reserve_refit`, part of the `max_time_mins` budget is kept for fitting the
+    best pipeline after the search: one fit on all rows, plus `refit_scale` times that
+    for a refit on more rows. A fit is estimated from the measured time of the
+    cross-validation of the best pipeline so far, the one refitted if the search
+    ended now, which fits it `cv` times on (cv - 1) / cv of the rows each (of the
+    `subsample` share of rows).
+    """
+    def __init__(self, max_time_mins, min_gain_per_min = 0., window = 3, reserve_refit = True,
+                 cv = 5, subsample = 1., refit_scale = 0.):
+        self.max_time_mins = max_time_mins
+        self.min_gain_per_min = min_gain_per_min
+        self.window = window
+        self.reserve_refit = reserve_refit
+        self.cv = cv
+        self.subsample = subsample
+        self.refit_scale = refit_scale
+        self.logger = Logger(__name__)
+        self.start()
+
+    def start(self):
+        self._start = perf_counter()
+        # Elapsed seconds and best score after each generation
+        self.history = []
+        self.fit_seconds = 0.
+
+    def elapsed(self):
+        return perf_counter() - self._start
+
+    def reserve_seconds(self):
+        """Seconds kept after the search for the refit of the best pipeline."""
+        if not self.reserve_refit or self.max_time_mins is None:
+            return 0.
+        reserve = self.fit_seconds * (1 + self.refit_scale)
+        return min(reserve, (1 - _MIN_SEARCH_SHARE) * self.max_time_mins * 60)
+
+    def search_minutes(self):
+        """Minutes the search may run for, the time budget without the reserve."""
+        if self.max_time_mins is None:
+            return None
+        return self.max_time_mins - self.reserve_seconds() / 60
+
+    def gain_per_min(self):
+        """Gain of the best score per minute over the last `window` generations, relative to the score."""
+        if len(self.history) <= self.window:
+            return None
+        (then, old), (now, best) = self.history[-1 - self.window], self.history[-1]
+        if not np.isfinite(best) or not np.isfinite(old):
+            return None
+        return (best - old) / max(abs(best), np.finfo(float).eps) / max((now - then) / 60, 1e-9)
+
+    def record(self, best, best_seconds = None):
+        """Best score after a generation, and seconds the cross-validation of the pipeline with that score took."""
+        elapsed = self.elapsed()
+        if best_seconds is not None:
+            self.fit_seconds = best_seconds / max(self.cv - 1, 1) / self.subsample
+        message = f"Generation [{len(self.history)}]: best internal CV score [{best:.6g}]"
+        if self.history:
+            then, old = self.history[-1]
+            message += f", improved by [{best - old:.6g}] in [{elapsed - then:.1f}] s"
+        self.history.append((elapsed, best))
+        gain = self.gain_per_min()
+        if gain is not None:
+            message += f", relative gain [{gain:.3g}] per minute over the last [{self.window}] generations"
+        if self.max_time_mins is not None:
+            message += (f", [{max(self.search_minutes() - elapsed / 60, 0):.2f}] search minutes left"
+                        f" with [{self.reserve_seconds():.1f}] s reserved for the refit")
+        self.logger.info(message + ".")
+
+    def stop_reason(self):
+        """Why the search should end now, None to go on."""
+        gain = self.gain_per_min()
+        if self.min_gain_per_min > 0 and gain is not None and gain < self.min_gain_per_min:
+            return (f"The best internal CV score improved by less than [{self.min_gain_per_min}] "
+                    f"of itself per minute over the last [{self.window}] generations.")
+        return None
+
+
+class ScheduledTPOTRegressor(CachedTPOTRegressor):
+    """
+    CachedTPOTRegressor reporting each generation to a BudgetScheduler, ending the
+    search when it says so and running the search for the minutes it leaves after
+    the refit reserve. Without `scheduler`, a CachedTPOTRegressor.
+    """
+    def __init__(self, scheduler = None, **kwargs):
+        self.scheduler = scheduler
+        super().__init__(**kwargs)
+
+    def fit(self, features, target, sample_weight = None, groups = None):
+        if self.scheduler is None:
+            return super().fit(features, target, sample_weight = sample_weight, groups = groups)
+        max_time_mins = self.max_time_mins
+        self.scheduler.start()
+        try:
+            return super().fit(features, target, sample_weight = sample_weight, groups = groups)
+        finally:
+            self.max_time_mins = max_time_mins
+
+    def _evaluate_individuals(self, population, features, target, sample_weight = None, groups = None):
+        population = super()._evaluate_individuals(population, features, target, sample_weight, groups)
+        return self._report_generation(population)
+
+    def _report_generation(self, population):
+        """Report an evaluated generation to the scheduler and update the search time."""
+        if self.scheduler is not None:
+            # The pipeline refitted if the search ended now, the best of the pareto front
+            candidates = [(ind.fitness.values[1], str(ind)) for ind in population if ind.fitness.valid]
+            if self._pareto_front:
+                candidates += [(key.wvalues[1], str(ind)) for key, ind in zip(self._pareto_front.keys,
+                                                                              self._pareto_front.items)]
+            best, best_str = max(candidates, key = lambda candidate: candidate[0], default = (-np.inf, None))
+            self.scheduler.record(best, self.evaluated_individuals_.get(best_str, {}).get("cv_seconds"))
+            # TPOT checks max_time_mins while it evaluates, it now stops in time for the refit
+            if self.max_time_mins is not None:
+                self.max_time_mins = self.scheduler.search_minutes()
+        return population
+
+    def _check_periodic_pipeline(self, gen):
+        super()._check_periodic_pipeline(gen)
+        reason = self.scheduler.stop_reason() if self.scheduler is not None else None
+        if reason is not None:
+            raise StopIteration(f"{reason} Will end the optimization process.")
+
+    def _summary_of_best_pipeline(self, features, target):
+        # Fits the best pipeline on all rows
+        start = perf_counter()
+        super()._summary_of_best_pipeline(features, target)
+        self.refit_seconds_ = perf_counter() - start
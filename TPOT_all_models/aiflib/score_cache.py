@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import sqlite3
+from time import perf_counter, time
+
+import numpy as np
+from tpot import TPOTRegressor
+
+from aiflib.logger import Logger
+
+# Largest number of pipelines looked up with one query, below the SQLite variable limit
+_LOOKUP_CHUNK = 500
+
+
+def data_fingerprint(*arrays):
+    """Key of the training data: shape, dtype and bytes of every array, None for missing ones."""
+    hasher = hashlib.blake2b(digest_size = 16)
+    for array in arrays:
+        if array is None:
+            hasher.update(b"none")
+            continue
+        array = np.ascontiguousarray(array)
+        hasher.update(json.dumps([list(array.shape), str(array.dtype)]).encode("utf-8"))
+        hasher.update(array.data if array.dtype != object else repr(array.tolist()).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class ScoreCache:
+    """
+    Cross-validation scores of pipelines kept across training runs in a SQLite file,
+    keyed by the fingerprint of the training data, the evaluation settings (cv,
+    subsample, scoring, ...) and the pipeline string. Each score comes with the time
+    its evaluation took. The least recently used scores are removed once the cache
+    holds more than `max_entries`.
+    """
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.logger = Logger(__name__)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.
+        self._connection = None
+
+    def connection(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok = True)
+            self._connection = sqlite3.connect(self.path, timeout = 30)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS scores ("
+                "dataset TEXT, settings TEXT, pipeline TEXT, score REAL, seconds REAL, last_used REAL, "
+                "PRIMARY KEY (dataset, settings, pipeline))")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS scores_last_used ON scores (last_used)")
+            self._connection.commit()
+        return self._connection
+
+    def lookup(self, dataset, settings, pipelines):
+        """(score, seconds) of the cached `pipelines` as a dict, marked as used now."""
+        pipelines = list(pipelines)
+        found = {}
+        try:
+            connection = self.connection()
+            for start in range(0, len(pipelines), _LOOKUP_CHUNK):
+                chunk = pipelines[start:start + _LOOKUP_CHUNK]
+                rows = connection.execute(
+                    f"SELECT pipeline, score, seconds FROM scores WHERE dataset = ? AND settings = ? "
+                    f"AND pipeline IN ({', '.join('?' * len(chunk))})", [dataset, settings] + chunk)
+                found.update((pipeline, (score, seconds)) for pipeline, score, seconds in rows)
+            if found:
+                now = time()
+                with connection:
+                    connection.executemany(
+                        "UPDATE scores SET last_used = ? WHERE dataset = ? AND settings = ? AND pipeline = ?",
+                        [(now, dataset, settings, pipeline) for pipeline in found])
+        except sqlite3.Error as e:
+            self.logger.verbose(f"Could not read the pipeline score cache: {e}")
+        self.hits += len(found)
+        self.misses += len(pipelines) - len(found)
+        self.saved_seconds += sum(seconds for _, seconds in found.values())
+        return found
+
+    def store(self, dataset, settings, scores):
+        """Store `scores`, a list of (pipeline, score, seconds), then evict the least recently used."""
+        if not scores:
+            return
+        now = time()
+        try:
+            connection = self.connection()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)",
+                    [(dataset, settings, pipeline, score, seconds, now) for pipeline, score, seconds in scores])
+                excess = connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    connection.execute(
+                        "DELETE FROM scores WHERE rowid IN (SELECT rowid FROM scores ORDER BY last_used LIMIT ?)",
+                        (excess,))
+                    self.evictions += excess
+        except sqlite3.Error as e:
+            self.logger.verbose(f"Could not store in the pipeline score cache: {e}")
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class CachedTPOTRegressor(TPOTRegressor):
+    """
+    TPOTRegressor looking up the score of every new pipeline in a ScoreCache before
+    evaluating it, and storing the scores of the pipelines it evaluates. Pipelines
+    that fail or time out are not stored. Without `score_cache`, a TPOTRegressor.
+
+    The seconds the cross-validation of every pipeline took are kept in
+    `evaluated_individuals_` as "cv_seconds": those measured for the pipeline alone
+    in `_evaluation_seconds` when a subclass measures them, its share of the time of
+    its generation otherwise, and those of the first evaluation for cached pipelines.
+    """
+    def __init__(self, score_cache = None, **kwargs):
+        self.score_cache = score_cache
+        super().__init__(**kwargs)
+
+    def _evaluation_settings(self):
+        """Parameters the cross-validation score of a pipeline depends on, besides the data."""
+        return {"cv": repr(self.cv), "subsample": self.subsample, "scoring": repr(self.scoring),
+                "random_state": self.random_state}
+
+    def fit(self, features, target, sample_weight = None, groups = None):
+        if self.score_cache is not None:
+            self._score_key = (data_fingerprint(features, target, sample_weight, groups),
+                               json.dumps(self._evaluation_settings(), sort_keys = True))
+        return super().fit(features, target, sample_weight = sample_weight, groups = groups)
+
+    def _preprocess_individuals(self, individuals):
+        if self.score_cache is not None:
+            # Pipelines found in the cache are skipped by TPOT as already evaluated in this run
+            new = {str(ind): ind for ind in individuals if len(ind) and str(ind) not in self.evaluated_individuals_}
+            for ind_str, (score, seconds) in self.score_cache.lookup(*self._score_key, new).items():
+                self.evaluated_individuals_[ind_str] = dict(self._combine_individual_stats(
+                    max(1, self._operator_count(new[ind_str])), score, new[ind_str].statistics), cv_seconds = seconds)
+        preprocessed = super()._preprocess_individuals(individuals)
+        # Evaluating in this process draws from the global random state the search evolves with,
+        # it is restored afterwards so the search does not depend on which pipelines were cached
+        self._random_state_before_evaluation = np.random.get_state()
+        self._evaluation_start = perf_counter()
+        self._evaluation_seconds = {}
+        return preprocessed
+
+    def _update_evaluated_individuals_(self, result_score_list, eval_individuals_str, operator_counts, stats_dicts):
+        super()._update_evaluated_individuals_(result_score_list, eval_individuals_str, operator_counts, stats_dicts)
+        # The wall-clock time of the generation is shared among the pipelines evaluated in parallel
+        n_evaluated = len(result_score_list)
+        shared = (perf_counter() - self._evaluation_start) * min(self._n_jobs, n_evaluated) / max(n_evaluated, 1)
+        seconds = [self._evaluation_seconds.get(ind_str, shared) for ind_str in eval_individuals_str[:n_evaluated]]
+        for ind_str, pipeline_seconds in zip(eval_individuals_str, seconds):
+            self.evaluated_individuals_[ind_str]["cv_seconds"] = pipeline_seconds
+        if self.score_cache is None:
+            return
+        np.random.set_state(self._random_state_before_evaluation)
+        if not result_score_list:
+            return
+        scores = [(ind_str, float(score), pipeline_seconds)
+                  for ind_str, score, pipeline_seconds in zip(eval_individuals_str, result_score_list, seconds)
+                  if np.isfinite(score)]
+        self.score_cache.store(*self._score_key, scores)
@@ -0,0 +1,135 @@
+import numpy as np
+
+_TREE_LEAF = -1
+
+# Ensembles whose prediction is the mean of their trees
+_AVERAGED_ENSEMBLES = set(["RandomForestRegressor", "ExtraTreesRegressor"])
+
+
+def _fitted_trees(estimator):
+    """Return (trees, scale, offset) with prediction = offset + scale * sum(tree predictions)."""
+    name = type(estimator).__name__
+    if name == "DecisionTreeRegressor":
+        return [estimator.tree_], 1., 0.
+    if name in _AVERAGED_ENSEMBLES:
+        trees = [tree.tree_ for tree in estimator.estimators_]
+        return trees, 1. / len(trees), 0.
+    if name == "GradientBoostingRegressor":
+        if isinstance(estimator.init_, str) and estimator.init_ == "zero":
+            offset = 0.
+        elif type(estimator.init_).__name__ == "DummyRegressor":
+            offset = float(np.ravel(estimator.init_.constant_)[0])
+        else:
+            raise ValueError(f"GradientBoostingRegressor with init estimator [{type(estimator.init_).__name__}]")
+        trees = [tree.tree_ for tree in np.ravel(estimator.estimators_)]
+        return trees, float(estimator.learning_rate), offset
+    raise ValueError(name)
+
+
+def is_supported(estimator):
+    name = type(estimator).__name__
+    return name == "DecisionTreeRegressor" or name == "GradientBoostingRegressor" or name in _AVERAGED_ENSEMBLES
+
+
+class FlatTreeEnsemble:
+    """
+    The trees of a fitted scikit-learn tree model stored as contiguous node arrays.
+
+    Node i of the ensemble continues with children[i, 0] when X[feature[i]] <= threshold[i]
+    and with children[i, 1] otherwise. Leaves point to themselves (with an infinite
+    threshold) and predict value[i]. Tree t starts at node roots[t]. The ensemble
+    predicts offset + scale * the sum of its trees.
+    """
+    def __init__(self, feature, threshold, children, value, roots, scale, offset, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.scale = scale
+        self.offset = offset
+        self.n_features = n_features
+
+    @classmethod
+    def from_estimator(cls, estimator):
+        trees, scale, offset = _fitted_trees(estimator)
+        if any(tree.n_outputs != 1 for tree in trees):
+            raise ValueError(f"{type(estimator).__name__} with multiple targets")
+
+        n_nodes = np.array([tree.node_count for tree in trees])
+        if n_nodes.sum() >= np.iinfo(np.int32).max:
+            raise ValueError(f"{type(estimator).__name__} with more than 2**31 nodes")
+        roots = np.concatenate([[0], np.cumsum(n_nodes)[:-1]]).astype(np.int32)
+
+        features, thresholds, children = [], [], []
+        for tree, root in zip(trees, roots):
+            is_leaf = tree.children_left == _TREE_LEAF
+            node_ids = np.arange(root, root + tree.node_count)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            children.append(np.stack([
+                np.where(is_leaf, node_ids, tree.children_left + root),
+                np.where(is_leaf, node_ids, tree.children_right + root),
+                ], axis = 1))
+
+        return cls(
+            feature = np.concatenate(features).astype(np.int32),
+            threshold = np.concatenate(thresholds).astype(np.float64),
+            children = np.concatenate(children).astype(np.int32),
+            value = np.concatenate([tree.value[:, 0, 0] for tree in trees]).astype(np.float64),
+            roots = roots,
+            scale = scale,
+            offset = offset,
+            n_features = int(estimator.n_features_in_) if hasattr(estimator, "n_features_in_") else int(estimator.n_features_),
+            )
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.feature, self.threshold, self.children, self.value, self.roots))
+
+    def predict(self, X, block_size = 1 << 16, steps_between_checks = 4):
+        """
+        Walk all trees for a block of rows at once, one level per step. Every few
+        steps the (row, tree) pairs that reached a leaf are retired, so unbalanced
+        trees cost about their actual depth rather than the depth of the deepest tree.
+        """
+        # scikit-learn trees compare float32 features to float64 thresholds
+        X = np.ascontiguousarray(X, dtype = np.float32)
+        n_rows, n_trees = len(X), len(self.roots)
+        children = self.children.ravel()
+        predictions = np.empty(n_rows, dtype = np.float64)
+        block_rows = max(1, block_size // n_trees)
+
+        for start in range(0, n_rows, block_rows):
+            block = X[start:start + block_rows].ravel()
+            n_block = min(block_rows, n_rows - start)
+
+            # One entry per (row, tree) pair
+            leaves = np.empty(n_block * n_trees, dtype = np.int32)
+            pairs = np.arange(n_block * n_trees)
+            node = np.tile(self.roots, n_block)
+            row_offset = np.repeat(np.arange(n_block, dtype = np.int32) * self.n_features, n_trees)
+            while node.size:
+                for _ in range(steps_between_checks):
+                    goes_right = block[row_offset + self.feature[node]] > self.threshold[node]
+                    node = children[2 * node + goes_right]
+                done = children[2 * node] == node
+                leaves[pairs[done]] = node[done]
+                running = ~done
+                node, row_offset, pairs = node[running], row_offset[running], pairs[running]
+
+            predictions[start:start + n_block] = self.value[leaves].reshape(n_block, n_trees).sum(axis = 1)
+
+        return self.offset + self.scale * predictions
+
+
+class TreeEnsemblePipeline:
+    """Fitted transformers of a pipeline followed by a flattened tree model."""
+    def __init__(self, transformers, ensemble):
+        self.transformers = transformers
+        self.ensemble = ensemble
+
+    def predict(self, X):
+        for transformer in self.transformers:
+            X = transformer.transform(X)
+        return self.ensemble.predict(X)
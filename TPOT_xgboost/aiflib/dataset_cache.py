@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+from aiflib.logger import Logger
+
+# Bytes read from the start and from the end of a source file for its checksum
+_CHECKSUM_SPAN = 1 << 20
+_METADATA = "metadata.json"
+
+
+def sampled_checksum(path, size):
+    """Checksum of the first and last megabyte of a file, cheap to compute for any file size."""
+    hasher = hashlib.blake2b(digest_size = 16)
+    with open(path, "rb") as infile:
+        hasher.update(infile.read(_CHECKSUM_SPAN))
+        if size > _CHECKSUM_SPAN:
+            infile.seek(max(_CHECKSUM_SPAN, size - _CHECKSUM_SPAN))
+            hasher.update(infile.read(_CHECKSUM_SPAN))
+    return hasher.hexdigest()
+
+
+class DatasetCache:
+    """
+    Parsed csv files stored column by column as .npy files, one folder per version of
+    a source file. A version is identified by the path, size, modification time and a
+    checksum of the file, plus the options it was parsed with, so a changed file is
+    parsed again. The least recently used entries are removed once the cache holds
+    more than `max_bytes`.
+    """
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.logger = Logger(__name__)
+        os.makedirs(directory, exist_ok = True)
+
+    def key(self, path, **read_options):
+        stat = os.stat(path)
+        fingerprint = [os.path.abspath(path), stat.st_size, stat.st_mtime_ns,
+                       sampled_checksum(path, stat.st_size), sorted(read_options.items())]
+        return hashlib.blake2b(json.dumps(fingerprint).encode("utf-8"), digest_size = 16).hexdigest()
+
+    def load(self, key):
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, _METADATA)) as infile:
+                metadata = json.load(infile)
+            columns = {
+                name: np.load(os.path.join(entry, f"{i}.npy"), allow_pickle = dtype == "object")
+                for i, (name, dtype) in enumerate(zip(metadata["columns"], metadata["dtypes"]))
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+        # The modification time of the metadata orders the entries for eviction
+        os.utime(os.path.join(entry, _METADATA))
+        return pd.DataFrame(columns, columns = metadata["columns"])
+
+    def store(self, key, frame, source):
+        entry = os.path.join(self.directory, key)
+        if os.path.isdir(entry):
+            return
+        staging = tempfile.mkdtemp(dir = self.directory, prefix = ".staging-")
+        try:
+            nbytes = 0
+            for i, name in enumerate(frame.columns):
+                values = frame[name].to_numpy()
+                # Strings and mixed columns are stored as pickled object arrays
+                np.save(os.path.join(staging, f"{i}.npy"), values, allow_pickle = values.dtype == object)
+                nbytes += os.path.getsize(os.path.join(staging, f"{i}.npy"))
+            with open(os.path.join(staging, _METADATA), "w") as outfile:
+                json.dump({
+                    "source": os.path.abspath(source),
+                    "columns": [str(name) for name in frame.columns],
+                    "dtypes": [str(values.dtype) for _, values in frame.items()],
+                    "nbytes": nbytes,
+                    }, outfile)
+            if nbytes > self.max_bytes:
+                return
+            os.rename(staging, entry)
+        except OSError as e:
+            # Another process stored the same entry, or the disk is full: parse next time
+            self.logger.verbose(f"Could not store [{source}] in the dataset cache: {e}")
+        finally:
+            shutil.rmtree(staging, ignore_errors = True)
+
+    def entries(self):
+        entries = []
+        for key in os.listdir(self.directory):
+            metadata_path = os.path.join(self.directory, key, _METADATA)
+            try:
+                with open(metadata_path) as infile:
+                    nbytes = json.load(infile)["nbytes"]
+                entries.append((os.path.getmtime(metadata_path), nbytes, key))
+            except (OSError, ValueError, KeyError):
+                continue
+        return entries
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(nbytes for _, nbytes, _ in entries)
+        for _, nbytes, key in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors = True)
+            total -= nbytes
+            self.logger.verbose(f"Evicted [{key}] from the dataset cache")
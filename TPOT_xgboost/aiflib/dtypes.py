@@ -0,0 +1,39 @@
+import numpy as np
+
+# Integers up to 2**24 in magnitude are exactly representable as float32
+_FLOAT32_EXACT_INTEGER = 1 << 24
+
+
+def is_float32_exact(values):
+    """Whether every value of a numeric array survives a round trip through float32."""
+    if values.dtype.kind in "iu":
+        return not len(values) or int(np.abs(values).max()) <= _FLOAT32_EXACT_INTEGER
+    # array_equal(equal_nan = True) needs numpy 1.19, the xgboost package pins 1.18
+    values32 = values.astype(np.float32)
+    return bool(((values32 == values) | (np.isnan(values32) & np.isnan(values))).all())
+
+
+def plan_column(values, mode):
+    """
+    dtype a feature column is kept in. Numeric columns become float32 when `mode` is
+    "float32", or when it is "auto" and float32 holds all their values exactly. Other
+    columns, and every column when `mode` is "float64", keep the dtype pandas parsed.
+    """
+    if mode == "float64" or values.dtype.kind not in "iuf" or values.dtype == np.float32:
+        return values.dtype
+    if mode == "float32" or is_float32_exact(values):
+        return np.dtype(np.float32)
+    return values.dtype
+
+
+def downcast_features(frame, mode, exclude = ()):
+    """Convert the feature columns of a frame in place to their planned dtype."""
+    for name in frame.columns:
+        if name in exclude:
+            continue
+        values = frame[name].to_numpy()
+        dtype = plan_column(values, mode)
+        if dtype != values.dtype:
+            frame[name] = values.astype(dtype)
+    return frame
+
@@ -0,0 +1,200 @@
+import json
+from contextlib import contextmanager
+
+from joblib import parallel_backend
+from joblib._parallel_backends import LokyBackend
+
+from aiflib.cpu_budget import available_cpus, limit_threads, preset_thread_variables, split_cpus
+from aiflib.logger import Logger, UiPathUsageException
+
+# Executors of the cross-validations of the pipeline search by name. An executor is called
+# as executor(workers, worker_threads, worker_memory_mb, **options) and returns a context
+# manager in which joblib runs on it, yielding the number of pipelines it evaluates in
+# parallel (the n_jobs of TPOT). workers = 0 and worker_threads = 0 are filled in from the
+# CPU budget of the container (see aiflib/cpu_budget.py), worker_memory_mb = 0 sets no
+# memory limit.
+_EXECUTORS = {}
+
+# Seconds an evaluation of the isolated executor may run past max_eval_seconds before it is
+# killed, so that TPOT's own timeout ends those that return to Python in time
+_KILL_GRACE_SECONDS = 5.
+
+
+def register_executor(name, executor):
+    _EXECUTORS[name] = executor
+
+
+def executor_for(name):
+    if name not in _EXECUTORS:
+        raise UiPathUsageException(f"Executor must be one of {sorted(_EXECUTORS)}, got [{name}]")
+    return _EXECUTORS[name]
+
+
+def worker_budget(workers, worker_threads):
+    """(workers, threads per worker) within the CPUs available to this process."""
+    cpus = available_cpus()
+    workers, worker_threads = split_cpus(workers, worker_threads, cpus)
+    logger = Logger(__name__)
+    logger.info(f"CPU budget: [{cpus}] CPUs, [{workers}] workers of [{worker_threads}] threads.")
+    if workers * worker_threads > cpus:
+        logger.info(f"[{workers * worker_threads}] worker threads oversubscribe the [{cpus}] available CPUs.")
+    return workers, worker_threads
+
+
+def limit_memory(max_bytes):
+    """Cap the address space of the current process, allocations past it raise MemoryError."""
+    import resource
+    # Only the soft limit, a later search of the same process may set a higher one
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes if hard == resource.RLIM_INFINITY else min(max_bytes, hard), hard))
+
+
+class _MemoryLimitedBatch:
+    """A joblib batch of calls capping the address space of its worker process while it runs."""
+    def __init__(self, batch, max_bytes):
+        self.batch = batch
+        self.max_bytes = max_bytes
+
+    def __call__(self):
+        import resource
+        previous = resource.getrlimit(resource.RLIMIT_AS)
+        limit_memory(self.max_bytes)
+        try:
+            return self.batch()
+        finally:
+            # The worker may next run tasks of other joblib calls of this process
+            resource.setrlimit(resource.RLIMIT_AS, previous)
+
+    def __len__(self):
+        return len(self.batch)
+
+
+class MemoryLimitedLokyBackend(LokyBackend):
+    """
+    joblib's loky backend capping the address space of its workers at `max_bytes` while
+    they run its batches. loky's executor is shared by every joblib call of the process,
+    and its backend only takes a worker initializer from joblib 1.3 on.
+    """
+    def __init__(self, max_bytes, **kwargs):
+        super().__init__(**kwargs)
+        self.max_bytes = max_bytes
+
+    def _limited(self, func):
+        return func if isinstance(func, _MemoryLimitedBatch) else _MemoryLimitedBatch(func, self.max_bytes)
+
+    def apply_async(self, func, callback = None):
+        return super().apply_async(self._limited(func), callback = callback)
+
+    def submit(self, func, callback = None):
+        # joblib 1.3 and later
+        return super().submit(self._limited(func), callback = callback)
+
+
+class MemoryLimit:
+    """Dask worker plugin capping the address space of every worker process, restarted ones too."""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+
+    def setup(self, worker):
+        limit_memory(self.max_bytes)
+
+
+class ThreadLimit:
+    """Dask worker plugin capping the BLAS and OpenMP threads of every worker process."""
+    def __init__(self, threads):
+        self.threads = threads
+
+    def setup(self, worker):
+        limit_threads(self.threads)
+
+
+@contextmanager
+def local_executor(workers, worker_threads, worker_memory_mb, **options):
+    """Pool of worker processes on this machine (joblib's loky backend)."""
+    n_jobs, worker_threads = worker_budget(workers, worker_threads)
+    backend = MemoryLimitedLokyBackend(worker_memory_mb << 20) if worker_memory_mb > 0 else "loky"
+    limits = {}
+    if not preset_thread_variables():
+        # inner_max_num_threads caps the BLAS and OpenMP threads of every worker. It overrides
+        # the thread variables of the environment, so it is left out when the operator set one.
+        limits["inner_max_num_threads"] = worker_threads
+    with parallel_backend(backend, n_jobs = n_jobs, **limits):
+        yield n_jobs
+
+
+@contextmanager
+def dask_executor(workers, worker_threads, worker_memory_mb, scheduler_address = "", **options):
+    """
+    Dask cluster: the scheduler at `scheduler_address`, whose workers were started with
+    their own limits (dask-worker --nthreads --memory-limit), or without an address a
+    LocalCluster of worker processes on this machine.
+    """
+    try:
+        from distributed import Client, LocalCluster
+    except ImportError:
+        raise UiPathUsageException("The dask executor requires the optional [distributed] package.")
+
+    logger = Logger(__name__)
+    cluster = None
+    if scheduler_address:
+        client = Client(scheduler_address)
+    else:
+        workers, worker_threads = worker_budget(workers, worker_threads)
+        cluster = LocalCluster(
+            n_workers = workers,
+            threads_per_worker = worker_threads,
+            memory_limit = f"{worker_memory_mb}MB" if worker_memory_mb > 0 else 0,
+            processes = True,
+            dashboard_address = None,
+            )
+        client = Client(cluster)
+        # Every dask thread evaluates its own pipeline, with a single BLAS / OpenMP thread
+        client.register_worker_plugin(ThreadLimit(1), name = "thread_limit")
+        if worker_memory_mb > 0:
+            # A pipeline allocating past the limit fails with a MemoryError before the
+            # nanny restarts its worker, which would end the whole search
+            client.register_worker_plugin(MemoryLimit(worker_memory_mb << 20), name = "memory_limit")
+    try:
+        n_jobs = sum(client.nthreads().values())
+        logger.info(f"Evaluating pipelines on [{len(client.nthreads())}] dask workers with [{n_jobs}] threads.")
+        with parallel_backend("dask", n_jobs = n_jobs):
+            yield n_jobs
+    finally:
+        client.close()
+        if cluster is not None:
+            cluster.close()
+
+
+@contextmanager
+def isolated_executor(workers, worker_threads, worker_memory_mb, max_eval_seconds = None, report_path = "", **options):
+    """
+    Pool of supervised worker processes on this machine, reused by every evaluation. An
+    evaluation running past `max_eval_seconds`, or whose worker goes past `worker_memory_mb`
+    of resident memory, is killed with its worker, which is replaced. The killed evaluations
+    are logged and written to `report_path`.
+    """
+    from aiflib.isolation import SupervisedBackend, SupervisedPool
+
+    logger = Logger(__name__)
+    workers, worker_threads = worker_budget(workers, worker_threads)
+    pool = SupervisedPool(
+        workers,
+        threads = worker_threads,
+        max_seconds = None if max_eval_seconds is None else max_eval_seconds + _KILL_GRACE_SECONDS,
+        max_bytes = worker_memory_mb << 20,
+        )
+    try:
+        with parallel_backend(SupervisedBackend(pool), n_jobs = workers):
+            # TPOT evaluates in its own process when n_jobs = 1, a single worker is used through joblib
+            yield max(workers, 2)
+    finally:
+        pool.close()
+        logger.info(f"[{len(pool.killed)}] pipeline evaluations were killed at their time or memory limit.")
+        if report_path:
+            with open(report_path, "w") as outfile:
+                json.dump(pool.killed, outfile, indent = 2)
+
+
+register_executor("local", local_executor)
+register_executor("dask", dask_executor)
+register_executor("isolated", isolated_executor)
@@ -0,0 +1,144 @@
+import gzip
+import hashlib
+import os
+import zlib
+
+from aiflib.logger import UiPathUsageException
+
+# File formats of the train / test split written by process_data, by file extension
+CSV = "csv"
+CSV_GZIP = "csv.gz"
+CSV_ZSTD = "csv.zst"
+PARQUET = "parquet"
+SPLIT_FORMATS = [CSV, CSV_GZIP, CSV_ZSTD, PARQUET]
+
+CHECKSUMS = ["md5", "blake2b", "crc32", "xxhash", "none"]
+
+# Values per chunk written, the rows of a frame are serialized and hashed one chunk at a time.
+# Parquet row groups hold more rows, small row groups make the file slower to read.
+_CSV_CHUNK_VALUES = 1 << 18
+_PARQUET_CHUNK_VALUES = 1 << 20
+# The default level of the gzip command line tool, level 9 takes twice as long for a few percent
+_GZIP_LEVEL = 6
+
+
+def is_parquet(path):
+    return path.endswith(".parquet") or path.endswith(".pq")
+
+
+class Crc32:
+    """hashlib-like interface to zlib.crc32."""
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        return f"{self.value:08x}"
+
+
+def new_hasher(checksum):
+    """Hash object of one of CHECKSUMS, None for "none"."""
+    if checksum == "md5":
+        return hashlib.md5()
+    if checksum == "blake2b":
+        return hashlib.blake2b()
+    if checksum == "crc32":
+        return Crc32()
+    if checksum == "xxhash":
+        try:
+            import xxhash
+        except ImportError:
+            raise UiPathUsageException("The xxhash checksum requires the optional [xxhash] package.")
+        return xxhash.xxh3_64()
+    return None
+
+
+class HashingFile:
+    """Binary file wrapper hashing the bytes written through it."""
+    def __init__(self, outfile, hasher):
+        self.outfile = outfile
+        self.hasher = hasher
+        self.closed = False
+
+    def write(self, data):
+        if self.hasher is not None:
+            self.hasher.update(data)
+        return self.outfile.write(data)
+
+    def tell(self):
+        return self.outfile.tell()
+
+    def flush(self):
+        self.outfile.flush()
+
+
+def _chunks(frame, rows, values):
+    n_rows = len(frame) if rows is None else len(rows)
+    step = max(1, values // max(1, len(frame.columns)))
+    for start in range(0, n_rows, step):
+        yield frame.iloc[start:start + step] if rows is None else frame.iloc[rows[start:start + step]]
+
+
+def _write_csv(outfile, frame, rows, delimiter, encoding):
+    header = True
+    for chunk in _chunks(frame, rows, _CSV_CHUNK_VALUES):
+        outfile.write(chunk.to_csv(index = False, sep = delimiter, header = header).encode(encoding))
+        header = False
+    if header:
+        outfile.write(frame.iloc[:0].to_csv(index = False, sep = delimiter).encode(encoding))
+
+
+def _write_parquet(outfile, frame, rows):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise UiPathUsageException("The parquet split format requires the optional [pyarrow] package.")
+    schema = pa.Schema.from_pandas(frame, preserve_index = False)
+    with pq.ParquetWriter(outfile, schema) as writer:
+        for chunk in _chunks(frame, rows, _PARQUET_CHUNK_VALUES):
+            writer.write_table(pa.Table.from_pandas(chunk, schema = schema, preserve_index = False))
+
+
+def write_frame(frame, path, file_format = CSV, checksum = "md5", rows = None, delimiter = ",", encoding = "utf-8"):
+    """
+    Write the rows of a frame (all of them or the positions `rows`) chunk by chunk and
+    hash the bytes of the file as they are written. Returns the hex digest of the file,
+    None for the checksum "none".
+    """
+    hasher = new_hasher(checksum)
+    try:
+        with open(path, "wb") as raw:
+            outfile = HashingFile(raw, hasher)
+            if file_format == PARQUET:
+                _write_parquet(outfile, frame, rows)
+            elif file_format == CSV_GZIP:
+                # No file name and modification time in the header, the same rows give the same checksum
+                with gzip.GzipFile(filename = "", mode = "wb", fileobj = outfile, mtime = 0,
+                                   compresslevel = _GZIP_LEVEL) as compressed:
+                    _write_csv(compressed, frame, rows, delimiter, encoding)
+            elif file_format == CSV_ZSTD:
+                try:
+                    import zstandard
+                except ImportError:
+                    raise UiPathUsageException("The csv.zst split format requires the optional [zstandard] package.")
+                with zstandard.ZstdCompressor().stream_writer(outfile, closefd = False) as compressed:
+                    _write_csv(compressed, frame, rows, delimiter, encoding)
+            else:
+                _write_csv(outfile, frame, rows, delimiter, encoding)
+    except BaseException:
+        # A partial file would be read as data
+        if os.path.isfile(path):
+            os.remove(path)
+        raise
+    return hasher.hexdigest() if hasher is not None else None
+
+
+def remove_other_formats(directory, name, file_format):
+    """Remove the files of `name` written in another split format, which would be read as well."""
+    for other in SPLIT_FORMATS:
+        path = os.path.join(directory, f"{name}.{other}")
+        if other != file_format and os.path.isfile(path):
+            os.remove(path)
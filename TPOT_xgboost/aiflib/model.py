@@ -1,17 +1,20 @@
+import gc
 import os
-import json
 import joblib
 import numpy as np
-import pandas as pd
-from tpot import TPOTRegressor
-from collections import defaultdict
-from sklearn.model_selection import train_test_split
-from sklearn.pipeline import Pipeline
-from sklearn.impute import SimpleImputer
-from aiflib.data_manager import DataManager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 from aiflib.config import Config
+from aiflib import codec, cpu_budget
+from aiflib.cache import PredictionCache
+from aiflib.trees import TreeEnsemblePipeline
 from aiflib.logger import Logger, UiPathUsageException
 
+# Training-only dependencies (tpot and DEAP, DataManager, model selection, the pipeline
+# compiler) are imported by the methods that use them, so that serving a saved
+# pipeline only imports what unpickling that pipeline needs.
+
 # Constants
 _UNTRAINED_HELP = """\n This TPOT Python Automated Machine Learning Pipeline 
 has not been trained. Use AI Fabric to train this model on your own tabular data.
@@ -29,47 +32,158 @@ best pipeline it found so you can tinker with the pipeline from there. See AI Fa
 Documentation for a detailed explanation and other configuration parameters.
 """
 
+# Artifacts loaded by inference-only models, keyed by path, modification time, size
+# and mmap mode. Workers forked after preload() find them here instead of on disk.
+_loaded_artifacts = {}
+
+
+def load_artifact(path, mmap_mode = None):
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size, mmap_mode)
+    if key not in _loaded_artifacts:
+        for stale in [k for k in _loaded_artifacts if k[0] == path]:
+            del _loaded_artifacts[stale]
+        _loaded_artifacts[key] = joblib.load(path, mmap_mode = mmap_mode)
+    return _loaded_artifacts[key]
+
+
+def preload():
+    """
+    Load the model artifacts in a serving master process before it forks its workers.
+    Workers then create Main() without reading the artifacts again and share the
+    loaded pages with the master until they write to them. Nothing is predicted here:
+    a prediction would start thread pools that do not survive a fork (XGBoost's
+    OpenMP), the workers warm up after they are forked (see serving.serve).
+    """
+    model = Model(is_infer_only = True)
+    # Keep the garbage collector from touching (and so copying) the preloaded objects
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+    return model
+
+
 class Model():
     def __init__(self, is_infer_only = False):
         self.config = Config()
         self.logger = Logger(__name__)
-        self._model = self.load_model()
-        self._label_encoder = self.load_labelencoder()
+        self.is_infer_only = is_infer_only
+        # Splits of process_data kept in memory, and their csv files being written, by directory
+        self._splits = {}
+        self._split_writes = {}
+        self._csv_writer = None
+        if is_infer_only:
+            # Native thread pools sized to the CPU quota of the container, not to the host
+            self.limit_threads()
+        self.reload()
+        self._cache = None
+        if self.config.prediction_cache_size > 0:
+            self._cache = PredictionCache(self.config.prediction_cache_size, self.config.prediction_cache_ttl)
+            self._cache.clear(self.model_version())
 
     def train(self, directory):
-
-        dm = DataManager(directory)
+        # With search_sample the files are streamed and only bounded samples are kept in memory
+        dm = self.data_manager(directory, pop = True, sample = self.config.search_sample != "none")
         
         if not dm.validate():
             raise UiPathUsageException("No valid data to run this pipeline.")
 
         data_df = dm.get_data()
-        X = data_df[dm.get_feature_columns()].values
-        y = data_df[dm.get_target_column()].values
+        refit_df = dm.get_refit_data()
+        feature_columns = dm.get_feature_columns()
+        # float32 when every feature column was stored as float32 by the DataManager
+        X = data_df[feature_columns].to_numpy()
+        y = data_df[dm.get_target_column()].to_numpy()
+        # The frames are not needed anymore, free them before the search
+        del data_df
+        dm.raw_data = dm.refit_data = None
+        # Rows (with their missing values) to check the compiled pipeline on, X is imputed in place
+        X_check = X[:1000].copy()
 
         help_string = "Warning: You have retrained a model which was generated by a TPOT optimization pipeline.\
         \nFor optimal results please run the TPOT optimization pipeline from scratch by training package version [1.0]."
 
-        if not self.is_trained() or self.config.warm_start == True:
-            self._model = self.build_model(X, y)
-        else:
+        is_search = not self.is_trained() or self.config.warm_start == True
+        is_refit = refit_df is not None
+        if is_search:
+            # The refit on the larger sample is part of the time budget of the search
+            self._model = self.build_model(X, y, refit_rows = len(refit_df) if is_refit else 0)
+
+        if is_refit:
+            # The search ran on a sample, the best pipeline is fitted on the larger refit sample
+            X = refit_df.reindex(columns = feature_columns).to_numpy()
+            y = refit_df[dm.get_target_column()].to_numpy()
+            del refit_df
+            self.logger.info(f"Refitting the best pipeline on [{len(X)}] sampled points.")
+        if not is_search or is_refit:
             self._model.fit(X, y)
+        if not is_search:
             self.logger.info(f"Finished retraining model.")
             self.logger.info(help_string)
+        if dm.n_rows > len(X):
+            self.partial_fit_chunks(dm, feature_columns)
             
         joblib.dump(self._model, os.path.join(self.config.cur_dir, "model", "Model.sav"))
+        # Feature order and dtype of the fitted pipeline, used to decode prediction input by column name
+        features = {"columns": feature_columns, "dtype": "float32" if X.dtype == np.float32 else "float64"}
+        joblib.dump(features, os.path.join(self.config.cur_dir, "model", "Features.sav"))
+        self._input_schema = self.load_input_schema()
+        self.export_compiled(X_check)
+
+    def partial_fit_chunks(self, dm, feature_columns):
+        """
+        Update the final estimator of a pipeline fitted on a sample with partial_fit on
+        every chunk of the training files, without the rows of that sample, when it supports
+        partial_fit. The other steps keep their fit on the sample.
+        """
+        pipeline = self._model.steps[-1][1]
+        steps = self._model.steps[:-1] + (pipeline.steps if hasattr(pipeline, "steps") else [("estimator", pipeline)])
+        estimator = steps[-1][1]
+        if not self.config.refit_partial_fit or not hasattr(estimator, "partial_fit"):
+            return
+
+        self.logger.info(f"Updating [{type(estimator).__name__}] with partial_fit on the points outside its sample.")
+        for chunk in dm.iter_chunks():
+            X = chunk.reindex(columns = feature_columns).to_numpy()
+            for _, step in steps[:-1]:
+                if step is None or step == "passthrough":
+                    continue
+                X = step.transform(X)
+            estimator.partial_fit(X, chunk[dm.get_target_column()].to_numpy())
+
+    def export_compiled(self, X):
+        from aiflib.compiler import compile_pipeline
+
+        compiled_path = os.path.join(self.config.cur_dir, "model", "Compiled.sav")
+        if os.path.isfile(compiled_path):
+            os.remove(compiled_path)
+        self._compiled = None
+        if not self.config.compile_pipeline:
+            return
+
+        # Rows the compiled kernel has to reproduce the pipeline predictions on
+        n_check = min(len(X), 1000)
+        self._compiled = compile_pipeline(self._model, X[:n_check], self.logger)
+        if self._compiled is not None:
+            joblib.dump(self._compiled, compiled_path)
+            self.logger.info(f"Saving compiled pipeline to {compiled_path}")
     
 
     def evaluate(self, evaluation_directory):
-
-        dm = DataManager(evaluation_directory)
+        # Only the features of the model and the target are read when the feature list is known
+        columns = self._input_schema.columns if self._input_schema is not None else None
+        dm = self.data_manager(evaluation_directory, columns = columns)
         data_df = dm.get_data()
 
         if not dm.validate(for_train = False):
             self.logger.info("No valid test data to run this evaluation pipeline.")
 
         data_df = dm.get_data()
-        X = data_df[dm.get_feature_columns()].values
+        if self._input_schema is not None:
+            # Select the features by name, in the order the model was trained on
+            X = codec.select_columns(data_df, self._input_schema)
+        else:
+            X = data_df[dm.get_feature_columns()].values
         y = data_df[dm.get_target_column()].values
 
         if not self.is_trained():
@@ -80,72 +194,183 @@ class Model():
             return score
 
     def process_data(self, directory):
+        from sklearn.model_selection import train_test_split
+        from aiflib.data_manager import DataManager
 
-        if not self.config.test_data_from_ui:
-            dm = DataManager(directory)
-            
-            if not dm.validate():
-                raise UiPathUsageException("No valid data to run this pipeline.")
-            
-            all_data = dm.get_data()
+        dm = DataManager(directory)
+
+        if not dm.validate():
+            raise UiPathUsageException("No valid data to run this pipeline.")
+
+        all_data = dm.get_data()
 
+        if not self.config.test_data_from_ui:
             # Stratified split
             percentage = self.config.process_data_split_percentage
             
+            # Split row positions, the rows of the frame are only copied by whoever reads a split
             train, test = train_test_split(
-                all_data, 
+                np.arange(len(all_data)), 
                 test_size = percentage, 
                 random_state = self.config.seed, 
                 )
-
-            # Write train.csv
-            DataManager.write_dataframe(
-                train, 'train', self.config.train_data_directory)
-
-            # Write evaluate.csv
-            DataManager.write_dataframe(
-                test, 'test', self.config.test_data_directory)
+            splits = [(train, 'train', self.config.train_data_directory),
+                      (test, 'test', self.config.test_data_directory)]
         else:
-            dm = DataManager(directory)
-
-            if not dm.validate():
-                raise UiPathUsageException("No valid data to run this pipeline.")
-            
-            all_data = dm.get_data()
-
-            # Write train.csv
-            DataManager.write_dataframe(
-                all_data, 'train', self.config.train_data_directory)            
+            splits = [(None, 'train', self.config.train_data_directory)]
             self.logger.info("Did not split data into train and test sets. Model will be evaluated on data selected from UI.")
 
-
-    def build_model(self, X, y):
-        # Perform missing value imputation as scikit-learn models can't handle NaN's
-        nan_imputer = SimpleImputer(missing_values=np.nan, strategy="mean")
+        for rows, name, split_directory in splits:
+            self.store_split(all_data, rows, name, split_directory)
+
+    def store_split(self, frame, rows, name, directory):
+        """
+        Write the rows of a split to directory/name.csv (or the split_format). In a fused pipeline the rows are
+        also kept in memory for train and evaluate to use instead of the csv file, which
+        is then written in the background (write_split_csv "async"), right away ("sync")
+        or not at all ("false").
+        """
+        from aiflib.data_manager import DataManager
+
+        write_csv = lambda: DataManager.write_dataframe(frame, name, directory, rows = rows)
+        if not self.config.fused_pipeline:
+            write_csv()
+            return
+
+        # The training rows are read once, they stay a view of the frame until then
+        directory = os.path.abspath(directory)
+        self._splits[directory] = (frame, rows) if name == 'train' or rows is None else (frame.iloc[rows], None)
+        if self.config.write_split_csv == "sync":
+            write_csv()
+        elif self.config.write_split_csv == "async":
+            if self._csv_writer is None:
+                self._csv_writer = ThreadPoolExecutor(1)
+            write = self._csv_writer.submit(write_csv)
+            write.add_done_callback(lambda write: write.exception() is None or self.logger.info(
+                f"Failed to write {name}.{self.config.split_format} to {directory}: {write.exception()}"))
+            self._split_writes[directory] = write
+
+    def data_manager(self, directory, pop = False, **kwargs):
+        """DataManager of the split kept in memory for `directory` if there is one, of its csv files otherwise."""
+        from aiflib.data_manager import DataManager
+
+        directory = os.path.abspath(directory)
+        if directory in self._splits:
+            # With sample = True the samples are drawn from the split in memory
+            frame, rows = self._splits.pop(directory) if pop else self._splits[directory]
+            return DataManager(directory, data = frame if rows is None else frame.iloc[rows], **kwargs)
+        if directory in self._split_writes:
+            # The csv file of the split is read back, wait until it has been written
+            self._split_writes.pop(directory).result()
+        return DataManager(directory, **kwargs)
+
+
+    def search_space(self, X, y):
+        """TPOT config dict pruned for the profile of the training data, cached in the artifacts directory."""
+        from aiflib.planner import plan_search_space
+        from aiflib.profiling import ProfileCache
+
+        if not self.config.search_space_pruning:
+            return self.config.classifier_config_dict
+        profile = ProfileCache(os.path.join(self.config.artifacts_directory, "dataset_profile")).profile(X, y)
+        config_dict, changes = plan_search_space(
+            self.config.classifier_config_dict, profile, self.config.cv, self.config.subsample)
+        for operator, change in changes:
+            self.logger.info(f"Search space: [{operator}] {change}.")
+        return config_dict
+
+    def build_model(self, X, y, refit_rows = 0):
+        from sklearn.pipeline import Pipeline
+        from sklearn.impute import SimpleImputer
+        from aiflib.executors import executor_for
+        from aiflib.scheduler import BudgetScheduler, ScheduledTPOTRegressor
+        from aiflib.score_cache import ScoreCache
+        from aiflib.shared_data import SharedTrainingData, shared_directory
+
+        config_dict = self.search_space(X, y)
+
+        # Perform missing value imputation as scikit-learn models can't handle NaN's.
+        # X is imputed in place, the saved imputer copies its input when predicting.
+        nan_imputer = SimpleImputer(missing_values=np.nan, strategy="mean", copy=False)
         X = nan_imputer.fit_transform(X)
-
-        pipeline_optimizer = TPOTRegressor(
-            generations = self.config.generations, 
-            population_size = self.config.population_size,
-            offspring_size = self.config.offspring_size,
-            mutation_rate = self.config.mutation_rate,
-            crossover_rate = self.config.crossover_rate,
-            scoring = self.config.scoring, 
+        nan_imputer.set_params(copy=True)
+
+        regressor = ScheduledTPOTRegressor
+        if self.config.search_fidelity == "halving":
+            from aiflib.halving import HalvingTPOTRegressor
+            regressor = partial(HalvingTPOTRegressor, halving_factor = self.config.halving_factor,
+                                halving_min_rows = self.config.halving_min_rows)
+
+        # Pipelines scored by earlier runs on the same data and settings are not evaluated again
+        score_cache = None
+        if self.config.pipeline_score_cache:
+            score_cache = ScoreCache(os.path.join(self.config.artifacts_directory, "pipeline_scores.sqlite"),
+                                     self.config.pipeline_score_cache_max_entries)
+
+        # Logs every generation, ends the search when it stops paying off and keeps time for the refit
+        scheduler = BudgetScheduler(
+            self.config.max_time_mins,
+            min_gain_per_min = self.config.min_gain_per_min,
+            window = self.config.gain_window,
+            reserve_refit = self.config.reserve_refit_time,
             cv = self.config.cv,
-            subsample = self.config.subsample, 
-            n_jobs = -1,
-            max_time_mins = self.config.max_time_mins, 
-            max_eval_time_mins = self.config.max_eval_time_mins,
-            random_state = self.config.seed, 
-            config_dict = self.config.classifier_config_dict,
-            warm_start = self.config.warm_start,
-            memory = self.config.artifacts_directory,
-            verbosity = 1
+            subsample = self.config.subsample,
+            refit_scale = refit_rows / max(len(X), 1),
             )
-        
-        # Fit TPOT to data
-        pipeline_optimizer.fit(X, y)
+
+        # Pipelines are cross-validated on the executor: a local process pool, supervised local processes or a dask cluster
+        executor = executor_for(self.config.executor)(
+            self.config.executor_workers, self.config.worker_threads, self.config.worker_memory_mb,
+            scheduler_address = self.config.dask_scheduler_address,
+            max_eval_seconds = self.config.max_eval_time_mins * 60,
+            report_path = os.path.join(self.config.artifacts_directory, "killed_evaluations.json"),
+            )
+        # Workers map the training data and the cross-validation folds from files written
+        # once instead of receiving a copy with every batch of pipelines. The workers of a
+        # remote dask cluster can only when they share the directory of the files.
+        shared = nullcontext((X, y, self.config.cv))
+        if self.config.shared_training_data and (
+                self.config.shared_data_directory or not
+                (self.config.executor == "dask" and self.config.dask_scheduler_address)):
+            directory = self.config.shared_data_directory or shared_directory(
+                X.nbytes + y.nbytes, self.config.artifacts_directory)
+            shared = SharedTrainingData(X, y, self.config.cv, directory)
+        with executor as n_jobs, shared as (X_shared, y_shared, folds):
+            pipeline_optimizer = regressor(
+                score_cache = score_cache,
+                scheduler = scheduler,
+                generations = self.config.generations, 
+                population_size = self.config.population_size,
+                offspring_size = self.config.offspring_size,
+                mutation_rate = self.config.mutation_rate,
+                crossover_rate = self.config.crossover_rate,
+                scoring = self.config.scoring, 
+                cv = folds,
+                subsample = self.config.subsample, 
+                n_jobs = n_jobs,
+                max_time_mins = self.config.max_time_mins, 
+                max_eval_time_mins = self.config.max_eval_time_mins,
+                early_stop = self.config.early_stop,
+                random_state = self.config.seed, 
+                config_dict = config_dict,
+                warm_start = self.config.warm_start,
+                memory = self.config.artifacts_directory,
+                verbosity = 1
+                )
+
+            # Fit TPOT to data
+            try:
+                pipeline_optimizer.fit(X_shared, y_shared)
+            finally:
+                if score_cache is not None:
+                    score_cache.close()
+                    self.logger.info(
+                        f"Pipeline score cache: [{score_cache.hits}] hits, [{score_cache.misses}] misses, "
+                        f"[{score_cache.evictions}] evicted, about [{score_cache.saved_seconds:.0f}] seconds of evaluation saved.")
         self.logger.info(f"Finished running TPOT optimization pipeline.")
+        self.logger.info(
+            f"Fitting the best pipeline took [{getattr(pipeline_optimizer, 'refit_seconds_', 0.):.1f}] s, "
+            f"[{scheduler.reserve_seconds():.1f}] s were reserved for it and the refit on the larger sample.")
 
         # Export fitted pipeline to artifacts directory
         pipeline_path = os.path.join(self.config.artifacts_directory, "TPOT_pipeline.py")
@@ -163,26 +388,138 @@ class Model():
 
     def predict(self, mlskill_input): 
 
-        data = pd.read_json(mlskill_input)
-        predictions = self._model.predict(data.values)
-        return json.dumps(predictions.tolist())
+        data = self.decode_input(mlskill_input)
+        predictions = self.predict_array(data)
+        return self.encode_output(predictions)
+
+    def encode_output(self, predictions, output_format = None):
+        # JSON text by default, or raw float32 / float64 bytes or an Arrow IPC stream
+        return codec.encode_predictions(
+            predictions,
+            output_format = output_format or self.config.output_format,
+            precision = self.config.output_precision,
+            )
+
+    def decode_input(self, mlskill_input):
+        # JSON text, or a binary .npy / Arrow IPC payload detected from its magic bytes
+        return codec.decode_input(mlskill_input, self._input_schema)
+
+    def predict_array(self, data):
+        if self._cache is None:
+            return self.predict_pipeline(data)
+        version = self.model_version()
+        if version != self._cache.version:
+            self.logger.info("Model.sav has changed, reloading the model and clearing the prediction cache.")
+            self.reload()
+            self._cache.clear(version)
+        return self._cache.predict(data, self.predict_pipeline)
+
+    def predict_pipeline(self, data):
+        if self._compiled is not None and (self._model is None or self.use_compiled(len(data))):
+            return self._compiled.predict(data)
+        return self._model.predict(data)
+
+    def limit_threads(self, processes = 1):
+        """
+        Cap the BLAS / OpenMP threads of this serving process at predict_threads, or at its
+        share of the CPU budget when `processes` processes serve or score side by side.
+        """
+        _, threads = cpu_budget.split_cpus(processes, self.config.predict_threads)
+        cpu_budget.limit_threads(threads)
+        self.logger.verbose(f"Limited the native thread pools of this process to [{threads}] threads.")
+
+    def warm_up(self):
+        """
+        Score one all-NaN row so that the imports and allocations scikit-learn defers
+        to its first predict call (e.g. SimpleImputer imports pandas) are done before
+        the first request arrives.
+        """
+        if not self.is_trained() or self._input_schema is None:
+            return
+        row = np.full((1, len(self._input_schema.columns)), np.nan, dtype = self._input_schema.dtype)
+        try:
+            if self._model is not None:
+                self._model.predict(row)
+            if self._compiled is not None:
+                self._compiled.predict(row)
+        except Exception as e:
+            self.logger.verbose(f"Warm-up prediction failed: {e}")
+
+    def use_compiled(self, n_rows):
+        if isinstance(self._compiled, TreeEnsemblePipeline):
+            return n_rows <= self.config.tree_engine_max_rows
+        return True
+
+    @property
+    def input_schema(self):
+        return self._input_schema
+
+    def cache_stats(self):
+        return self._cache.stats() if self._cache is not None else None
+
+    def model_version(self):
+        try:
+            stat = os.stat(os.path.join(self.config.cur_dir, "model", "Model.sav"))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        self._compiled = self.load_compiled()
+        # Serving with flattened trees, they predict every batch: the scikit-learn trees are not held twice
+        if self.is_infer_only and isinstance(self._compiled, TreeEnsemblePipeline):
+            self._model = None
+        else:
+            self._model = self.load_model()
+        self._label_encoder = self.load_labelencoder()
+        self._input_schema = self.load_input_schema()
+
+    def load_artifact(self, path):
+        if not self.is_infer_only:
+            return joblib.load(path)
+        # Serving: NumPy arrays are memory-mapped read-only so that workers share them via the page cache.
+        # scikit-learn trees copy their node arrays when unpickled, their pages are never shared this way.
+        return load_artifact(path, mmap_mode = "r" if self.config.mmap_model else None)
 
     def load_model(self):
         if os.path.isfile(os.path.join(self.config.cur_dir, "model", "Model.sav")):
             self.logger.info(f"Loading pre-trained model...")
-            return joblib.load(os.path.join(self.config.cur_dir, "model", "Model.sav"))
+            return self.load_artifact(os.path.join(self.config.cur_dir, "model", "Model.sav"))
         else:
             return None
 
     def load_labelencoder(self):
         if os.path.isfile(os.path.join(self.config.cur_dir, "model", "LabelEncoder.sav")):
             self.logger.info(f"Loading label encoder...")
-            return joblib.load(os.path.join(self.config.cur_dir, "model", "LabelEncoder.sav"))
+            return self.load_artifact(os.path.join(self.config.cur_dir, "model", "LabelEncoder.sav"))
+        else:
+            return None
+
+    def load_compiled(self):
+        if os.path.isfile(os.path.join(self.config.cur_dir, "model", "Compiled.sav")):
+            self.logger.info(f"Loading compiled pipeline...")
+            return self.load_artifact(os.path.join(self.config.cur_dir, "model", "Compiled.sav"))
+        else:
+            return None
+
+    def load_input_schema(self):
+        if os.path.isfile(os.path.join(self.config.cur_dir, "model", "Features.sav")):
+            features = self.load_artifact(os.path.join(self.config.cur_dir, "model", "Features.sav"))
+            # Models trained before the training dtype was saved hold the list of columns only
+            if not isinstance(features, dict):
+                features = {"columns": features, "dtype": "float64"}
+            dtype = features["dtype"] if self.config.input_dtype == "auto" else self.config.input_dtype
+            return codec.InputSchema(
+                features["columns"],
+                dtype = dtype,
+                fill_missing = self.config.missing_features == "nan",
+                )
         else:
+            # Models trained before the feature list was saved expect the input columns in training order
             return None
 
     def is_trained(self):
-        if self._model is None:
+        if self._model is None and self._compiled is None:
             return False
         else:
             return True
\ No newline at end of file
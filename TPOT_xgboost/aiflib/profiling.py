@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import tempfile
+import warnings
+import numpy as np
+
+from aiflib.logger import Logger
+
+# Rows the profile is computed on, evenly spaced over the data
+_PROFILE_ROWS = 100000
+# Distinct values counted per column, above this a column is just "high cardinality"
+_MAX_UNIQUE = 1000
+
+
+def profile_rows(X):
+    """Evenly spaced rows of X the profile is computed on."""
+    step = max(1, -(-len(X) // _PROFILE_ROWS))
+    return X[::step]
+
+
+def n_unique(sample):
+    """Distinct non-NaN values of each column of a 2-d array, capped at _MAX_UNIQUE + 1."""
+    if not len(sample):
+        return np.zeros(sample.shape[1], dtype = int)
+    # NaN sorts last and compares unequal, it counts as a value change only once
+    ordered = np.sort(sample, axis = 0)
+    changes = (ordered[1:] != ordered[:-1]) & ~np.isnan(ordered[1:])
+    counts = (~np.isnan(ordered[0])).astype(int) + changes.sum(axis = 0)
+    return np.minimum(counts, _MAX_UNIQUE + 1)
+
+
+def profile_data(X, y):
+    """
+    Shape, missing values, zeros, cardinality, range and variance of each feature
+    column, and of the target, computed on at most _PROFILE_ROWS rows.
+    """
+    sample = profile_rows(np.asarray(X))
+    target = profile_rows(np.asarray(y, dtype = float))
+    missing = np.isnan(sample)
+    observed = np.where(missing, 0, sample)
+    with warnings.catch_warnings():
+        # All-NaN columns give NaN statistics and a RuntimeWarning
+        warnings.simplefilter("ignore", category = RuntimeWarning)
+        variance = np.nanvar(sample, axis = 0)
+        minimum = np.nanmin(sample, axis = 0) if len(sample) else np.full(sample.shape[1], np.nan)
+        maximum = np.nanmax(sample, axis = 0) if len(sample) else np.full(sample.shape[1], np.nan)
+    integral = ((observed == np.round(observed)) | missing).all(axis = 0)
+    as_list = lambda values: [None if np.isnan(value) else float(value) for value in values]
+    return {
+        "n_rows": int(len(X)),
+        "n_features": int(sample.shape[1]),
+        "n_profiled_rows": int(len(sample)),
+        "nan_rate": as_list(missing.mean(axis = 0) if len(sample) else np.zeros(sample.shape[1])),
+        "zero_rate": as_list((sample == 0).mean(axis = 0) if len(sample) else np.zeros(sample.shape[1])),
+        "n_unique": [int(count) for count in n_unique(sample)],
+        "integral": [bool(value) for value in integral],
+        "min": as_list(minimum),
+        "max": as_list(maximum),
+        "variance": as_list(variance),
+        "target_n_unique": int(n_unique(target[:, None])[0]),
+        "target_variance": float(np.nanvar(target)) if len(target) else 0.0,
+    }
+
+
+def fingerprint(X, y):
+    """
+    Key of a profile: the shape of the data and the bytes of the rows the profile is
+    computed on, so equal keys give equal profiles without hashing all of X.
+    """
+    hasher = hashlib.blake2b(digest_size = 16)
+    hasher.update(json.dumps([list(np.shape(X)), str(np.asarray(X).dtype), _PROFILE_ROWS, _MAX_UNIQUE]).encode("utf-8"))
+    hasher.update(np.ascontiguousarray(profile_rows(np.asarray(X))).tobytes())
+    hasher.update(np.ascontiguousarray(profile_rows(np.asarray(y, dtype = float))).tobytes())
+    return hasher.hexdigest()
+
+
+class ProfileCache:
+    """Dataset profiles stored as JSON files, one per fingerprint, next to the dataset cache."""
+    def __init__(self, directory):
+        self.directory = directory
+        self.logger = Logger(__name__)
+
+    def profile(self, X, y):
+        key = fingerprint(X, y)
+        path = os.path.join(self.directory, f"{key}.json")
+        try:
+            with open(path) as infile:
+                profile = json.load(infile)
+            self.logger.verbose(f"Loaded the dataset profile [{key}]")
+            return profile
+        except (OSError, ValueError):
+            pass
+        profile = profile_data(X, y)
+        try:
+            os.makedirs(self.directory, exist_ok = True)
+            # Written to a temporary file first, a concurrent reader never sees half a profile
+            handle, staging = tempfile.mkstemp(dir = self.directory, prefix = ".staging-")
+            with os.fdopen(handle, "w") as outfile:
+                json.dump(profile, outfile)
+            os.replace(staging, path)
+        except OSError as e:
+            self.logger.verbose(f"Could not store the dataset profile [{key}]: {e}")
+        return profile
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+# Rows buffered by a reservoir before it selects its sample again
+_MIN_PENDING_ROWS = 1 << 16
+
+
+def quantile_edges(values, n_strata):
+    """Inner edges of `n_strata` quantile bins of the values, tied quantiles merged."""
+    values = values[~np.isnan(values)]
+    if n_strata < 2 or not len(values):
+        return np.empty(0)
+    return np.unique(np.quantile(values, np.linspace(0, 1, n_strata + 1)[1:-1]))
+
+
+def allocate(n_rows, shares):
+    """Split `n_rows` over strata in proportion to their shares, largest remainders first."""
+    shares = np.asarray(shares, dtype = np.float64)
+    exact = n_rows * shares / max(shares.sum(), 1)
+    quotas = np.floor(exact).astype(np.int64)
+    quotas[np.argsort(quotas - exact, kind = "stable")[:n_rows - quotas.sum()]] += 1
+    return quotas
+
+
+class Reservoir:
+    """
+    Uniform sample without replacement of at most `quotas[s]` rows of each stratum s
+    of a stream of frames. Strata are the bins of the target column between `edges`,
+    a single stratum holds every row when there are no edges.
+
+    Every row comes with a random key and the rows with the smallest keys are kept
+    (bottom-k sampling). Reservoirs filled from different files therefore merge into a
+    sample of all the files, and reservoirs given the same keys hold nested samples.
+    """
+    def __init__(self, quotas, target_column, edges = ()):
+        self.quotas = np.asarray(quotas, dtype = np.int64)
+        self.target_column = target_column
+        self.edges = np.asarray(edges, dtype = np.float64)
+        self.frame = None
+        self.keys = np.empty(0)
+        self.pending = []
+        self.pending_rows = 0
+        # A row can only enter a full stratum with a key below the largest kept key
+        self.thresholds = np.where(self.quotas > 0, np.inf, 0.0)
+
+    def empty(self):
+        return Reservoir(self.quotas, self.target_column, self.edges)
+
+    def strata(self, frame):
+        if not len(self.edges):
+            return np.zeros(len(frame), dtype = np.int64)
+        return np.searchsorted(self.edges, frame[self.target_column].to_numpy(dtype = np.float64), side = "right")
+
+    def add(self, frame, keys):
+        candidates = keys < self.thresholds[self.strata(frame)]
+        if not candidates.any():
+            return
+        if not candidates.all():
+            frame, keys = frame[candidates], keys[candidates]
+        self.pending.append((frame, keys))
+        self.pending_rows += len(keys)
+        if self.pending_rows >= max(self.quotas.sum(), _MIN_PENDING_ROWS):
+            self.compact()
+
+    def merge(self, other):
+        other.compact()
+        if other.frame is not None:
+            self.add(other.frame, other.keys)
+
+    def compact(self):
+        if not self.pending:
+            return
+        frames = ([self.frame] if self.frame is not None else []) + [frame for frame, _ in self.pending]
+        keys = np.concatenate([self.keys] + [keys for _, keys in self.pending])
+        frame = pd.concat(frames, ignore_index = True) if len(frames) > 1 else frames[0]
+        self.pending, self.pending_rows = [], 0
+
+        # Rank of every row among the rows of its stratum, by key
+        strata = self.strata(frame)
+        order = np.lexsort((keys, strata))
+        ordered_strata = strata[order]
+        ranks = np.arange(len(order)) - np.searchsorted(ordered_strata, ordered_strata)
+        kept = order[ranks < self.quotas[ordered_strata]]
+        # Rows in key order are in random order, not grouped by file or by stratum
+        kept = kept[np.argsort(keys[kept])]
+        self.frame = frame.take(kept).reset_index(drop = True)
+        self.keys = keys[kept]
+
+        counts = np.bincount(strata[kept], minlength = len(self.quotas))
+        largest = np.full(len(self.quotas), -np.inf)
+        np.maximum.at(largest, strata[kept], self.keys)
+        self.thresholds = np.where(counts < self.quotas, np.inf, largest)
+        self.thresholds[self.quotas == 0] = 0.0
+
+    def sample(self):
+        self.compact()
+        return self.frame
+
+    def selection(self):
+        """Copy of the reservoir without its sample, telling which rows of the stream it kept, see contains."""
+        self.compact()
+        selection = self.empty()
+        selection.thresholds = self.thresholds.copy()
+        return selection
+
+    def contains(self, frame, keys):
+        """Rows of a frame, given their keys, that are in the sample once the whole stream was added."""
+        return keys <= self.thresholds[self.strata(frame)]
@@ -0,0 +1,361 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import traceback
+import numpy as np
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from urllib.parse import parse_qs
+from aiflib import codec
+from aiflib.config import Config
+from aiflib.logger import Logger, UiPathUsageException
+
+
+class RequestTimeout(Exception):
+    pass
+
+
+class ServingMetrics:
+    """
+    Latency and throughput of the requests served since the last reset.
+    Percentiles are computed over the most recent `window` requests.
+    """
+    def __init__(self, window = 10000):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.latencies = deque(maxlen = self.window)
+        self.batch_sizes = deque(maxlen = self.window)
+        self.started = perf_counter()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.expired = 0
+        self.failed = 0
+
+    def record_batch(self, n_rows):
+        self.batches += 1
+        self.batch_sizes.append(n_rows)
+
+    def record_request(self, latency, n_rows):
+        self.requests += 1
+        self.rows += n_rows
+        self.latencies.append(latency)
+
+    def snapshot(self):
+        elapsed = max(perf_counter() - self.started, 1e-9)
+        latencies = np.fromiter(self.latencies, dtype = np.float64)
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (np.nan, np.nan)
+        return {
+            "requests": self.requests,
+            "rows": self.rows,
+            "batches": self.batches,
+            "expired": self.expired,
+            "failed": self.failed,
+            "requests_per_sec": self.requests / elapsed,
+            "rows_per_sec": self.rows / elapsed,
+            "mean_batch_rows": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            "p50_latency_ms": float(p50) * 1000,
+            "p99_latency_ms": float(p99) * 1000,
+        }
+
+
+class _Request:
+    __slots__ = ("data", "future", "deadline", "submitted")
+
+    def __init__(self, data, future, deadline, submitted):
+        self.data = data
+        self.future = future
+        self.deadline = deadline
+        self.submitted = submitted
+
+
+class BatchingPredictor:
+    """
+    Gathers concurrent prediction requests into one vectorized predict call.
+
+    A batch is closed when it holds `batch_max_size` rows or when `batch_max_wait_ms`
+    have passed since its first request. At most `batch_max_queue` requests wait for
+    a batch; further callers are held back until there is room or their deadline
+    (`request_timeout_ms`) passes. Requests whose deadline passed while queued are
+    dropped before the batch is scored.
+    """
+    def __init__(self, model, max_batch_size = None, max_wait_ms = None, max_queue = None, timeout_ms = None):
+        self.config = Config()
+        self.logger = Logger(__name__)
+        self.model = model
+        self.max_batch_size = max_batch_size or self.config.batch_max_size
+        self.max_wait = (self.config.batch_max_wait_ms if max_wait_ms is None else max_wait_ms) / 1000.
+        self.max_queue = max_queue or self.config.batch_max_queue
+        self.timeout = (timeout_ms or self.config.request_timeout_ms) / 1000.
+        self.metrics = ServingMetrics()
+        self._queue = None
+        self._worker = None
+        # One thread runs the pipeline so the event loop keeps accepting requests meanwhile
+        self._executor = ThreadPoolExecutor(max_workers = 1)
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize = self.max_queue)
+        self._worker = asyncio.ensure_future(self._run())
+        self.metrics.reset()
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait = True)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def predict(self, mlskill_input, timeout_ms = None, output_format = None):
+        """Same input and output as Model.predict, scored together with concurrent requests."""
+        data = self.decode(mlskill_input)
+        predictions = await self.predict_array(data, timeout_ms)
+        return self.model.encode_output(predictions, output_format)
+
+    def decode(self, mlskill_input):
+        """Rows of a Model.predict payload, checked to have the width of the model before they are queued."""
+        data = self.model.decode_input(mlskill_input)
+        if np.ndim(data) != 2:
+            raise ValueError(f"Prediction input must be a table of rows, got [{np.ndim(data)}] dimensions.")
+        schema = self.model.input_schema
+        if schema is not None and data.shape[1] != len(schema.columns):
+            raise ValueError(f"Prediction input has [{data.shape[1]}] columns, the model [{len(schema.columns)}].")
+        return data
+
+    async def predict_array(self, data, timeout_ms = None):
+        loop = asyncio.get_event_loop()
+        submitted = loop.time()
+        timeout = self.timeout if timeout_ms is None else timeout_ms / 1000.
+        request = _Request(data, loop.create_future(), submitted + timeout, perf_counter())
+        try:
+            # Backpressure: wait for room in the queue, but not past the deadline
+            await asyncio.wait_for(self._queue.put(request), timeout)
+        except asyncio.TimeoutError:
+            self.metrics.expired += 1
+            raise RequestTimeout(f"Prediction queue is full, request not accepted within {timeout * 1000:.0f} ms.")
+        try:
+            return await asyncio.wait_for(asyncio.shield(request.future), request.deadline - loop.time())
+        except asyncio.TimeoutError:
+            self.metrics.expired += 1
+            # Not scored if its batch has not started yet
+            request.future.cancel()
+            raise RequestTimeout(f"Prediction not returned within {timeout * 1000:.0f} ms.")
+
+    async def _next_batch(self):
+        loop = asyncio.get_event_loop()
+        batch = [await self._queue.get()]
+        n_rows = len(batch[0].data)
+        closes_at = loop.time() + self.max_wait
+        while n_rows < self.max_batch_size:
+            if self._queue.empty():
+                remaining = closes_at - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                request = self._queue.get_nowait()
+            batch.append(request)
+            n_rows += len(request.data)
+        return batch
+
+    def _drop_expired(self, batch):
+        now = asyncio.get_event_loop().time()
+        live = []
+        for request in batch:
+            if request.future.done():
+                # Cancelled by the caller
+                continue
+            if request.deadline < now:
+                self.metrics.expired += 1
+                request.future.set_exception(RequestTimeout("Prediction request deadline passed while queued."))
+                continue
+            live.append(request)
+        return live
+
+    def _drop_mismatched(self, batch):
+        """Fail the requests whose rows are not as wide as those of the first request."""
+        shape = np.shape(batch[0].data)[1:]
+        live = []
+        for request in batch:
+            if np.shape(request.data)[1:] != shape:
+                self.metrics.failed += 1
+                request.future.set_exception(ValueError(
+                    f"Prediction input of shape {np.shape(request.data)} cannot be batched with rows of shape {shape}."))
+                continue
+            live.append(request)
+        return live
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = self._drop_expired(await self._next_batch())
+            if not batch:
+                continue
+
+            batch = self._drop_mismatched(batch)
+            n_rows = sum(len(request.data) for request in batch)
+            try:
+                data = np.concatenate([request.data for request in batch]) if len(batch) > 1 else batch[0].data
+                self.metrics.record_batch(len(data))
+                predictions = await loop.run_in_executor(self._executor, self.model.predict_array, data)
+            except Exception as e:
+                self.logger.info(f"Prediction batch of [{n_rows}] rows failed: {e}")
+                for request in batch:
+                    if not request.future.done():
+                        self.metrics.failed += 1
+                        request.future.set_exception(e)
+                continue
+
+            # Scatter the predictions back to the callers
+            finished = perf_counter()
+            offset = 0
+            for request in batch:
+                n_rows = len(request.data)
+                if not request.future.done():
+                    request.future.set_result(predictions[offset:offset + n_rows])
+                    self.metrics.record_request(finished - request.submitted, n_rows)
+                offset += n_rows
+
+
+async def _handle_http(predictor, reader, writer):
+    """
+    Minimal HTTP/1.1: POST /predict with the Model.predict payload, GET /metrics.
+    POST /predict?format=float32 (or float64, arrow, json) overrides "output_format".
+    """
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, target = request_line.decode("latin-1").split()[:2]
+            path, _, query = target.partition("?")
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            status, content_type = "200 OK", codec.CONTENT_TYPES[codec.JSON]
+            if method == "GET" and path == "/metrics":
+                metrics = predictor.metrics.snapshot()
+                cache_stats = predictor.model.cache_stats()
+                if cache_stats is not None:
+                    metrics["prediction_cache"] = cache_stats
+                response = json.dumps(metrics)
+            elif method == "POST" and path == "/predict":
+                output_format = parse_qs(query).get("format", [None])[0]
+                try:
+                    if output_format is not None and output_format not in codec.OUTPUT_FORMATS:
+                        raise ValueError(f"Output format must be one of {codec.OUTPUT_FORMATS}")
+                    data = predictor.decode(body)
+                except (UiPathUsageException, ValueError) as e:
+                    # Only a payload that cannot be decoded is the client's error
+                    status, response = "400 Bad Request", json.dumps({"error": str(e)})
+                else:
+                    try:
+                        predictions = await predictor.predict_array(data)
+                        response = predictor.model.encode_output(predictions, output_format)
+                        content_type = codec.CONTENT_TYPES[output_format or predictor.model.config.output_format]
+                    except RequestTimeout as e:
+                        status, response = "503 Service Unavailable", json.dumps({"error": str(e)})
+                    except Exception as e:
+                        predictor.logger.info(f"Prediction failed: {traceback.format_exc()}")
+                        status, response = "500 Internal Server Error", json.dumps({"error": str(e)})
+            else:
+                status, response = "404 Not Found", json.dumps({"error": f"No route for [{method} {path}]"})
+
+            payload = response.encode("utf-8") if isinstance(response, str) else response
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload)
+            await writer.drain()
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(model, host = "0.0.0.0", port = 8080, sock = None):
+    model.warm_up()
+    async with BatchingPredictor(model) as predictor:
+        handler = lambda reader, writer: _handle_http(predictor, reader, writer)
+        if sock is not None:
+            server = await asyncio.start_server(handler, sock = sock)
+        else:
+            server = await asyncio.start_server(handler, host, port)
+        predictor.logger.info(f"Serving predictions on [{host}:{port}] in process [{os.getpid()}]")
+        try:
+            await server.wait_closed()
+        finally:
+            server.close()
+
+
+def serve_workers(create_model, host = "0.0.0.0", port = 8080, workers = 1):
+    """
+    Pre-fork server: the model artifacts are loaded once, then `workers` processes are
+    forked that share them and accept connections on the same listening socket.
+    `create_model` is called in every worker and finds the preloaded artifacts.
+    """
+    from aiflib.model import preload
+    preload()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                model = create_model()
+                # The workers share the CPU budget
+                model.limit_threads(workers)
+                asyncio.run(serve(model, host, port, sock = sock))
+            except KeyboardInterrupt:
+                pass
+            except Exception:
+                # os._exit skips the interpreter's report of the exception
+                traceback.print_exc()
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        children.append(pid)
+
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    finally:
+        sock.close()
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from sklearn.model_selection import check_cv
+
+# Preferred directory of the shared files, memory backed on Linux
+_SHM = "/dev/shm"
+
+
+def open_shared(path, mmap_mode = "r"):
+    array = np.load(path, mmap_mode = mmap_mode).view(SharedArray)
+    array.path = path
+    return array
+
+
+class SharedArray(np.ndarray):
+    """
+    Array memory-mapped from a .npy file, pickled as the path of the file while the file
+    exists, so that worker processes map the same pages instead of each receiving a copy.
+    Slices are plain arrays and other arrays derived from it pickle as usual.
+    """
+    def __array_finalize__(self, obj):
+        self.path = None
+
+    def __getitem__(self, key):
+        item = super().__getitem__(key)
+        return item.view(np.ndarray) if isinstance(item, SharedArray) else item
+
+    def __reduce_ex__(self, protocol):
+        if self.path is None or not os.path.exists(self.path):
+            return np.asarray(self).__reduce_ex__(protocol)
+        return open_shared, (self.path,)
+
+
+class SharedFolds:
+    """
+    Cross-validation splitter yielding folds precomputed by `cv` for `n_rows` rows, stored
+    test then train indices of each fold in one shared .npy file. Data with another number of
+    rows (e.g. a subset of the rows) is split by `cv` itself. Pickled as the path of the file.
+    """
+    def __init__(self, cv, n_rows, path, bounds):
+        self.cv = cv
+        self.n_rows = n_rows
+        self.path = path
+        self.bounds = bounds
+        indices = open_shared(path)
+        self._folds = [(indices[test_end:train_end], indices[start:test_end]) for start, test_end, train_end in bounds]
+
+    def __reduce__(self):
+        return SharedFolds, (self.cv, self.n_rows, self.path, self.bounds)
+
+    def __repr__(self):
+        # Same splits as cv, e.g. for the keys of the pipeline score cache
+        return repr(self.cv)
+
+    def get_n_splits(self, X = None, y = None, groups = None):
+        return len(self._folds)
+
+    def split(self, X, y = None, groups = None):
+        if len(X) != self.n_rows:
+            yield from self.cv.split(X, y, groups)
+            return
+        yield from self._folds
+
+
+def shared_directory(nbytes, fallback):
+    """/dev/shm when it has room for `nbytes`, `fallback` otherwise."""
+    if os.path.isdir(_SHM):
+        stat = os.statvfs(_SHM)
+        if stat.f_bavail * stat.f_frsize > 2 * nbytes:
+            return _SHM
+    return fallback
+
+
+class SharedTrainingData:
+    """
+    The training matrix, target and cross-validation folds of a pipeline search written
+    once to .npy files, memory-mapped by the search and by the workers evaluating its
+    pipelines. The files are removed on exit, arrays still mapped stay valid.
+    """
+    def __init__(self, X, y, cv, directory):
+        self.X = X
+        self.y = y
+        self.cv = cv
+        self.directory = directory
+
+    def __enter__(self):
+        os.makedirs(self.directory, exist_ok = True)
+        self.path = tempfile.mkdtemp(dir = self.directory, prefix = "aif_shared_")
+        try:
+            splitter = check_cv(self.cv, self.y, classifier = False)
+            index_dtype = np.int32 if len(self.y) < 2 ** 31 else np.int64
+            folds, bounds, start = [], [], 0
+            for train, test in splitter.split(self.X, self.y):
+                folds += [test, train]
+                bounds.append((start, start + len(test), start + len(test) + len(train)))
+                start += len(test) + len(train)
+            np.save(os.path.join(self.path, "folds.npy"), np.concatenate(folds).astype(index_dtype))
+            np.save(os.path.join(self.path, "X.npy"), self.X)
+            np.save(os.path.join(self.path, "y.npy"), self.y)
+        except BaseException:
+            shutil.rmtree(self.path, ignore_errors = True)
+            raise
+        # Copy on write: the search may modify its arrays, never the files the workers map
+        X = open_shared(os.path.join(self.path, "X.npy"), mmap_mode = "c")
+        y = open_shared(os.path.join(self.path, "y.npy"), mmap_mode = "c")
+        return X, y, SharedFolds(splitter, len(self.y), os.path.join(self.path, "folds.npy"), bounds)
+
+    def __exit__(self, *exc_info):
+        shutil.rmtree(self.path, ignore_errors = True)
@@ -1,11 +1,9 @@
-import pandas as pd 
-
 from aiflib.model import Model, _UNTRAINED_HELP
 from aiflib.logger import UiPathUsageException
 
 class Main(object):
     def __init__(self):
-        self.model = Model()
+        self.model = Model(is_infer_only = True)
         if not self.model.is_trained():
             raise UiPathUsageException(_UNTRAINED_HELP)
 
@@ -13,6 +11,8 @@ class Main(object):
         return self.model.predict(mlskill_input)
             
 if __name__ == '__main__':
+    import pandas as pd
+
     main = Main()
     df = pd.read_csv('dataset/regression_data.csv', header=0).head(20)
     df = df.drop('shares', axis=1)
@@ -0,0 +1,15 @@
+import argparse
+
+from aiflib.batch_scoring import score_files
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Score CSV / Parquet files with the trained model.")
+    parser.add_argument("inputs", nargs = "+", help = "CSV or Parquet (.parquet, .pq) files to score")
+    parser.add_argument("-o", "--output", required = True, help = "CSV or Parquet file the predictions are written to")
+    parser.add_argument("--id-column", help = "input column copied next to each prediction")
+    parser.add_argument("--workers", type = int, help = "scoring processes (default: score_workers)")
+    parser.add_argument("--chunk-rows", type = int, help = "rows per chunk (default: score_chunk_rows)")
+    args = parser.parse_args()
+
+    score_files(args.inputs, args.output, id_column = args.id_column, workers = args.workers,
+                chunk_rows = args.chunk_rows)
@@ -0,0 +1,16 @@
+import asyncio
+import sys
+
+from main import Main
+from aiflib.serving import serve, serve_workers
+
+if __name__ == '__main__':
+    # python serve.py [port] [workers]
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    if workers > 1:
+        # Workers are forked after the model is loaded and share its memory
+        serve_workers(lambda: Main().model, port = port, workers = workers)
+    else:
+        main = Main()
+        asyncio.run(serve(main.model, port = port))
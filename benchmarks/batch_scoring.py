@@ -0,0 +1,101 @@
+"""
+Throughput and peak memory of batch scoring a CSV file: the main.py path (whole file
+read into pandas, converted to JSON and predicted at once) versus score.py streaming
+chunks through 1 or more worker processes. Every run happens in a fresh process.
+
+    python benchmarks/batch_scoring.py [rows] [workers ...]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from common import print_table, synthetic_regression, temporary_package
+
+# Peak resident memory of the process. Unlike ru_maxrss it is not inherited through exec from
+# the benchmark process, whose own peak includes the generated input file.
+_PEAK_MB = """
+def peak_mb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+"""
+
+_MAIN_PATH = _PEAK_MB + """
+import json, sys
+from time import perf_counter
+import pandas as pd
+from main import Main
+start = perf_counter()
+main = Main()
+frame = pd.read_csv(sys.argv[1]).drop(columns="row_id")
+predictions = json.loads(main.predict(frame.to_json(orient="records")))
+pd.DataFrame({"prediction": predictions}).to_csv(sys.argv[2], index=False)
+print(json.dumps({"seconds": perf_counter() - start, "peak_mb": peak_mb()}))
+"""
+
+_SCORE_PATH = _PEAK_MB + """
+import json, sys
+from time import perf_counter
+from aiflib.batch_scoring import score_files
+start = perf_counter()
+score_files([sys.argv[1]], sys.argv[2], id_column="row_id", workers=int(sys.argv[3]))
+print(json.dumps({"seconds": perf_counter() - start, "peak_mb": peak_mb()}))
+"""
+
+
+def prepare(package, n_rows):
+    import joblib
+    import pandas as pd
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+
+    X, y = synthetic_regression(5000, 20)
+    pipeline = Pipeline([
+        ("nan_imputer", SimpleImputer()),
+        ("tpot_pipeline", Pipeline([("forest", RandomForestRegressor(20, max_depth=10, random_state=0))])),
+    ]).fit(X, y)
+    joblib.dump(pipeline, os.path.join(package, "model", "Model.sav"))
+    joblib.dump([f"f{i}" for i in range(20)], os.path.join(package, "model", "Features.sav"))
+
+    path = os.path.join(package, "dataset", "score.csv")
+    X, _ = synthetic_regression(n_rows, 20, nan_fraction=0.01, seed=1)
+    frame = pd.DataFrame(X, columns=[f"f{i}" for i in range(20)])
+    frame.insert(0, "row_id", np.arange(n_rows))
+    frame.to_csv(path, index=False)
+    return path
+
+
+def run(package, script, *args):
+    output = subprocess.check_output([sys.executable, "-W", "ignore", "-c", script] + [str(a) for a in args],
+                                     cwd=package, stderr=subprocess.DEVNULL)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main(n_rows, workers):
+    package = temporary_package(tempfile.mkdtemp(prefix="aif_score_"))
+    path = prepare(package, n_rows)
+    output = os.path.join(package, "predictions.csv")
+
+    rows = []
+    result = run(package, _MAIN_PATH, path, output)
+    expected = np.loadtxt(output, delimiter=",", skiprows=1)
+    rows.append(("main.py (whole file as JSON)", f"{n_rows / result['seconds']:.0f}", f"{result['peak_mb']:.0f}"))
+    for n_workers in workers:
+        result = run(package, _SCORE_PATH, path, output, n_workers)
+        scored = np.loadtxt(output, delimiter=",", skiprows=1)
+        if not np.allclose(scored[:, 1], expected) or not (scored[:, 0] == np.arange(n_rows)).all():
+            sys.exit(f"score.py with {n_workers} workers does not reproduce the predictions in input order")
+        rows.append((f"score.py, {n_workers} workers", f"{n_rows / result['seconds']:.0f}", f"{result['peak_mb']:.0f}"))
+    print_table(("path", "rows/sec", "peak MiB (parent)"), rows)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    workers = [int(value) for value in sys.argv[2:]] or [1, os.cpu_count() or 1]
+    main(n_rows, workers)
@@ -0,0 +1,49 @@
+"""
+Wall-clock time of the TPOT search and the fit of its best pipeline against the
+max_time_mins budget, without the budget scheduler, with the refit reserve, and with
+the reserve and the min_gain_per_min stop. Reports the generations run, the total
+time, how far past the budget it ended and the best cross-validation score.
+
+    python benchmarks/budget_scheduler.py [rows] [minutes] [min gain per minute]
+"""
+import sys
+import tempfile
+import warnings
+from time import perf_counter
+
+from common import print_table, synthetic_regression, temporary_package
+
+
+def search(X, y, minutes, scheduler):
+    from aiflib.config import Config
+    from aiflib.scheduler import ScheduledTPOTRegressor
+    optimizer = ScheduledTPOTRegressor(scheduler=scheduler, generations=1000, population_size=10, cv=5, n_jobs=1,
+                                       max_time_mins=minutes, random_state=0, verbosity=0,
+                                       config_dict=Config().classifier_config_dict)
+    start = perf_counter()
+    optimizer.fit(X, y)
+    seconds = perf_counter() - start
+    generations = len(scheduler.history) if scheduler is not None else "-"
+    return (generations, f"{seconds:.1f}", f"{seconds - 60 * minutes:+.1f}",
+            f"{optimizer._optimized_pipeline_score:.4f}")
+
+
+def main(n_rows, minutes, min_gain_per_min):
+    warnings.simplefilter("ignore")
+    temporary_package(tempfile.mkdtemp(prefix="aif_budget_"))
+    from aiflib.scheduler import BudgetScheduler
+    X, y = synthetic_regression(n_rows)
+    runs = [
+        ("none", None),
+        ("reserve", BudgetScheduler(minutes, cv=5)),
+        (f"reserve, min gain {min_gain_per_min}", BudgetScheduler(minutes, min_gain_per_min=min_gain_per_min, cv=5)),
+    ]
+    rows = [(name,) + search(X, y, minutes, scheduler) for name, scheduler in runs]
+    print_table(("scheduler", "generations", "total s", "past budget s", "best cv score"), rows)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    minutes = float(sys.argv[2]) if len(sys.argv) > 2 else 2
+    min_gain_per_min = float(sys.argv[3]) if len(sys.argv) > 3 else 0.001
+    main(n_rows, minutes, min_gain_per_min)
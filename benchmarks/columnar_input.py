@@ -0,0 +1,75 @@
+"""
+DataManager reading the same rows stored as csv, gzip compressed csv, Parquet and
+Feather files: every column, a projection on 5 of the feature columns (as evaluate
+reads a model's features) and a "row_filter" keeping 5% of the rows. The filter is
+on a column sorted across the file, so Parquet skips the row groups whose statistics
+fail it instead of decoding them.
+
+    python benchmarks/columnar_input.py [rows] [features] [files]
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from common import best_time, feature_names, print_table, synthetic_regression
+
+
+def write_dataset(directory, frame, file_format, n_files):
+    os.makedirs(directory)
+    for i, part in enumerate(np.array_split(np.arange(len(frame)), n_files)):
+        path = os.path.join(directory, f"part_{i:03d}.{file_format}")
+        rows = frame.iloc[part].reset_index(drop=True)
+        if file_format == "parquet":
+            rows.to_parquet(path, index=False, row_group_size=50000)
+        elif file_format == "feather":
+            rows.to_feather(path)
+        else:
+            rows.to_csv(path, index=False)
+
+
+def read(directory, columns=None):
+    from aiflib.data_manager import DataManager
+    return DataManager(directory, columns=columns).get_data()
+
+
+def main(n_rows, n_features, n_files):
+    X, y = synthetic_regression(n_rows, n_features, nan_fraction=0.01)
+    frame = pd.DataFrame(X, columns=feature_names(n_features)).assign(target=y)
+    frame.insert(0, "day", np.arange(n_rows) * 100 // n_rows)
+    projection = feature_names(n_features)[:5]
+    os.environ.update(target_column="target", dataset_cache="false", data_dtype="float64")
+
+    root = tempfile.mkdtemp(prefix="aif_columnar_")
+    rows = []
+    try:
+        for file_format in ("csv", "csv.gz", "parquet", "feather"):
+            directory = os.path.join(root, file_format)
+            write_dataset(directory, frame, file_format, n_files)
+            size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+            os.environ.pop("row_filter", None)
+            every = best_time(lambda: read(directory), repeat=1)
+            projected = best_time(lambda: read(directory, projection), repeat=1)
+            if read(directory, projection).shape != (n_rows, len(projection) + 1):
+                sys.exit(f"{file_format}: the projection read the wrong columns")
+            os.environ["row_filter"] = json.dumps([["day", ">=", 95]])
+            filtered = best_time(lambda: read(directory), repeat=1)
+            if len(read(directory)) != (frame["day"] >= 95).sum():
+                sys.exit(f"{file_format}: the row filter kept the wrong rows")
+            rows.append((file_format, f"{size / 2 ** 20:.0f}", f"{every * 1000:.0f}", f"{projected * 1000:.0f}",
+                         f"{filtered * 1000:.0f}"))
+    finally:
+        shutil.rmtree(root)
+
+    print_table(("format", "MiB", "all columns ms", f"{len(projection)} columns ms", "5% of rows ms"), rows)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    n_features = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    n_files = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    main(n_rows, n_features, n_files)
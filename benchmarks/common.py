@@ -0,0 +1,128 @@
+"""
+Shared helpers for the benchmark scripts.
+
+The benchmarks import ``aiflib`` from one of the ML packages of this repository,
+selected with the ``AIF_PACKAGE`` environment variable (default: TPOT_all_models).
+"""
+import os
+import sys
+from contextlib import contextmanager
+from time import perf_counter
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+PACKAGE_DIR = os.path.join(ROOT, os.environ.get("AIF_PACKAGE", "TPOT_all_models"))
+sys.path.insert(0, PACKAGE_DIR)
+
+
+@contextmanager
+def timing(description):
+    print("-" * 50)
+    print("Running :", description)
+    start = perf_counter()
+    yield
+    print(f"{description} time: {perf_counter() - start}")
+
+
+def best_time(function, repeat=3):
+    """Return the fastest of ``repeat`` runs of ``function`` in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def repeats_for(n_rows):
+    return 1 if n_rows >= 100000 else 5
+
+
+def synthetic_regression(n_rows, n_features=20, nan_fraction=0.0, seed=0):
+    rng = np.random.RandomState(seed)
+    X = rng.randn(n_rows, n_features)
+    y = X @ rng.randn(n_features) + 0.1 * rng.randn(n_rows)
+    if nan_fraction > 0:
+        X[rng.rand(n_rows, n_features) < nan_fraction] = np.nan
+    return X, y
+
+
+def feature_names(n_features):
+    return [f"f{i}" for i in range(n_features)]
+
+
+def parse_sizes(argv, default):
+    """Batch sizes may be overridden on the command line, e.g. ``1 100 10000``."""
+    return [int(value) for value in argv] if argv else default
+
+
+def print_table(header, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(header, *rows)]
+    line = "  ".join("{:>%d}" % width for width in widths)
+    print(line.format(*header))
+    for row in rows:
+        print(line.format(*row))
+
+
+def model_with(pipeline):
+    """A Model instance serving ``pipeline`` instead of model/Model.sav."""
+    from aiflib.model import Model
+    model = Model()
+    model._model = pipeline
+    return model
+
+
+def linear_pipeline(X, y):
+    """A cheap fitted pipeline, so that benchmarks measure the serving overhead."""
+    from sklearn.impute import SimpleImputer
+    from sklearn.linear_model import Ridge
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    pipeline = Pipeline([
+        ("nan_imputer", SimpleImputer(strategy="mean")),
+        ("scaler", StandardScaler()),
+        ("ridge", Ridge()),
+    ])
+    return pipeline.fit(X, y)
+
+
+def temporary_package(directory):
+    """
+    Copy the ML package's code to `directory`, so that benchmarks can write model
+    artifacts to its model/ folder without touching the trained model of the repository.
+    """
+    import shutil
+    for name in os.listdir(PACKAGE_DIR):
+        source = os.path.join(PACKAGE_DIR, name)
+        if name == "aiflib":
+            shutil.copytree(source, os.path.join(directory, name),
+                            ignore=shutil.ignore_patterns("__pycache__"))
+        elif name.endswith(".py"):
+            shutil.copy(source, directory)
+    for name in ("model", "artifacts", os.path.join("dataset", "training"), os.path.join("dataset", "test")):
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+    sys.path.remove(PACKAGE_DIR)
+    sys.path.insert(0, directory)
+    return directory
+
+
+def memory_usage():
+    """Resident, proportional and private memory of this process in MiB (Linux)."""
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as smaps:
+            for line in smaps:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) / 1024.
+    except OSError:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    fields["Rss"] = int(line.split()[1]) / 1024.
+    return {
+        "rss": fields.get("Rss", float("nan")),
+        "pss": fields.get("Pss", float("nan")),
+        "private": fields.get("Private_Clean", float("nan")) + fields.get("Private_Dirty", float("nan")),
+    }
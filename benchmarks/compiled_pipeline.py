@@ -0,0 +1,71 @@
+"""
+Speed of compiled pipelines against scikit-learn, for every supported combination of
+scaler and linear model, with missing values in the input. The largest prediction
+error is reported for reference, the equivalence itself is tested by tests/test_compiler.py.
+
+    python benchmarks/compiled_pipeline.py [batch sizes...]
+"""
+import sys
+
+import numpy as np
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import ElasticNetCV, LassoLarsCV, RidgeCV, SGDRegressor
+from sklearn.pipeline import Pipeline, make_pipeline
+from sklearn.preprocessing import MaxAbsScaler, MinMaxScaler, RobustScaler, StandardScaler
+from sklearn.svm import LinearSVR
+
+from common import best_time, parse_sizes, print_table, repeats_for, synthetic_regression
+from aiflib.compiler import compile_pipeline
+
+SCALERS = [None, StandardScaler, MinMaxScaler, RobustScaler, MaxAbsScaler]
+MODELS = [RidgeCV, ElasticNetCV, LassoLarsCV, LinearSVR, SGDRegressor]
+
+
+def fitted_pipelines(X, y):
+    for scaler in SCALERS:
+        for model in MODELS:
+            # Same layout as Model.build_model: the imputer wraps the TPOT pipeline
+            steps = [scaler()] if scaler is not None else []
+            tpot_pipeline = make_pipeline(*steps, model(random_state=0) if "random_state" in model().get_params() else model())
+            pipeline = Pipeline([("nan_imputer", SimpleImputer(strategy="mean")), ("tpot_pipeline", tpot_pipeline)])
+            name = "+".join([(scaler.__name__ if scaler else "none"), model.__name__])
+            yield name, pipeline.fit(X, y)
+
+
+def main(sizes):
+    X, y = synthetic_regression(5000, 20, nan_fraction=0.05)
+    X_check, _ = synthetic_regression(2000, 20, nan_fraction=0.05, seed=1)
+
+    rows = []
+    for name, pipeline in fitted_pipelines(X, y):
+        compiled = compile_pipeline(pipeline, X[:1000])
+        if compiled is None:
+            rows.append((name, "not compiled", "", ""))
+            continue
+        error = np.max(np.abs(compiled.predict(X_check) - pipeline.predict(X_check)))
+        n_rows = sizes[-1]
+        X_bench, _ = synthetic_regression(n_rows, 20, nan_fraction=0.05, seed=2)
+        repeat = repeats_for(n_rows)
+        sklearn_time = best_time(lambda: pipeline.predict(X_bench), repeat)
+        compiled_time = best_time(lambda: compiled.predict(X_bench), repeat)
+        rows.append((name, f"{error:.2e}", f"{sklearn_time * 1000:.3f}", f"{compiled_time * 1000:.3f}"))
+
+    print_table(("pipeline", "max abs error", f"sklearn ms ({sizes[-1]} rows)", "compiled ms"), rows)
+
+    # Per batch size, for one representative pipeline
+    name, pipeline = next(p for p in fitted_pipelines(X, y) if p[0] == "StandardScaler+RidgeCV")
+    compiled = compile_pipeline(pipeline, X[:1000])
+    rows = []
+    for n_rows in sizes:
+        X_bench, _ = synthetic_regression(n_rows, 20, nan_fraction=0.05, seed=2)
+        repeat = repeats_for(n_rows)
+        sklearn_time = best_time(lambda: pipeline.predict(X_bench), repeat)
+        compiled_time = best_time(lambda: compiled.predict(X_bench), repeat)
+        rows.append((n_rows, f"{n_rows / sklearn_time:,.0f}", f"{n_rows / compiled_time:,.0f}"))
+    print()
+    print(name)
+    print_table(("rows", "sklearn rows/sec", "compiled rows/sec"), rows)
+
+
+if __name__ == "__main__":
+    main(parse_sizes(sys.argv[1:], [1, 100, 10000, 1000000]))
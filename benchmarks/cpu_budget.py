@@ -0,0 +1,57 @@
+"""
+Oversubscription of the native thread pools. Runs [workers] processes side by side,
+as the executor of the pipeline search does, each fitting RidgeCV and PCA on its own
+copy of the data, once with the BLAS / OpenMP defaults of every process (one thread
+per host CPU) and once with the threads of the CPU budget (aiflib/cpu_budget.py).
+Reports the CPUs of the host and of the budget and the fits per second.
+
+    python benchmarks/cpu_budget.py [rows] [workers] [fits per worker]
+"""
+import os
+import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from time import perf_counter
+
+from common import print_table, synthetic_regression
+
+
+def fit(n_rows, fits, threads):
+    from aiflib.cpu_budget import limit_threads
+    if threads:
+        limit_threads(threads)
+    from sklearn.decomposition import PCA
+    from sklearn.linear_model import RidgeCV
+    warnings.simplefilter("ignore")
+    X, y = synthetic_regression(n_rows, n_features=100)
+    for _ in range(fits):
+        RidgeCV(alphas=[0.1, 1.0, 10.0]).fit(X, y)
+        PCA(n_components=20, svd_solver="full").fit(X)
+
+
+def run(n_rows, workers, fits, threads):
+    # Spawned, so that every process loads its BLAS with the limits of `threads`
+    with ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as pool:
+        start = perf_counter()
+        for future in [pool.submit(fit, n_rows, fits, threads) for _ in range(workers)]:
+            future.result()
+        return workers * fits * 2 / (perf_counter() - start)
+
+
+def main(n_rows, workers, fits):
+    from aiflib.cpu_budget import available_cpus, split_cpus
+    cpus = available_cpus()
+    _, threads = split_cpus(workers, 0, cpus)
+    rows = []
+    for name, limit in [("host defaults", 0), ("cpu budget", threads)]:
+        rows.append((name, os.cpu_count(), cpus, workers, limit or os.cpu_count(),
+                     f"{run(n_rows, workers, fits, limit):.1f}"))
+    print_table(("threads", "host CPUs", "budget CPUs", "workers", "threads / worker", "fits / s"), rows)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    fits = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    main(n_rows, workers, fits)
@@ -0,0 +1,71 @@
+"""
+DataManager.read_all_csv for 1, 10, 100 and 1000 csv files of varying size holding
+the same rows in total: the former sequential read with one append per file versus
+sequential and process-pool parsing with a single concatenation.
+
+    python benchmarks/csv_ingestion.py [total rows] [file counts...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from common import best_time, print_table, synthetic_regression
+
+
+def write_files(directory, n_files, total_rows, seed=0):
+    """Split `total_rows` rows over `n_files` files with log-normally distributed sizes."""
+    rng = np.random.RandomState(seed)
+    weights = rng.lognormal(0, 1, n_files)
+    sizes = np.maximum(1, np.round(total_rows * weights / weights.sum())).astype(int)
+    X, y = synthetic_regression(int(sizes.sum()), 20, nan_fraction=0.01, seed=seed)
+    frame = pd.DataFrame(X, columns=[f"f{i}" for i in range(20)]).assign(target=y)
+    start = 0
+    for i, size in enumerate(sizes):
+        frame.iloc[start:start + size].to_csv(os.path.join(directory, f"part_{i:04d}.csv"), index=False)
+        start += size
+
+
+def read_appending(directory):
+    """read_all_csv before parallel parsing: sequential reads merged with DataFrame.append."""
+    import glob
+    frames = [pd.read_csv(path) for path in glob.glob(os.path.join(directory, "*.csv"))]
+    return reduce(lambda a, b: a.append(b), frames[1:], frames[0])
+
+
+def main(total_rows, file_counts):
+    from aiflib.data_manager import DataManager
+    workers = os.cpu_count() or 1
+    # Measure parsing, not the dataset cache
+    os.environ["dataset_cache"] = "false"
+
+    rows = []
+    for n_files in file_counts:
+        directory = tempfile.mkdtemp(prefix="aif_csv_")
+        try:
+            write_files(directory, n_files, total_rows)
+            expected = read_appending(directory)
+            repeat = 3 if n_files < 1000 else 1
+            timings = [best_time(lambda: read_appending(directory), repeat)]
+            for n_workers in sorted(set([1, workers])):
+                os.environ["read_workers"] = str(n_workers)
+                data = DataManager(directory).get_data()
+                if not data.reset_index(drop=True).equals(expected.reset_index(drop=True)):
+                    sys.exit(f"DataManager with {n_workers} read workers does not read the same rows")
+                timings.append(best_time(lambda: DataManager(directory), repeat))
+            rows.append((n_files, len(expected)) + tuple(f"{seconds * 1000:.0f}" for seconds in timings))
+        finally:
+            shutil.rmtree(directory)
+
+    header = ("files", "rows", "append ms", "concat ms") + (() if workers == 1 else (f"{workers} workers ms",))
+    print_table(header, rows)
+
+
+if __name__ == "__main__":
+    total_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    file_counts = [int(value) for value in sys.argv[2:]] or [1, 10, 100, 1000]
+    main(total_rows, file_counts)
@@ -0,0 +1,72 @@
+"""
+DataManager reading a directory of csv files without the dataset cache, with a cold
+cache, with a warm cache and after one of the files changed; then eviction under a
+cache size smaller than the dataset.
+
+    python benchmarks/dataset_cache.py [total rows] [files]
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+from common import best_time, print_table
+from csv_ingestion import write_files
+
+
+def read(directory):
+    from aiflib.data_manager import DataManager
+    return DataManager(directory).get_data()
+
+
+def main(total_rows, n_files):
+    directory = tempfile.mkdtemp(prefix="aif_dataset_")
+    artifacts = tempfile.mkdtemp(prefix="aif_artifacts_")
+    os.environ["artifacts_directory"] = artifacts
+    cache_directory = os.path.join(artifacts, "dataset_cache")
+    try:
+        write_files(directory, n_files, total_rows)
+
+        os.environ["dataset_cache"] = "false"
+        expected = read(directory)
+        uncached = best_time(lambda: read(directory))
+
+        os.environ["dataset_cache"] = "true"
+        cold = best_time(lambda: (shutil.rmtree(cache_directory, ignore_errors=True), read(directory)))
+        warm = best_time(lambda: read(directory))
+        if not read(directory).equals(expected):
+            sys.exit("Frames loaded from the dataset cache differ from the parsed csv files")
+
+        # Rewrite one file: only that file is parsed again
+        changed = os.path.join(directory, sorted(os.listdir(directory))[0])
+        with open(changed, "a") as outfile:
+            outfile.write(",".join(["1"] * 21) + "\n")
+        one_changed = best_time(lambda: read(directory), repeat=1)
+        if len(read(directory)) != len(expected) + 1:
+            sys.exit("A changed file was loaded from the dataset cache")
+
+        cache_bytes = sum(os.path.getsize(os.path.join(root, name))
+                          for root, _, names in os.walk(cache_directory) for name in names)
+        os.environ["dataset_cache_max_mb"] = str(max(1, cache_bytes // (2 * 1024 * 1024)))
+        shutil.rmtree(cache_directory)
+        read(directory)
+        evicted_bytes = sum(os.path.getsize(os.path.join(root, name))
+                            for root, _, names in os.walk(cache_directory) for name in names)
+    finally:
+        shutil.rmtree(directory)
+        shutil.rmtree(artifacts)
+
+    print_table(("read", "ms"), [
+        ("no cache", f"{uncached * 1000:.0f}"),
+        ("cold cache", f"{cold * 1000:.0f}"),
+        ("warm cache", f"{warm * 1000:.0f}"),
+        ("warm, 1 file changed", f"{one_changed * 1000:.0f}"),
+    ])
+    print(f"cache size {cache_bytes / 2 ** 20:.1f} MiB, {evicted_bytes / 2 ** 20:.1f} MiB kept "
+          f"with dataset_cache_max_mb={os.environ['dataset_cache_max_mb']}")
+
+
+if __name__ == "__main__":
+    total_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    n_files = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    main(total_rows, n_files)
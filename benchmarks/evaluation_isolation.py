@@ -0,0 +1,58 @@
+"""
+Pipeline evaluations past max_eval_time_mins on the local executor, where TPOT's timeout
+only ends an evaluation once it returns to Python, against the isolated executor, which
+kills it. The search space mixes a cheap linear model with a Nystroem kernel approximation
+of [components] components, whose fit is one long SVD. Reports the wall-clock time of one
+generation, the evaluations scored, those that failed or timed out, and those killed.
+
+    python benchmarks/evaluation_isolation.py [rows] [components] [max eval seconds] [workers]
+"""
+import json
+import os
+import sys
+import tempfile
+import warnings
+from time import perf_counter
+
+import numpy as np
+
+from common import print_table, synthetic_regression, temporary_package
+
+
+def search(X, y, executor, components, max_eval_seconds, workers, report_path):
+    from aiflib.executors import executor_for
+    from aiflib.scheduler import ScheduledTPOTRegressor
+    config_dict = {
+        "sklearn.linear_model.RidgeCV": {},
+        "sklearn.kernel_approximation.Nystroem": {"n_components": [components], "kernel": ["rbf"]},
+    }
+    with executor_for(executor)(workers, 1, 0, max_eval_seconds=max_eval_seconds, report_path=report_path) as n_jobs:
+        optimizer = ScheduledTPOTRegressor(generations=1, population_size=8, offspring_size=1,
+                                           cv=5, n_jobs=n_jobs, max_eval_time_mins=max_eval_seconds / 60,
+                                           random_state=3, verbosity=0, config_dict=config_dict)
+        start = perf_counter()
+        optimizer.fit(X, y)
+        seconds = perf_counter() - start
+    scores = [stats["internal_cv_score"] for stats in optimizer.evaluated_individuals_.values()]
+    killed = len(json.load(open(report_path))) if os.path.exists(report_path) else "-"
+    return len(scores), sum(not np.isfinite(score) for score in scores), killed, f"{seconds:.1f}"
+
+
+def main(n_rows, components, max_eval_seconds, workers):
+    warnings.simplefilter("ignore")
+    directory = tempfile.mkdtemp(prefix="aif_isolation_")
+    temporary_package(directory)
+    X, y = synthetic_regression(n_rows)
+    rows = []
+    for executor in ["local", "isolated"]:
+        report_path = os.path.join(directory, f"killed_{executor}.json")
+        rows.append((executor,) + search(X, y, executor, components, max_eval_seconds, workers, report_path))
+    print_table(("executor", "pipelines", "failed or timed out", "killed", "wall s"), rows)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    components = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+    max_eval_seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 3
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else 2
+    main(n_rows, components, max_eval_seconds, workers)
@@ -0,0 +1,56 @@
+"""
+Scaling of the pipeline search with the number of workers of each executor. Runs
+the same first generation of the TPOT search (same seed, so the same pipelines) on
+the local executor and on a dask LocalCluster, the stand-in for a cluster, with 1
+to [max workers] single-threaded workers, and reports the pipelines cross-validated
+per minute and the speedup over one worker.
+
+    python benchmarks/executor_scaling.py [rows] [population size] [max workers]
+"""
+import os
+import sys
+import tempfile
+import warnings
+from time import perf_counter
+
+from common import print_table, synthetic_regression, temporary_package
+
+
+def search(X, y, executor, workers, population_size):
+    from aiflib.config import Config
+    from aiflib.executors import executor_for
+    from aiflib.scheduler import ScheduledTPOTRegressor
+    with executor_for(executor)(workers, 1, 0) as n_jobs:
+        optimizer = ScheduledTPOTRegressor(generations=1, population_size=population_size, offspring_size=1,
+                                           cv=5, n_jobs=n_jobs, random_state=0, verbosity=0,
+                                           config_dict=Config().classifier_config_dict)
+        start = perf_counter()
+        optimizer.fit(X, y)
+        return len(optimizer.evaluated_individuals_), perf_counter() - start
+
+
+def main(n_rows, population_size, max_workers):
+    warnings.simplefilter("ignore")
+    temporary_package(tempfile.mkdtemp(prefix="aif_executors_"))
+    X, y = synthetic_regression(n_rows)
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    rows = []
+    for executor in ["local", "dask"]:
+        base = None
+        for workers in counts:
+            pipelines, seconds = search(X, y, executor, workers, population_size)
+            rate = 60 * pipelines / seconds
+            base = base or rate
+            rows.append((executor, workers, pipelines, f"{seconds:.1f}", f"{rate:.1f}", f"{rate / base:.2f}"))
+    print_table(("executor", "workers", "pipelines", "seconds", "pipelines / min", "speedup"), rows)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    population_size = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    max_workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count() or 1
+    main(n_rows, population_size, max_workers)
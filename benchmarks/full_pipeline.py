@@ -0,0 +1,79 @@
+"""
+The full pipeline of train.py (process_data, evaluate, train, evaluate) on one csv
+file: every step reading the train.csv / test.csv files written by process_data
+("fused_pipeline" false) versus the split kept in memory, with the csv files written
+in the background, right away or not at all ("write_split_csv").
+
+The TPOT search is replaced by a cheap linear pipeline so that the timings cover the
+data path only. "steps" is the time until the last evaluation returns, "csv written"
+the time until the csv files of the split are on disk as well.
+
+    python benchmarks/full_pipeline.py [rows] [features]
+"""
+import os
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+import pandas as pd
+
+from common import feature_names, linear_pipeline, print_table, synthetic_regression, temporary_package
+
+
+def clear_outputs(package):
+    for name in ("model", os.path.join("dataset", "training"), os.path.join("dataset", "test")):
+        directory = os.path.join(package, name)
+        shutil.rmtree(directory)
+        os.makedirs(directory)
+
+
+def run(package):
+    from aiflib.model import Model
+    Model.build_model = lambda self, X, y, **kwargs: linear_pipeline(X, y)
+    start = perf_counter()
+    model = Model()
+    model.process_data(os.path.join(package, "dataset"))
+    model.evaluate(os.path.join(package, "dataset", "test"))
+    model.train(os.path.join(package, "dataset", "training"))
+    score = model.evaluate(os.path.join(package, "dataset", "test"))
+    steps = perf_counter() - start
+    if model._csv_writer is not None:
+        model._csv_writer.shutdown(wait=True)
+    return steps, perf_counter() - start, score
+
+
+def main(n_rows, n_features):
+    package = temporary_package(tempfile.mkdtemp(prefix="aif_full_pipeline_"))
+    X, y = synthetic_regression(n_rows, n_features, nan_fraction=0.01)
+    pd.DataFrame(X, columns=feature_names(n_features)).assign(target=y).to_csv(
+        os.path.join(package, "dataset", "data.csv"), index=False)
+    os.environ.update(target_column="target", dataset_cache="false", read_workers="1",
+                      training_data_directory=os.path.join(package, "dataset", "training"),
+                      test_data_directory=os.path.join(package, "dataset", "test"),
+                      artifacts_directory=os.path.join(package, "artifacts"))
+
+    rows = []
+    scores = set()
+    try:
+        for fused, write in (("false", "sync"), ("true", "async"), ("true", "sync"), ("true", "false")):
+            os.environ.update(fused_pipeline=fused, write_split_csv=write)
+            clear_outputs(package)
+            steps, written, score = run(package)
+            scores.add(round(score, 10))
+            files = sorted(name for directory in ("training", "test")
+                           for name in os.listdir(os.path.join(package, "dataset", directory)))
+            rows.append((fused, write if fused == "true" else "-", f"{steps:.2f}", f"{written:.2f}",
+                         " ".join(files) or "-"))
+    finally:
+        shutil.rmtree(package)
+
+    print_table(("fused_pipeline", "write_split_csv", "steps s", "csv written s", "csv files"), rows)
+    if len(scores) != 1:
+        sys.exit(f"The evaluation scores differ between the runs: {scores}")
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    n_features = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    main(n_rows, n_features)
@@ -0,0 +1,48 @@
+"""
+Retraining on the same data with the pipeline score cache. Runs the TPOT search a
+first time with an empty cache, then again with the same seed and twice the
+generations, as a retrain with a larger max_time_mins would, and reports the
+pipelines evaluated and looked up, the cache hits and the search time of each run.
+
+    python benchmarks/pipeline_score_cache.py [rows] [generations] [population size]
+"""
+import os
+import sys
+import tempfile
+import warnings
+from time import perf_counter
+
+from common import print_table, synthetic_regression, temporary_package
+
+
+def search(X, y, path, generations, population_size):
+    from aiflib.config import Config
+    from aiflib.score_cache import CachedTPOTRegressor, ScoreCache
+    score_cache = ScoreCache(path, 100000)
+    optimizer = CachedTPOTRegressor(score_cache=score_cache, generations=generations,
+                                    population_size=population_size, cv=3, n_jobs=1, random_state=0,
+                                    config_dict=Config().classifier_config_dict, verbosity=0)
+    start = perf_counter()
+    optimizer.fit(X, y)
+    seconds = perf_counter() - start
+    score_cache.close()
+    return (generations, len(optimizer.evaluated_individuals_), score_cache.hits, score_cache.misses,
+            f"{seconds:.1f}", f"{optimizer._optimized_pipeline_score:.4f}")
+
+
+def main(n_rows, generations, population_size):
+    warnings.simplefilter("ignore")
+    directory = tempfile.mkdtemp(prefix="aif_score_cache_")
+    temporary_package(directory)
+    X, y = synthetic_regression(n_rows)
+    path = os.path.join(directory, "pipeline_scores.sqlite")
+    rows = [("first",) + search(X, y, path, generations, population_size),
+            ("retrain",) + search(X, y, path, 2 * generations, population_size)]
+    print_table(("run", "generations", "pipelines", "hits", "misses", "search s", "best cv score"), rows)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    generations = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    population_size = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    main(n_rows, generations, population_size)
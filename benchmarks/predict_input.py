@@ -0,0 +1,58 @@
+"""
+Rows/sec of Model.predict for JSON records versus the binary (.npy, Arrow IPC) input modes.
+JSON is measured with pandas (models without a saved feature list) and with the schema decoder.
+
+    python benchmarks/predict_input.py [batch sizes...]
+"""
+import io
+import sys
+
+import pandas as pd
+
+from common import (best_time, feature_names, linear_pipeline, model_with, parse_sizes,
+                    print_table, repeats_for, synthetic_regression)
+from aiflib import codec
+
+
+def arrow_payload(frame):
+    import pyarrow as pa
+    sink = io.BytesIO()
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def main(sizes):
+    n_features = 20
+    X, y = synthetic_regression(10000, n_features)
+    model = model_with(linear_pipeline(X, y))
+    schema = codec.InputSchema(feature_names(n_features))
+
+    try:
+        import pyarrow  # noqa: F401
+        has_arrow = True
+    except ImportError:
+        has_arrow = False
+
+    rows = []
+    for n_rows in sizes:
+        X, _ = synthetic_regression(n_rows, n_features, seed=1)
+        frame = pd.DataFrame(X, columns=feature_names(n_features))
+        records = frame.to_json(orient="records")
+        payloads = [("json/pandas", None, records), ("json/schema", schema, records),
+                    ("npy", schema, codec.encode_npy(X))]
+        if has_arrow:
+            payloads.append(("arrow", schema, arrow_payload(frame)))
+
+        repeat = repeats_for(n_rows)
+        for name, input_schema, payload in payloads:
+            model._input_schema = input_schema
+            seconds = best_time(lambda: model.predict(payload), repeat)
+            rows.append((n_rows, name, f"{seconds * 1000:.3f}", f"{n_rows / seconds:,.0f}"))
+
+    print_table(("rows", "input", "ms/batch", "rows/sec"), rows)
+
+
+if __name__ == "__main__":
+    main(parse_sizes(sys.argv[1:], [1, 100, 10000, 1000000]))
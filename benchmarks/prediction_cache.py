@@ -0,0 +1,86 @@
+"""
+Model.predict_array with and without the row-level prediction cache, for requests
+that resend the same entities (Zipf-distributed over a fixed set of rows), and a
+check that the cache is cleared when model/Model.sav is replaced.
+
+    python benchmarks/prediction_cache.py [requests] [rows per request]
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from common import print_table, synthetic_regression, temporary_package
+
+N_ENTITIES = 5000
+
+
+def save_pipeline(package, n_trees, seed=0):
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+
+    X, y = synthetic_regression(5000, 20, seed=seed)
+    pipeline = Pipeline([
+        ("nan_imputer", SimpleImputer()),
+        ("tpot_pipeline", Pipeline([("forest", RandomForestRegressor(n_trees, random_state=seed))])),
+    ]).fit(X, y)
+    joblib.dump(pipeline, os.path.join(package, "model", "Model.sav"))
+    joblib.dump([f"f{i}" for i in range(20)], os.path.join(package, "model", "Features.sav"))
+    return pipeline
+
+
+def requests(n_requests, rows_per_request, seed=0):
+    rng = np.random.RandomState(seed)
+    entities, _ = synthetic_regression(N_ENTITIES, 20, nan_fraction=0.05, seed=seed + 1)
+    ids = np.minimum(rng.zipf(1.3, size=(n_requests, rows_per_request)), N_ENTITIES) - 1
+    return [entities[batch] for batch in ids]
+
+
+def run(model, batches):
+    from time import perf_counter
+    start = perf_counter()
+    predictions = [model.predict_array(batch) for batch in batches]
+    return perf_counter() - start, predictions
+
+
+def main(n_requests, rows_per_request):
+    package = temporary_package(tempfile.mkdtemp(prefix="aif_cache_"))
+    save_pipeline(package, n_trees=100)
+    batches = requests(n_requests, rows_per_request)
+    from aiflib.model import Model
+
+    rows = []
+    results = {}
+    for cache_size in (0, 1000, 100000):
+        os.environ["prediction_cache_size"] = str(cache_size)
+        model = Model(is_infer_only=True)
+        elapsed, predictions = run(model, batches)
+        results[cache_size] = predictions
+        stats = model.cache_stats() or {}
+        rows.append((cache_size, f"{n_requests / elapsed:.0f}", f"{stats.get('hit_rate', 0.) * 100:.1f}",
+                     stats.get("evictions", 0)))
+    print_table(("cache rows", "requests/sec", "hit rate %", "evictions"), rows)
+
+    for cache_size, predictions in results.items():
+        if not all(np.allclose(a, b) for a, b in zip(predictions, results[0])):
+            sys.exit(f"Cached predictions differ from the pipeline with prediction_cache_size={cache_size}")
+
+    # Replacing Model.sav must clear the cache and load the new model
+    os.environ["prediction_cache_size"] = "100000"
+    model = Model(is_infer_only=True)
+    model.predict_array(batches[0])
+    replacement = save_pipeline(package, n_trees=10, seed=1)
+    stat = os.stat(os.path.join(package, "model", "Model.sav"))
+    os.utime(os.path.join(package, "model", "Model.sav"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    if not np.allclose(model.predict_array(batches[0]), replacement.predict(batches[0])):
+        sys.exit("Prediction cache was not invalidated when Model.sav changed")
+    print("Cached predictions match the pipeline, replacing Model.sav clears the cache.")
+
+
+if __name__ == "__main__":
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rows_per_request = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    main(n_requests, rows_per_request)
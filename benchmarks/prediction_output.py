@@ -0,0 +1,59 @@
+"""
+Time to serialize a batch of predictions: the json.dumps(predictions.tolist()) path
+versus the vectorized JSON encoder at a few precisions and the binary output formats.
+Every encoding is decoded back and compared with the predictions.
+
+    python benchmarks/prediction_output.py [batch sizes...]
+"""
+import json
+import sys
+
+import numpy as np
+
+from common import best_time, parse_sizes, print_table, repeats_for
+from aiflib import codec
+
+
+def decode(payload, output_format):
+    if output_format == codec.JSON:
+        return np.array(json.loads(payload), dtype=np.float64)
+    if output_format == codec.ARROW:
+        return codec.read_arrow_table(payload).column("prediction").to_numpy()
+    return np.frombuffer(payload, dtype="<f4" if output_format == codec.FLOAT32 else "<f8")
+
+
+def main(sizes):
+    try:
+        import pyarrow  # noqa: F401
+        has_arrow = True
+    except ImportError:
+        has_arrow = False
+
+    encodings = [("json (json.dumps)", codec.JSON, 0), ("json, 3 decimals", codec.JSON, 3),
+                 ("json, 6 decimals", codec.JSON, 6), ("float32", codec.FLOAT32, 0),
+                 ("float64", codec.FLOAT64, 0)]
+    if has_arrow:
+        encodings.append(("arrow", codec.ARROW, 0))
+
+    rows = []
+    for n_rows in sizes:
+        predictions = np.random.RandomState(0).randn(n_rows) * 1000
+        repeat = repeats_for(n_rows)
+        baseline = None
+        for name, output_format, precision in encodings:
+            encode = lambda: codec.encode_predictions(predictions, output_format, precision)
+            payload = encode()
+            tolerance = 0.51 * 10. ** -precision if precision else 0.
+            if output_format == codec.FLOAT32:
+                tolerance = 1e-6 * np.abs(predictions).max()
+            if not np.allclose(decode(payload, output_format), predictions, rtol=0, atol=tolerance):
+                sys.exit(f"{name} does not decode back to the predictions")
+            seconds = best_time(encode, repeat)
+            baseline = baseline or seconds
+            rows.append((n_rows, name, f"{seconds * 1000:.3f}", f"{baseline / seconds:.1f}x", len(payload)))
+
+    print_table(("rows", "output", "ms/batch", "speedup", "bytes"), rows)
+
+
+if __name__ == "__main__":
+    main(parse_sizes(sys.argv[1:], [1, 100, 10000, 1000000]))
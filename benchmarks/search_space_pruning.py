@@ -0,0 +1,80 @@
+"""
+Cost of the operators the search space planner leaves out. For a wide and a tall
+training set, profiles the data and plans the search space (then again from the
+cached profile), and times a 3-fold cross-validation of every removed operator in
+a pipeline with RidgeCV, as TPOT would evaluate it, next to the kept
+StandardScaler + RidgeCV for reference. Like TPOT's max_eval_time_mins, an
+evaluation is stopped after [timeout] seconds.
+
+    python benchmarks/search_space_pruning.py [wide rows] [wide features] [tall rows] [tall features] [timeout]
+"""
+import importlib
+import multiprocessing
+import sys
+import tempfile
+import warnings
+from time import perf_counter
+
+from common import print_table, synthetic_regression, temporary_package
+
+
+def operator(name, parameters):
+    """The operator of a config dict entry with the first value of each hyperparameter."""
+    module, _, cls = name.rpartition(".")
+    values = {key: list(values)[0] for key, values in parameters.items() if not isinstance(values, dict)}
+    return getattr(importlib.import_module(module), cls)(**values)
+
+
+def cross_validate(pipeline, X, y):
+    from sklearn.model_selection import cross_val_score
+    cross_val_score(pipeline, X, y, cv=3)
+
+
+def cv_seconds(step, X, y, timeout):
+    from sklearn.linear_model import RidgeCV
+    from sklearn.pipeline import make_pipeline
+    pipeline = make_pipeline(step, RidgeCV()) if not hasattr(step, "predict") else step
+    # A forked process inherits X and y, and is killed at the timeout
+    process = multiprocessing.get_context("fork").Process(target=cross_validate, args=(pipeline, X, y))
+    start = perf_counter()
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.kill()
+        process.join()
+        return f"> {timeout:.0f}"
+    return f"{perf_counter() - start:.2f}"
+
+
+def main(shapes, timeout):
+    warnings.simplefilter("ignore")
+    temporary_package(tempfile.mkdtemp(prefix="aif_pruning_"))
+    from aiflib.model import Model
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import StandardScaler
+
+    model = Model()
+    rows = []
+    for n_rows, n_features in shapes:
+        X, y = synthetic_regression(n_rows, n_features, nan_fraction=0.01)
+        start = perf_counter()
+        config_dict = model.search_space(X, y)
+        cold = perf_counter() - start
+        start = perf_counter()
+        model.search_space(X, y)
+        warm = perf_counter() - start
+        shape = f"{n_rows}x{n_features}"
+        print(f"{shape}: profile and plan {cold * 1000:.0f} ms, from the cached profile {warm * 1000:.0f} ms")
+
+        X = SimpleImputer().fit_transform(X)
+        rows.append((shape, "StandardScaler (kept)", cv_seconds(StandardScaler(), X, y, timeout)))
+        for name, parameters in model.config.classifier_config_dict.items():
+            if name not in config_dict:
+                rows.append((shape, name.rpartition(".")[2], cv_seconds(operator(name, parameters), X, y, timeout)))
+    print_table(("data", "operator", "3-fold cv s"), rows)
+
+
+if __name__ == "__main__":
+    sizes = [int(value) for value in sys.argv[1:5]] or [20000, 120, 200000, 10]
+    timeout = float(sys.argv[5]) if len(sys.argv) > 5 else 60
+    main([(sizes[0], sizes[1]), (sizes[2], sizes[3])], timeout)
@@ -0,0 +1,65 @@
+"""
+Throughput and latency of one-row requests, sent by concurrent clients, scored either
+one call per request or through the micro-batching BatchingPredictor.
+
+    python benchmarks/serving.py [concurrent clients...]
+"""
+import asyncio
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from common import linear_pipeline, model_with, parse_sizes, print_table, synthetic_regression
+from aiflib.serving import BatchingPredictor, ServingMetrics
+
+REQUESTS_PER_CLIENT = 200
+
+
+async def unbatched(model, rows, clients):
+    metrics = ServingMetrics()
+    loop = asyncio.get_event_loop()
+
+    async def client(offset):
+        for i in range(REQUESTS_PER_CLIENT):
+            start = perf_counter()
+            await loop.run_in_executor(None, model.predict_array, rows[offset + i:offset + i + 1])
+            metrics.record_request(perf_counter() - start, 1)
+
+    await asyncio.gather(*[client(c * REQUESTS_PER_CLIENT) for c in range(clients)])
+    return metrics.snapshot()
+
+
+async def batched(model, rows, clients, max_wait_ms, max_batch_size):
+    async with BatchingPredictor(model, max_batch_size = max_batch_size, max_wait_ms = max_wait_ms,
+                                 timeout_ms = 60000) as predictor:
+        async def client(offset):
+            for i in range(REQUESTS_PER_CLIENT):
+                await predictor.predict_array(rows[offset + i:offset + i + 1])
+
+        await asyncio.gather(*[client(c * REQUESTS_PER_CLIENT) for c in range(clients)])
+        return predictor.metrics.snapshot()
+
+
+def main(client_counts):
+    X, y = synthetic_regression(10000, 20)
+    model = model_with(linear_pipeline(X, y))
+    rows = np.ascontiguousarray(synthetic_regression(max(client_counts) * REQUESTS_PER_CLIENT, 20, seed=1)[0])
+
+    loop = asyncio.get_event_loop()
+    results = []
+    for clients in client_counts:
+        runs = [("per-request", loop.run_until_complete(unbatched(model, rows, clients)))]
+        for max_wait_ms in (0.5, 2, 10):
+            runs.append((f"batched wait={max_wait_ms}ms",
+                         loop.run_until_complete(batched(model, rows, clients, max_wait_ms, 256))))
+        for name, stats in runs:
+            results.append((clients, name, f"{stats['requests_per_sec']:,.0f}",
+                            f"{stats['p50_latency_ms']:.2f}", f"{stats['p99_latency_ms']:.2f}",
+                            f"{stats['mean_batch_rows']:.1f}" if stats["batches"] else "1.0"))
+
+    print_table(("clients", "mode", "requests/sec", "p50 ms", "p99 ms", "rows/batch"), results)
+
+
+if __name__ == "__main__":
+    main(parse_sizes(sys.argv[1:], [1, 16, 64, 256]))
@@ -0,0 +1,105 @@
+"""
+Memory and time of the pipeline search with the training data and cross-validation
+folds sent to the workers with every batch of pipelines, against written once to
+shared memory-mapped files (shared_training_data). Reports the time and size of
+pickling the data of one batch, the wall-clock time of one generation and the peak
+memory (summed PSS, so that shared pages count once) of the search process and its
+workers above the memory before the search, on the local executor and on a dask
+LocalCluster.
+
+    python benchmarks/shared_training_data.py [rows] [features] [workers]
+"""
+import pickle
+import sys
+import tempfile
+import threading
+import warnings
+from contextlib import nullcontext
+from time import perf_counter, sleep
+
+import psutil
+
+from common import print_table, synthetic_regression, temporary_package
+
+# Cheap pipelines, the search is dominated by moving the data around
+CONFIG = {
+    "sklearn.linear_model.RidgeCV": {},
+    "sklearn.linear_model.LassoLarsCV": {"normalize": [False]},
+    "sklearn.preprocessing.StandardScaler": {},
+}
+
+
+def tree_memory():
+    """Summed PSS (RSS where not available) of this process and its children in bytes."""
+    total = 0
+    process = psutil.Process()
+    for member in [process] + process.children(recursive=True):
+        try:
+            info = member.memory_full_info()
+            total += getattr(info, "pss", info.rss)
+        except psutil.Error:
+            pass
+    return total
+
+
+class PeakMemory:
+    def __enter__(self):
+        self.base = tree_memory()
+        self.peak = self.base
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, tree_memory())
+            sleep(0.1)
+
+    def __exit__(self, *exc_info):
+        self._done.set()
+        self._thread.join()
+
+
+def pickling(X, y, cv):
+    start = perf_counter()
+    size = len(pickle.dumps((X, y, cv), protocol=pickle.HIGHEST_PROTOCOL))
+    return perf_counter() - start, size
+
+
+def search(X, y, executor, workers, shared):
+    from aiflib.executors import executor_for
+    from aiflib.scheduler import ScheduledTPOTRegressor
+    from aiflib.shared_data import SharedTrainingData, shared_directory
+    data = SharedTrainingData(X, y, 5, shared_directory(X.nbytes + y.nbytes, tempfile.gettempdir())) \
+        if shared else nullcontext((X, y, 5))
+    with PeakMemory() as memory:
+        with executor_for(executor)(workers, 1, 0) as n_jobs, data as (X_search, y_search, cv):
+            seconds, size = pickling(X_search, y_search, cv)
+            optimizer = ScheduledTPOTRegressor(generations=1, population_size=2 * workers, offspring_size=1,
+                                               cv=cv, n_jobs=n_jobs, random_state=0, verbosity=0,
+                                               config_dict=CONFIG)
+            start = perf_counter()
+            optimizer.fit(X_search, y_search)
+            wall = perf_counter() - start
+    return (f"{1000 * seconds:.1f}", f"{size / 2 ** 20:.1f}", len(optimizer.evaluated_individuals_),
+            f"{wall:.1f}", f"{(memory.peak - memory.base) / 2 ** 20:.0f}")
+
+
+def main(n_rows, n_features, workers):
+    warnings.simplefilter("ignore")
+    temporary_package(tempfile.mkdtemp(prefix="aif_shared_"))
+    X, y = synthetic_regression(n_rows, n_features)
+    print(f"Training data: [{X.nbytes / 2 ** 20:.0f}] MB, [{workers}] workers")
+    rows = []
+    for executor in ["local", "dask"]:
+        for shared in [False, True]:
+            rows.append((executor, "shared" if shared else "copied") + search(X, y, executor, workers, shared))
+    print_table(("executor", "training data", "pickle ms", "pickle MB", "pipelines", "wall s", "peak MB"), rows)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 250000
+    n_features = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    main(n_rows, n_features, workers)
@@ -0,0 +1,96 @@
+"""
+Writing a split of a frame as process_data does: the former frame.iloc[rows].to_csv
+followed by an MD5 of the file read back into memory, versus DataManager.write_dataframe
+hashing chunks while they are written, for each checksum and split format. Also
+reports the size of the file, the time to read it back with DataManager and the peak
+of the memory traced while writing. Exits with an error when a split format does not
+read back the rows written.
+
+    python benchmarks/split_writing.py [rows] [features]
+"""
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from common import feature_names, print_table, synthetic_regression
+
+
+def write_then_hash(frame, rows, directory):
+    """write_dataframe and checksum before single-pass hashing."""
+    path = os.path.join(directory, "train.csv")
+    frame.iloc[rows].to_csv(path, index=False)
+    with open(path, "rb") as infile:
+        return hashlib.md5(infile.read()).hexdigest()
+
+
+def traced_peak(function):
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def main(n_rows, n_features):
+    from aiflib import formats
+    from aiflib.data_manager import DataManager
+
+    X, y = synthetic_regression(n_rows, n_features, nan_fraction=0.01)
+    frame = pd.DataFrame(X, columns=feature_names(n_features)).assign(target=y)
+    rows = np.random.RandomState(0).permutation(n_rows)[:int(0.8 * n_rows)]
+    os.environ.update(target_column="target", dataset_cache="false", read_workers="1")
+
+    available = {"xxhash": "xxhash", formats.CSV_ZSTD: "zstandard", formats.PARQUET: "pyarrow"}
+    def installed(name):
+        try:
+            __import__(available.get(name, "os"))
+            return True
+        except ImportError:
+            return False
+
+    cases = [("csv", "md5 (read back)")]
+    cases += [(formats.CSV, checksum) for checksum in ("md5", "blake2b", "crc32", "xxhash", "none")]
+    cases += [(file_format, "crc32") for file_format in (formats.CSV_GZIP, formats.CSV_ZSTD, formats.PARQUET)]
+
+    table = []
+    for file_format, checksum in cases:
+        if not installed(checksum) or not installed(file_format):
+            continue
+        directory = tempfile.mkdtemp(prefix="aif_split_")
+        try:
+            if checksum == "md5 (read back)":
+                write = lambda: write_then_hash(frame, rows, directory)
+            else:
+                os.environ.update(split_format=file_format, split_checksum=checksum)
+                write = lambda: DataManager.write_dataframe(frame, "train", directory, rows=rows)
+            start = perf_counter()
+            write()
+            seconds = perf_counter() - start
+            peak = traced_peak(write)
+            size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+            start = perf_counter()
+            read = DataManager(directory).get_data()
+            read_seconds = perf_counter() - start
+            if len(read) != len(rows):
+                sys.exit(f"{file_format} read back {len(read)} of {len(rows)} rows")
+            if not np.allclose(np.sort(read["target"].to_numpy()), np.sort(y[rows])):
+                sys.exit(f"{file_format} read back other targets than those written")
+        finally:
+            shutil.rmtree(directory)
+        table.append((file_format, checksum, f"{seconds:.2f}", f"{peak:.0f}", f"{size / 2 ** 20:.0f}",
+                      f"{read_seconds:.2f}"))
+
+    print_table(("format", "checksum", "write s", "traced peak MiB", "file MiB", "read s"), table)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    n_features = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    main(n_rows, n_features)
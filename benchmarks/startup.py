@@ -0,0 +1,101 @@
+"""
+Cold start of the inference path: import time of main.py, Main() construction, the
+warm-up done by servers before they accept requests and the first prediction, each
+measured in a fresh interpreter. Results are appended to a
+JSON lines history file so that regressions show up over time.
+
+    python benchmarks/startup.py [runs] [history file]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from common import ROOT, print_table, synthetic_regression, temporary_package
+
+TRAINING_ONLY_MODULES = ["tpot", "deap", "aiflib.data_manager", "pandas"]
+
+_PROBE = """
+import json, sys
+from time import perf_counter
+start = perf_counter()
+import main
+imported = perf_counter()
+m = main.Main()
+constructed = perf_counter()
+m.model.warm_up()
+warmed = perf_counter()
+m.predict(sys.argv[1])
+predicted = perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "main_s": constructed - imported,
+    "warm_up_s": warmed - constructed,
+    "first_predict_s": predicted - warmed,
+    "modules": len(sys.modules),
+    "training_modules": [name for name in %r if name in sys.modules],
+}))
+""" % (TRAINING_ONLY_MODULES,)
+
+
+def train_artifacts(package):
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+
+    X, y = synthetic_regression(2000, 20)
+    pipeline = Pipeline([
+        ("nan_imputer", SimpleImputer()),
+        ("tpot_pipeline", Pipeline([("forest", RandomForestRegressor(50, random_state=0))])),
+    ]).fit(X, y)
+    joblib.dump(pipeline, os.path.join(package, "model", "Model.sav"))
+    joblib.dump([f"f{i}" for i in range(20)], os.path.join(package, "model", "Features.sav"))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(runs, history_path):
+    package = temporary_package(tempfile.mkdtemp(prefix="aif_startup_"))
+    train_artifacts(package)
+    payload = json.dumps([{f"f{i}": 0.5 for i in range(20)}])
+
+    results = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-W", "ignore", "-c", _PROBE, payload],
+                                         cwd=package, stderr=subprocess.DEVNULL)
+        results.append(json.loads(output.decode().strip().splitlines()[-1]))
+
+    best = {key: min(result[key] for result in results) for key in ("import_s", "main_s", "warm_up_s", "first_predict_s")}
+    entry = dict(best, timestamp=datetime.now().isoformat(timespec="seconds"), revision=git_revision(),
+                 package=os.path.basename(os.path.dirname(os.path.join(package, ""))),
+                 modules=results[-1]["modules"], training_modules=results[-1]["training_modules"])
+
+    previous = None
+    if os.path.isfile(history_path):
+        with open(history_path) as history:
+            lines = [line for line in history if line.strip()]
+            previous = json.loads(lines[-1]) if lines else None
+    with open(history_path, "a") as history:
+        history.write(json.dumps(entry) + "\n")
+
+    rows = []
+    for key in ("import_s", "main_s", "warm_up_s", "first_predict_s"):
+        before = f"{previous[key] * 1000:.1f}" if previous and key in previous else ""
+        rows.append((key, f"{entry[key] * 1000:.1f}", before))
+    print_table(("stage", "ms (best of %d)" % runs, "previous ms"), rows)
+    print(f"modules loaded: {entry['modules']}, training-only modules loaded: {entry['training_modules']}")
+    print(f"appended to {history_path}")
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    history = sys.argv[2] if len(sys.argv) > 2 else os.path.join(ROOT, "benchmarks", "startup_history.jsonl")
+    main(runs, history)
@@ -0,0 +1,72 @@
+"""
+Peak resident memory and time of reading a training directory for the TPOT search:
+DataManager reading every row versus streaming the files into a search sample and a
+refit sample ("search_sample" uniform and stratified). The peak of the full read
+grows with the data, the peak of the sampled reads stays bounded by the sample sizes.
+
+The last column is the spread of the search sample over the target deciles of the
+data: the fewest and most rows of any decile, stratified samples fill every decile.
+
+    python benchmarks/streaming_sample.py [total rows...]
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from common import PACKAGE_DIR, parse_sizes, print_table
+from csv_ingestion import write_files
+
+_READ = """
+import json, os
+import numpy as np
+from time import perf_counter
+start = perf_counter()
+from aiflib.data_manager import DataManager
+dm = DataManager(os.environ["directory"], sample=os.environ["search_sample"] != "none")
+frame = dm.get_data()
+seconds = perf_counter() - start
+with open("/proc/self/status") as status:
+    peak = [int(line.split()[1]) / 1024 for line in status if line.startswith("VmHWM:")][0]
+deciles = np.load(os.environ["deciles"])
+counts = np.bincount(np.searchsorted(deciles, frame["target"].to_numpy(), side="right"), minlength=10)
+print(json.dumps({"seconds": seconds, "peak_mb": peak, "rows": len(frame),
+                  "refit_rows": len(dm.get_refit_data()) if dm.get_refit_data() is not None else 0,
+                  "spread": [int(counts.min()), int(counts.max())]}))
+"""
+
+
+def main(sizes, n_files=10, search_rows=20000, refit_rows=100000):
+    import numpy as np
+    import pandas as pd
+
+    rows = []
+    for total_rows in sizes:
+        directory = tempfile.mkdtemp(prefix="aif_streaming_")
+        try:
+            write_files(directory, n_files, total_rows)
+            target = pd.concat(pd.read_csv(os.path.join(directory, name), usecols=["target"])
+                               for name in os.listdir(directory))["target"].to_numpy()
+            np.save(os.path.join(directory, "deciles.npy"), np.quantile(target, np.linspace(0, 1, 11)[1:-1]))
+            environment = dict(os.environ, directory=directory, deciles=os.path.join(directory, "deciles.npy"),
+                               target_column="target", dataset_cache="false", read_workers="1",
+                               search_sample_rows=str(search_rows), refit_sample_rows=str(refit_rows))
+            for search_sample in ("none", "uniform", "stratified"):
+                environment["search_sample"] = search_sample
+                output = subprocess.check_output([sys.executable, "-W", "ignore", "-c", _READ],
+                                                 cwd=PACKAGE_DIR, env=environment, stderr=subprocess.DEVNULL)
+                result = json.loads(output.decode().strip().splitlines()[-1])
+                rows.append((total_rows, search_sample, result["rows"], result["refit_rows"],
+                             f"{result['peak_mb']:.0f}", f"{result['seconds']:.2f}",
+                             "{}-{}".format(*result["spread"])))
+        finally:
+            shutil.rmtree(directory)
+
+    print_table(("total rows", "search_sample", "search rows", "refit rows", "peak MiB", "seconds",
+                 "rows per decile"), rows)
+
+
+if __name__ == "__main__":
+    main(parse_sizes(sys.argv[1:], [200000, 1000000, 3000000]))
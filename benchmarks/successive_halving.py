@@ -0,0 +1,75 @@
+"""
+Best cross-validation score reached per wall-clock minute by the TPOT search with
+full evaluation of every pipeline versus successive halving (search_fidelity=halving),
+on the same data, config dict, seed and time budget. Scores are R^2 on all rows:
+with halving, only pipelines promoted to the last rung get one.
+
+    python benchmarks/successive_halving.py [rows] [minutes] [halving_factor] [halving_min_rows]
+"""
+import sys
+import tempfile
+import warnings
+from time import perf_counter
+
+import numpy as np
+
+from common import print_table, temporary_package
+
+
+def traced(regressor):
+    """The regressor recording the best score after each generation with the elapsed time."""
+    class Traced(regressor):
+        def _evaluate_individuals(self, *args, **kwargs):
+            try:
+                return super()._evaluate_individuals(*args, **kwargs)
+            finally:
+                scores = [stats["internal_cv_score"] for stats in self.evaluated_individuals_.values()]
+                self.trace_.append((perf_counter() - self.start_, max(scores, default=-np.inf)))
+    return Traced
+
+
+def search(regressor, X, y, minutes, **kwargs):
+    from aiflib.config import Config
+    optimizer = traced(regressor)(generations=1000, population_size=20, cv=3, scoring="r2", n_jobs=1,
+                                  max_time_mins=minutes, max_eval_time_mins=1, random_state=0,
+                                  config_dict=Config().classifier_config_dict, verbosity=0, **kwargs)
+    optimizer.trace_, optimizer.start_ = [], perf_counter()
+    try:
+        optimizer.fit(X, y)
+    except RuntimeError:
+        # No pipeline was fully evaluated within the budget
+        pass
+    return optimizer
+
+
+def best_at(trace, seconds):
+    scores = [score for elapsed, score in trace if elapsed <= seconds]
+    return f"{max(scores):.4f}" if scores and np.isfinite(max(scores)) else "-"
+
+
+def main(n_rows, minutes, factor, min_rows):
+    warnings.simplefilter("ignore")
+    temporary_package(tempfile.mkdtemp(prefix="aif_halving_"))
+    from sklearn.datasets import make_friedman1
+    from tpot import TPOTRegressor
+    from aiflib.halving import HalvingTPOTRegressor, rung_budgets
+
+    X, y = make_friedman1(n_rows, n_features=20, noise=0.5, random_state=0)
+    print(f"rungs: {rung_budgets(n_rows, factor, min_rows)} rows")
+    runs = [
+        ("full", search(TPOTRegressor, X, y, minutes)),
+        ("halving", search(HalvingTPOTRegressor, X, y, minutes, halving_factor=factor, halving_min_rows=min_rows)),
+    ]
+    marks = [60 * (i + 1) for i in range(int(minutes))]
+    rows = [(name, len(optimizer.evaluated_individuals_), len(optimizer.trace_))
+            + tuple(best_at(optimizer.trace_, mark) for mark in marks) for name, optimizer in runs]
+    print_table(("evaluation", "pipelines", "generations") + tuple(f"best at {mark // 60} min" for mark in marks),
+                rows)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    minutes = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    factor = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    min_rows = int(sys.argv[4]) if len(sys.argv) > 4 else 1000
+    main(n_rows, minutes, factor, min_rows)
@@ -0,0 +1,90 @@
+"""
+Peak resident memory on a wide csv dataset for each "data_dtype": the float64 columns
+pandas parses, lossless float32 downcasting ("auto") and float32 for every feature
+("float32"). Half of the feature columns hold integer counts, which float32 represents
+exactly, the other half measurements with 4 decimals.
+
+Measured in fresh processes: the data path of Model.train up to the TPOT search
+(reading, feature matrix, imputation) and Model.train with a minimal TPOT search, whose
+peak also depends on the pipelines the search happens to try.
+
+    python benchmarks/training_memory.py [rows] [features]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from common import print_table, temporary_package
+
+_DATA_PATH = """
+import json
+import numpy as np
+from time import perf_counter
+start = perf_counter()
+from sklearn.impute import SimpleImputer
+from aiflib.data_manager import DataManager
+dm = DataManager("dataset/training")
+data_df = dm.get_data()
+X = data_df[dm.get_feature_columns()].to_numpy()
+del data_df, dm
+X = SimpleImputer(missing_values=np.nan, strategy="mean", copy=False).fit_transform(X)
+with open("/proc/self/status") as status:
+    peak = [int(line.split()[1]) / 1024 for line in status if line.startswith("VmHWM:")][0]
+print(json.dumps({"seconds": perf_counter() - start, "peak_mb": peak, "dtype": X.dtype.name}))
+"""
+
+_TRAIN = """
+import json, os
+from time import perf_counter
+start = perf_counter()
+from aiflib.model import Model
+model = Model()
+model.train("dataset/training")
+with open("/proc/self/status") as status:
+    peak = [int(line.split()[1]) / 1024 for line in status if line.startswith("VmHWM:")][0]
+print(json.dumps({"seconds": perf_counter() - start, "peak_mb": peak,
+                  "dtype": model.input_schema.dtype.name}))
+"""
+
+
+def write_dataset(package, n_rows, n_features, seed=0):
+    rng = np.random.RandomState(seed)
+    counts = rng.poisson(20, size=(n_rows, n_features // 2)).astype(np.int64)
+    measurements = np.round(rng.randn(n_rows, n_features - n_features // 2), 4)
+    measurements[rng.rand(*measurements.shape) < 0.01] = np.nan
+    frame = pd.DataFrame(np.hstack([counts, measurements]), columns=[f"f{i}" for i in range(n_features)])
+    frame[[f"f{i}" for i in range(n_features // 2)]] = counts
+    frame["target"] = counts[:, 0] * 0.5 + np.nan_to_num(measurements[:, 0]) + rng.randn(n_rows)
+    frame.to_csv(os.path.join(package, "dataset", "training", "data.csv"), index=False)
+
+
+def main(n_rows, n_features):
+    package = temporary_package(tempfile.mkdtemp(prefix="aif_train_memory_"))
+    write_dataset(package, n_rows, n_features)
+    environment = dict(os.environ, target_column="target", generations="1", population_size="2",
+                       offspring_size="2", cv="2", max_time_mins="2", max_eval_time_mins="0.5",
+                       dataset_cache="false")
+
+    rows = []
+    for data_dtype in ("float64", "auto", "float32"):
+        environment["data_dtype"] = data_dtype
+        row = [data_dtype]
+        for script in (_DATA_PATH, _TRAIN):
+            output = subprocess.check_output([sys.executable, "-W", "ignore", "-c", script], cwd=package,
+                                             env=environment, stderr=subprocess.DEVNULL)
+            result = json.loads(output.decode().strip().splitlines()[-1])
+            row += [result["dtype"], f"{result['peak_mb']:.0f}", f"{result['seconds']:.1f}"]
+        rows.append(tuple(row[:4] + row[5:]))
+    print_table(("data_dtype", "X dtype", "data path peak MiB", "seconds",
+                 "train peak MiB", "train seconds"), rows)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_features = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    main(n_rows, n_features)
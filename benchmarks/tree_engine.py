@@ -0,0 +1,57 @@
+"""
+Prediction speed and model size of the flattened tree engine against scikit-learn,
+for the tree models of the TPOT search space.
+
+    python benchmarks/tree_engine.py [batch sizes...]
+"""
+import pickle
+import sys
+
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import make_pipeline
+from sklearn.tree import DecisionTreeRegressor
+
+from common import best_time, parse_sizes, print_table, repeats_for, synthetic_regression
+from aiflib.compiler import compile_pipeline
+
+MODELS = [
+    DecisionTreeRegressor(max_depth=10, random_state=0),
+    RandomForestRegressor(n_estimators=100, min_samples_leaf=5, random_state=0),
+    ExtraTreesRegressor(n_estimators=100, min_samples_leaf=5, random_state=0),
+    GradientBoostingRegressor(n_estimators=100, max_depth=5, random_state=0),
+]
+
+
+def main(sizes):
+    X, y = synthetic_regression(20000, 20, nan_fraction=0.02)
+    X_check, _ = synthetic_regression(5000, 20, nan_fraction=0.02, seed=1)
+
+    sizes_rows, speed_rows = [], []
+    for estimator in MODELS:
+        name = type(estimator).__name__
+        pipeline = make_pipeline(SimpleImputer(), estimator).fit(X, y)
+        compiled = compile_pipeline(pipeline, X[:1000])
+        if compiled is None:
+            sys.exit(f"{name} was not compiled")
+
+        error = np.max(np.abs(compiled.predict(X_check) - pipeline.predict(X_check)))
+        sizes_rows.append((name, f"{len(pickle.dumps(estimator)) / 2 ** 20:.2f}",
+                           f"{compiled.ensemble.nbytes / 2 ** 20:.2f}", f"{error:.2e}"))
+
+        for n_rows in sizes:
+            X_bench, _ = synthetic_regression(n_rows, 20, nan_fraction=0.02, seed=2)
+            repeat = repeats_for(n_rows)
+            sklearn_time = best_time(lambda: pipeline.predict(X_bench), repeat)
+            engine_time = best_time(lambda: compiled.predict(X_bench), repeat)
+            speed_rows.append((name, n_rows, f"{n_rows / sklearn_time:,.0f}", f"{n_rows / engine_time:,.0f}",
+                               f"{sklearn_time / engine_time:.2f}x"))
+
+    print_table(("model", "sklearn MiB (pickled)", "engine MiB", "max abs error"), sizes_rows)
+    print()
+    print_table(("model", "rows", "sklearn rows/sec", "engine rows/sec", "speedup"), speed_rows)
+
+
+if __name__ == "__main__":
+    main(parse_sizes(sys.argv[1:], [1, 100, 10000, 1000000]))
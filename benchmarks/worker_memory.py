@@ -0,0 +1,118 @@
+"""
+Resident memory and Main() startup time per serving worker, for a large random forest,
+with workers that each load the model versus workers forked after preload(), and with
+memory-mapped artifacts on or off. The forest is served from its flattened trees
+(Compiled.sav) or, without them, from Model.sav: scikit-learn copies the node arrays of
+its trees when they are unpickled, so memory-mapping Model.sav shares none of them and
+only forking after preload() does.
+
+    python benchmarks/worker_memory.py [workers]
+"""
+import json
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+from common import memory_usage, print_table, synthetic_regression, temporary_package
+
+N_TREES = 300
+
+
+def train_artifacts(package):
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from aiflib.compiler import compile_pipeline
+
+    X, y = synthetic_regression(20000, 20)
+    pipeline = Pipeline([
+        ("nan_imputer", SimpleImputer()),
+        ("tpot_pipeline", Pipeline([("forest", RandomForestRegressor(N_TREES, min_samples_leaf=2, random_state=0))])),
+    ]).fit(X, y)
+    model_directory = os.path.join(package, "model")
+    joblib.dump(pipeline, os.path.join(model_directory, "Model.sav"))
+    joblib.dump([f"f{i}" for i in range(20)], os.path.join(model_directory, "Features.sav"))
+    joblib.dump(compile_pipeline(pipeline, X[:1000]), os.path.join(model_directory, "Compiled.sav"))
+
+
+def run_workers(workers, preloaded):
+    """Fork the workers and collect the memory each reports after its first prediction."""
+    import numpy as np
+    from aiflib import codec
+    payload = codec.encode_npy(np.zeros((10, 20)))
+
+    pipes = []
+    for _ in range(workers):
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            start = perf_counter()
+            from main import Main
+            main = Main()
+            startup = perf_counter() - start
+            main.predict(payload)
+            report = dict(memory_usage(), startup=startup)
+            os.write(write_end, json.dumps(report).encode())
+            os._exit(0)
+        os.close(write_end)
+        pipes.append((pid, read_end))
+
+    reports = []
+    for pid, read_end in pipes:
+        with os.fdopen(read_end) as pipe:
+            reports.append(json.loads(pipe.read()))
+        os.waitpid(pid, 0)
+    return reports
+
+
+def scenario(workers, preloaded, mmap_model):
+    """Run one scenario in a fresh process, so that earlier scenarios do not share pages."""
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        os.environ["mmap_model"] = "true" if mmap_model else "false"
+        if preloaded:
+            from aiflib.model import preload
+            preload()
+        reports = run_workers(workers, preloaded)
+        os.write(write_end, json.dumps(reports).encode())
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        reports = json.loads(pipe.read())
+    os.waitpid(pid, 0)
+    return reports
+
+
+def main(workers):
+    package = temporary_package(tempfile.mkdtemp(prefix="aif_memory_"))
+    train_artifacts(package)
+    os.chdir(package)
+    compiled = os.path.join(package, "model", "Compiled.sav")
+    sizes = {name: os.path.getsize(os.path.join(package, "model", name)) / 2 ** 20
+             for name in ("Model.sav", "Compiled.sav")}
+
+    rows = []
+    for artifact in ("Compiled.sav", "Model.sav"):
+        if artifact == "Model.sav":
+            # Served from the scikit-learn pipeline
+            os.remove(compiled)
+        for preloaded in (False, True):
+            for mmap_model in (False, True):
+                reports = scenario(workers, preloaded, mmap_model)
+                mean = lambda key: sum(report[key] for report in reports) / len(reports)
+                rows.append((artifact, "preloaded" if preloaded else "independent", "on" if mmap_model else "off",
+                             f"{mean('rss'):.1f}", f"{mean('pss'):.1f}", f"{mean('private'):.1f}",
+                             f"{mean('startup') * 1000:.1f}"))
+
+    print(f"{workers} workers, random forest with {N_TREES} trees "
+          f"(Model.sav {sizes['Model.sav']:.1f} MiB, Compiled.sav {sizes['Compiled.sav']:.1f} MiB)")
+    print_table(("served from", "workers", "mmap", "RSS MiB", "PSS MiB", "private MiB", "Main() ms"), rows)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
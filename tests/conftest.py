@@ -0,0 +1,14 @@
+"""
+The tests import ``aiflib`` from one of the ML packages of this repository, selected
+with the ``AIF_PACKAGE`` environment variable (default: TPOT_all_models), as the
+benchmarks do.
+
+    python -m pytest -q tests
+    AIF_PACKAGE=TPOT_xgboost python -m pytest -q tests
+"""
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+PACKAGE_DIR = os.path.join(ROOT, os.environ.get("AIF_PACKAGE", "TPOT_all_models"))
+sys.path.insert(0, PACKAGE_DIR)
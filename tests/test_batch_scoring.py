@@ -0,0 +1,120 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import RidgeCV
+from sklearn.pipeline import Pipeline
+
+from conftest import PACKAGE_DIR
+
+FEATURES = ["a", "b", "c"]
+
+
+@pytest.fixture(scope = "module")
+def package(tmp_path_factory):
+    """Copy of the ML package with a trained model, score.py reads model/ next to aiflib."""
+    directory = str(tmp_path_factory.mktemp("package"))
+    shutil.copytree(os.path.join(PACKAGE_DIR, "aiflib"), os.path.join(directory, "aiflib"),
+                    ignore = shutil.ignore_patterns("__pycache__"))
+    shutil.copy(os.path.join(PACKAGE_DIR, "score.py"), directory)
+    os.makedirs(os.path.join(directory, "model"))
+    X, y = frame(500, 0)
+    pipeline = Pipeline([("nan_imputer", SimpleImputer()), ("tpot_pipeline", RidgeCV())])
+    pipeline.fit(X[FEATURES].to_numpy(), y)
+    joblib.dump(pipeline, os.path.join(directory, "model", "Model.sav"))
+    joblib.dump({"columns": FEATURES, "dtype": "float64"}, os.path.join(directory, "model", "Features.sav"))
+    return directory, pipeline
+
+
+def frame(n_rows, seed):
+    rng = np.random.RandomState(seed)
+    # Columns in another order than the training ones, with an id and an unused column
+    X = pd.DataFrame({"id": np.arange(n_rows) + 1000, "c": rng.randn(n_rows), "a": rng.randn(n_rows),
+                      "unused": rng.randn(n_rows), "b": rng.randn(n_rows)})
+    return X, X["a"] * 2 - X["b"] + 0.1 * rng.randn(n_rows)
+
+
+def score(package, inputs, output, *options):
+    directory, _ = package
+    subprocess.run([sys.executable, "score.py", *inputs, "-o", output, *options],
+                   cwd = directory, check = True, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+
+
+def read(path):
+    return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_csv_predictions_keep_the_input_order(package, tmp_path, workers):
+    _, pipeline = package
+    X, _ = frame(1000, 1)
+    inputs = [str(tmp_path / "first.csv"), str(tmp_path / "second.csv")]
+    X[:700].to_csv(inputs[0], index = False)
+    X[700:].to_csv(inputs[1], index = False)
+    output = str(tmp_path / "predictions.csv")
+    score(package, inputs, output, "--id-column", "id", "--workers", workers, "--chunk-rows", "64")
+    predictions = read(output)
+    assert list(predictions.columns) == ["id", "prediction"]
+    np.testing.assert_array_equal(predictions["id"], X["id"])
+    np.testing.assert_allclose(predictions["prediction"], pipeline.predict(X[FEATURES].to_numpy()))
+
+
+def test_predictions_without_id_column(package, tmp_path):
+    _, pipeline = package
+    X, _ = frame(100, 2)
+    X.to_csv(tmp_path / "input.csv", index = False)
+    score(package, [str(tmp_path / "input.csv")], str(tmp_path / "predictions.csv"))
+    predictions = read(str(tmp_path / "predictions.csv"))
+    assert list(predictions.columns) == ["prediction"]
+    np.testing.assert_allclose(predictions["prediction"], pipeline.predict(X[FEATURES].to_numpy()))
+
+
+def test_missing_id_column_fails(package, tmp_path):
+    X, _ = frame(10, 3)
+    X.drop(columns = "id").to_csv(tmp_path / "input.csv", index = False)
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        score(package, [str(tmp_path / "input.csv")], str(tmp_path / "predictions.csv"), "--id-column", "id")
+    assert b"Id column [id] not found" in error.value.stderr
+
+
+def test_empty_csv_gives_a_header(package, tmp_path):
+    frame(0, 0)[0].to_csv(tmp_path / "input.csv", index = False)
+    score(package, [str(tmp_path / "input.csv")], str(tmp_path / "predictions.csv"), "--id-column", "id")
+    assert (tmp_path / "predictions.csv").read_text().splitlines() == ["id,prediction"]
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_parquet_input(package, tmp_path, output_format):
+    pytest.importorskip("pyarrow")
+    _, pipeline = package
+    X, _ = frame(300, 4)
+    X.to_parquet(tmp_path / "input.parquet", index = False)
+    output = str(tmp_path / f"predictions.{output_format}")
+    score(package, [str(tmp_path / "input.parquet")], output, "--id-column", "id", "--chunk-rows", "50")
+    predictions = read(output)
+    assert list(predictions.columns) == ["id", "prediction"]
+    np.testing.assert_array_equal(predictions["id"], X["id"])
+    np.testing.assert_allclose(predictions["prediction"], pipeline.predict(X[FEATURES].to_numpy()))
+
+
+@pytest.mark.parametrize("input_format", ["csv", "parquet"])
+def test_empty_input_gives_an_empty_parquet_table(package, tmp_path, input_format):
+    pq = pytest.importorskip("pyarrow.parquet")
+    X, _ = frame(0, 0)
+    path = str(tmp_path / f"input.{input_format}")
+    X.to_csv(path, index = False) if input_format == "csv" else X.to_parquet(path, index = False)
+    output = str(tmp_path / "predictions.parquet")
+    score(package, [path], output, "--id-column", "id")
+    table = pq.read_table(output)
+    assert table.num_rows == 0
+    assert table.column_names == ["id", "prediction"]
+    assert str(table.schema.field("prediction").type) == "double"
+    if input_format == "parquet":
+        # The id column keeps its type
+        assert str(table.schema.field("id").type) == "int64"
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from sklearn.decomposition import PCA
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import ElasticNetCV, LassoLarsCV, RidgeCV, SGDRegressor
+from sklearn.pipeline import Pipeline, make_pipeline
+from sklearn.preprocessing import MaxAbsScaler, MinMaxScaler, RobustScaler, StandardScaler
+from sklearn.svm import LinearSVR
+
+from aiflib.compiler import AffineModel, compile_pipeline
+
+SCALERS = [
+    None,
+    StandardScaler(),
+    StandardScaler(with_mean = False),
+    StandardScaler(with_std = False),
+    MinMaxScaler(),
+    RobustScaler(),
+    RobustScaler(with_centering = False),
+    RobustScaler(with_scaling = False),
+    MaxAbsScaler(),
+]
+MODELS = [RidgeCV(), ElasticNetCV(random_state = 0), LassoLarsCV(), LinearSVR(random_state = 0),
+          SGDRegressor(random_state = 0)]
+
+
+def regression(n_rows, seed, nan_fraction = 0.05):
+    rng = np.random.RandomState(seed)
+    X = rng.randn(n_rows, 10) * rng.uniform(0.5, 20, 10) + rng.uniform(-5, 5, 10)
+    y = X @ rng.randn(10) + 0.1 * rng.randn(n_rows)
+    X[rng.rand(n_rows, 10) < nan_fraction] = np.nan
+    return X, y
+
+
+def fitted(*steps):
+    X, y = regression(2000, 0)
+    # Same layout as Model.build_model: the imputer wraps the TPOT pipeline
+    return Pipeline([("nan_imputer", SimpleImputer(strategy = "mean")),
+                     ("tpot_pipeline", make_pipeline(*steps))]).fit(X, y), X
+
+
+@pytest.mark.parametrize("model", MODELS, ids = lambda model: type(model).__name__)
+@pytest.mark.parametrize("scaler", SCALERS, ids = repr)
+def test_compiled_predictions_match_scikit_learn(scaler, model):
+    steps = [scaler, model] if scaler is not None else [model]
+    pipeline, X = fitted(*steps)
+    compiled = compile_pipeline(pipeline, X[:1000])
+    assert isinstance(compiled, AffineModel)
+    X_check, _ = regression(500, 1)
+    np.testing.assert_allclose(compiled.predict(X_check), pipeline.predict(X_check), rtol = 1e-6, atol = 1e-6)
+
+
+def test_unsupported_step_falls_back():
+    pipeline, X = fitted(PCA(n_components = 5), RidgeCV())
+    assert compile_pipeline(pipeline, X[:1000]) is None
+
+
+@pytest.mark.skipif("clip" not in MinMaxScaler().get_params(), reason = "MinMaxScaler(clip) needs scikit-learn 0.24")
+def test_clipping_min_max_scaler_falls_back():
+    pipeline, X = fitted(MinMaxScaler(clip = True), RidgeCV())
+    assert compile_pipeline(pipeline, X[:1000]) is None
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aiflib.dataset_cache import DatasetCache, sampled_checksum
+
+MB = 1 << 20
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DatasetCache(str(tmp_path / "dataset_cache"), 100 * MB)
+
+
+def write(path, content, mtime_ns = None):
+    with open(path, "wb") as outfile:
+        outfile.write(content)
+    if mtime_ns is not None:
+        os.utime(path, ns = (mtime_ns, mtime_ns))
+    return str(path)
+
+
+def test_key_of_an_unchanged_file_is_stable(cache, tmp_path):
+    path = write(tmp_path / "data.csv", b"a,b\n1,2\n")
+    assert cache.key(path) == cache.key(path)
+    assert cache.key(path, delimiter = ",") != cache.key(path, delimiter = ";")
+
+
+def test_key_changes_with_the_size(cache, tmp_path):
+    path = write(tmp_path / "data.csv", b"a,b\n1,2\n", mtime_ns = 10 ** 18)
+    key = cache.key(path)
+    write(path, b"a,b\n1,2\n3,4\n", mtime_ns = 10 ** 18)
+    assert cache.key(path) != key
+
+
+def test_key_changes_with_the_modification_time(cache, tmp_path):
+    path = write(tmp_path / "data.csv", b"a,b\n1,2\n", mtime_ns = 10 ** 18)
+    key = cache.key(path)
+    os.utime(path, ns = (10 ** 18 + 1, 10 ** 18 + 1))
+    assert cache.key(path) != key
+
+
+@pytest.mark.parametrize("offset, detected", [(0, True), (3 * MB - 1, True), (MB + 10, False)])
+def test_key_checksums_the_head_and_the_tail(cache, tmp_path, offset, detected):
+    # Same size and modification time, one byte changed at the start, at the end or in the middle
+    content = bytearray(np.random.RandomState(0).bytes(3 * MB))
+    path = write(tmp_path / "data.csv", bytes(content), mtime_ns = 10 ** 18)
+    key = cache.key(path)
+    content[offset] ^= 0xff
+    write(path, bytes(content), mtime_ns = 10 ** 18)
+    assert (cache.key(path) != key) == detected
+
+
+def test_sampled_checksum_of_a_small_file(tmp_path):
+    path = write(tmp_path / "data.csv", b"a,b\n1,2\n")
+    assert sampled_checksum(path, os.path.getsize(path)) == sampled_checksum(path, os.path.getsize(path))
+    other = write(tmp_path / "other.csv", b"a,b\n1,3\n")
+    assert sampled_checksum(path, 8) != sampled_checksum(other, 8)
+
+
+def test_store_and_load(cache, tmp_path):
+    frame = pd.DataFrame({"x": [1.5, np.nan, 3.], "n": [1, 2, 3], "s": ["a", None, "c"]})
+    path = write(tmp_path / "data.csv", b"x,n,s\n")
+    cache.store(cache.key(path), frame, path)
+    loaded = cache.load(cache.key(path))
+    pd.testing.assert_frame_equal(loaded, frame)
+    assert cache.load("missing") is None
+
+
+def test_entries_larger_than_the_cache_are_not_stored(tmp_path):
+    cache = DatasetCache(str(tmp_path / "dataset_cache"), MB)
+    cache.store("large", pd.DataFrame({"x": np.zeros(MB // 4)}), "large.csv")
+    assert cache.load("large") is None
+    assert os.listdir(cache.directory) == []
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    frame = pd.DataFrame({"x": np.zeros(MB // 8)})
+    cache = DatasetCache(str(tmp_path / "dataset_cache"), 3 * MB)
+    for age, key in enumerate(["first", "second", "third"]):
+        cache.store(key, frame, f"{key}.csv")
+        # Stored from the oldest to the newest
+        metadata = os.path.join(cache.directory, key, "metadata.json")
+        os.utime(metadata, (1000 + age, 1000 + age))
+    # Reading the first entry makes it the most recently used
+    assert cache.load("first") is not None
+    cache.max_bytes = 2 * MB + MB // 2
+    cache.evict()
+    assert sorted(os.listdir(cache.directory)) == ["first", "third"]
+    cache.max_bytes = MB + MB // 2
+    cache.evict()
+    assert os.listdir(cache.directory) == ["first"]
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from joblib import Parallel, delayed
+
+from aiflib.executors import executor_for
+
+resource = pytest.importorskip("resource")
+
+
+def allocate(megabytes):
+    """Size of an array of `megabytes`, or the error allocating it."""
+    try:
+        return np.ones(megabytes << 17).nbytes >> 20
+    except MemoryError:
+        return "MemoryError"
+
+
+def soft_memory_limit():
+    return resource.getrlimit(resource.RLIMIT_AS)[0]
+
+
+def test_local_executor_limits_the_memory_of_its_workers():
+    with executor_for("local")(2, 1, 1024) as n_jobs:
+        assert n_jobs == 2
+        results = Parallel(n_jobs = n_jobs)(delayed(allocate)(megabytes) for megabytes in [16, 4096, 16])
+    assert results == [16, "MemoryError", 16]
+
+
+def test_memory_limit_ends_with_the_batch():
+    with executor_for("local")(2, 1, 1024) as n_jobs:
+        assert set(Parallel(n_jobs = n_jobs)(delayed(soft_memory_limit)() for _ in range(4))) == {1024 << 20}
+    # The same reused loky workers, without the limit
+    assert 1024 << 20 not in Parallel(n_jobs = 2, backend = "loky")(delayed(soft_memory_limit)() for _ in range(4))
@@ -0,0 +1,37 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aiflib.formats import CSV, CSV_GZIP, CSV_ZSTD, PARQUET, write_frame
+from aiflib.readers import reader_for
+
+# The optional package each split format and checksum needs, from optional_requirements.txt
+OPTIONAL = {CSV_ZSTD: "zstandard", PARQUET: "pyarrow", "xxhash": "xxhash"}
+
+
+def frame(n_rows):
+    rng = np.random.RandomState(0)
+    return pd.DataFrame({"x": rng.randn(n_rows), "n": np.arange(n_rows), "y": rng.randn(n_rows)})
+
+
+def read(path):
+    return pd.concat(list(reader_for(path)(path, None, None, None)), ignore_index = True)
+
+
+@pytest.mark.parametrize("file_format", [CSV, CSV_GZIP, CSV_ZSTD, PARQUET])
+@pytest.mark.parametrize("checksum", ["md5", "xxhash"])
+def test_split_round_trip(tmp_path, file_format, checksum):
+    for name in {OPTIONAL.get(file_format), OPTIONAL.get(checksum)} - {None}:
+        pytest.importorskip(name)
+    data = frame(1000)
+    rows = np.arange(0, 1000, 3)
+    path = str(tmp_path / f"train.{file_format}")
+    digest = write_frame(data, path, file_format = file_format, checksum = checksum, rows = rows)
+    pd.testing.assert_frame_equal(read(path), data.iloc[rows].reset_index(drop = True), check_exact = False)
+    # The digest is that of the bytes of the file
+    if checksum == "md5":
+        with open(path, "rb") as infile:
+            assert digest == hashlib.md5(infile.read()).hexdigest()
+    assert write_frame(data, path, file_format = file_format, checksum = checksum, rows = rows) == digest
@@ -0,0 +1,94 @@
+import warnings
+
+import numpy as np
+import pytest
+from deap import creator
+
+from aiflib.halving import HalvingTPOTRegressor, promote, rung_budgets
+
+CONFIG = {
+    "sklearn.linear_model.RidgeCV": {},
+    "sklearn.tree.DecisionTreeRegressor": {"max_depth": range(1, 6), "min_samples_leaf": range(1, 21)},
+    "sklearn.neighbors.KNeighborsRegressor": {"n_neighbors": range(1, 50)},
+    "sklearn.preprocessing.StandardScaler": {},
+}
+
+
+@pytest.mark.parametrize("n_rows, factor, min_rows, expected", [
+    (10000, 3, 1000, [1111, 3333, 10000]),
+    (9000, 3, 1000, [1000, 3000, 9000]),
+    (8999, 3, 1000, [2999, 8999]),
+    (500, 3, 1000, [500]),
+    (100, 2, 10, [12, 25, 50, 100]),
+])
+def test_rung_budgets(n_rows, factor, min_rows, expected):
+    assert rung_budgets(n_rows, factor, min_rows) == expected
+
+
+def test_promote_keeps_the_best_fraction_rounded_up():
+    assert promote([0.1, 0.5, 0.3, 0.2], 2) == [1, 2]
+    assert promote([0.1, 0.5, 0.3, 0.2, 0.4], 2) == [1, 2, 4]
+    assert promote([0.1, 0.5, 0.3], 3) == [1]
+
+
+def test_promote_never_promotes_failed_pipelines():
+    assert promote([-np.inf, 0.5, -np.inf, -np.inf], 2) == [1]
+    assert promote([-np.inf, -np.inf], 2) == []
+    assert promote([], 3) == []
+
+
+@pytest.fixture(scope = "module")
+def searched():
+    rng = np.random.RandomState(0)
+    X = rng.randn(3000, 5)
+    y = X[:, 0] * 3 + np.sin(X[:, 1] * 2) + 0.1 * rng.randn(3000)
+    regressor = HalvingTPOTRegressor(
+        halving_factor = 3, halving_min_rows = 300, generations = 2, population_size = 12, cv = 3,
+        random_state = 0, n_jobs = 1, verbosity = 0, config_dict = CONFIG)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        regressor.fit(X, y)
+    return regressor, X, y
+
+
+def test_fit_scores_the_promoted_pipelines_on_all_rows(searched):
+    regressor, X, y = searched
+    scored = {ind_str: stats for ind_str, stats in regressor.evaluated_individuals_.items()
+              if "halving_rung" not in stats and np.isfinite(stats["internal_cv_score"])}
+    assert scored
+    assert regressor.fitted_pipeline_.predict(X[:10]).shape == (10,)
+    assert str(regressor._optimized_pipeline) in scored
+
+
+def test_dropped_pipelines_get_the_worst_fitness(searched):
+    regressor, _, _ = searched
+    dropped = {ind_str: stats for ind_str, stats in regressor.evaluated_individuals_.items()
+               if "halving_rung" in stats}
+    assert dropped
+    for stats in dropped.values():
+        assert stats["operator_count"] == 5000.
+        assert stats["internal_cv_score"] == -np.inf
+        # Below the last rung, with the score reached there kept apart
+        assert stats["halving_rung"] < len(rung_budgets(3000, 3, 300)) - 1
+        assert isinstance(stats["halving_score"], float)
+    assert not set(dropped) & {str(ind) for ind in regressor._pareto_front.items}
+
+
+def test_dropped_pipelines_lose_in_later_generations(searched):
+    regressor, X, y = searched
+    dropped = next(ind_str for ind_str, stats in regressor.evaluated_individuals_.items()
+                   if "halving_rung" in stats)
+    # Coming up again, the pipeline keeps its fitness instead of being evaluated on all rows
+    individual = creator.Individual.from_string(dropped, regressor._pset)
+    regressor._evaluate_individuals([individual], X, y)
+    assert individual.fitness.values == (5000., -np.inf)
+    assert dropped not in {str(ind) for ind in regressor._pareto_front.items}
+
+
+
+def test_cross_validation_time_of_every_pipeline_is_its_own(searched):
+    regressor, _, _ = searched
+    seconds = [stats["cv_seconds"] for stats in regressor.evaluated_individuals_.values() if "cv_seconds" in stats]
+    # Measured for each pipeline, not shared equally among those of a generation
+    assert len(seconds) > 12 and all(value > 0 for value in seconds)
+    assert len(set(seconds)) == len(seconds)
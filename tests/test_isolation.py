@@ -0,0 +1,91 @@
+import os
+import time
+from time import perf_counter
+
+import numpy as np
+import pytest
+from joblib import Parallel, delayed, parallel_backend
+
+from aiflib.isolation import SupervisedBackend, SupervisedPool
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason = "needs /proc")
+
+
+def pid():
+    return os.getpid()
+
+
+def hold(megabytes, seconds):
+    """Allocate and touch `megabytes`, then keep them for `seconds`."""
+    data = np.ones(megabytes << 17)
+    time.sleep(seconds)
+    return data.size
+
+
+def fail(seconds):
+    time.sleep(seconds)
+    raise ValueError("failed evaluation")
+
+
+@pytest.fixture
+def pool():
+    pool = SupervisedPool(2, max_seconds = 2., max_bytes = 400 << 20)
+    yield pool
+    pool.close()
+
+
+def run(pool, *tasks):
+    with parallel_backend(SupervisedBackend(pool), n_jobs = pool.workers):
+        return Parallel(batch_size = 1)(tasks)
+
+
+def test_results_come_back_in_order(pool):
+    assert run(pool, delayed(pow)(2, 3), delayed(hold)(1, 0.), delayed(pow)(3, 2)) == [8, 1 << 17, 9]
+
+
+def test_workers_are_reused(pool):
+    pids = run(pool, *[delayed(pid)() for _ in range(6)])
+    assert len(set(pids)) <= 2
+    assert pool.killed == []
+
+
+def test_task_past_max_seconds_is_a_timeout(pool):
+    start = perf_counter()
+    assert run(pool, delayed(time.sleep)(60), delayed(pow)(2, 3)) == ["Timeout", 8]
+    assert perf_counter() - start < 30
+    killed, = pool.killed
+    assert killed["reason"] == "time"
+    assert 2. <= killed["seconds"] < 30
+    assert "sleep" in killed["task"]
+
+
+def test_task_past_max_bytes_scores_minus_infinity(pool):
+    assert run(pool, delayed(hold)(800, 60), delayed(pow)(2, 3)) == [-np.inf, 8]
+    killed, = pool.killed
+    assert killed["reason"] == "memory"
+    assert killed["memory_mb"] > 400
+    assert "hold" in killed["task"]
+
+
+def test_killed_worker_is_replaced(pool):
+    before = {worker.process.pid for worker in pool._workers}
+    run(pool, delayed(time.sleep)(60))
+    after = {worker.process.pid for worker in pool._workers}
+    assert len(after) == 2
+    assert len(before - after) == 1
+    assert all(worker.process.is_alive() for worker in pool._workers)
+    # The replacement runs the next tasks
+    assert run(pool, delayed(pow)(2, 3), delayed(pow)(3, 2)) == [8, 9]
+
+
+def test_failed_task_aborts_the_running_ones(pool):
+    pool.max_seconds = None
+    start = perf_counter()
+    with pytest.raises(ValueError, match = "failed evaluation"):
+        # joblib retrieves the results in order, the failure comes first
+        run(pool, delayed(fail)(0.5), delayed(time.sleep)(60), delayed(time.sleep)(60))
+    assert perf_counter() - start < 30
+    # Aborted tasks are not reported as killed at a limit, their workers are replaced
+    assert pool.killed == []
+    assert all(worker.task is None for worker in pool._workers)
+    assert run(pool, delayed(pow)(2, 3)) == [8]
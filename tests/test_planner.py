@@ -0,0 +1,160 @@
+import copy
+
+import numpy as np
+import pytest
+
+from aiflib.config import Config
+from aiflib.planner import (
+    FAST_ICA, KNN, NYSTROEM, ONE_HOT_ENCODER, POLYNOMIAL_FEATURES, ZERO_COUNT, fold_rows, plan_search_space)
+from aiflib.profiling import ProfileCache, fingerprint, n_unique, profile_data, profile_rows
+
+
+@pytest.fixture(scope = "module")
+def config_dict():
+    return Config().classifier_config_dict
+
+
+def profile(n_rows = 1000, n_features = 5, **columns):
+    """Profile of data whose columns all have the same statistics, those of `columns` overridden."""
+    result = {
+        "n_rows": n_rows,
+        "n_features": n_features,
+        "n_unique": [100] * n_features,
+        "zero_rate": [0.1] * n_features,
+        "min": [0.] * n_features,
+    }
+    result.update(columns)
+    return result
+
+
+def planned(config_dict, data_profile, cv = 5, subsample = 1.0):
+    planned_dict, changes = plan_search_space(config_dict, data_profile, cv, subsample)
+    return planned_dict, dict(changes)
+
+
+def test_nothing_is_pruned_for_small_dense_data(config_dict):
+    planned_dict, changes = planned(config_dict, profile(n_unique = [5] + [100] * 4))
+    assert changes == {}
+    assert planned_dict.keys() == config_dict.keys()
+
+
+def test_config_dict_is_not_modified(config_dict):
+    original = copy.deepcopy(config_dict)
+    plan_search_space(config_dict, profile(n_rows = 20, n_features = 200, zero_rate = [0.] * 200), 5)
+    assert config_dict.keys() == original.keys()
+    assert list(config_dict[KNN]["n_neighbors"]) == list(original[KNN]["n_neighbors"])
+
+
+def test_fold_rows():
+    assert fold_rows({"n_rows": 1000}, 5) == 800
+    assert fold_rows({"n_rows": 1001}, 5) == 800
+    assert fold_rows({"n_rows": 1000}, 5, subsample = 0.5) == 400
+    assert fold_rows({"n_rows": 1000}, 5, subsample = 2.) == 800
+
+
+def test_knn_is_removed_above_the_row_limit(config_dict):
+    assert KNN in planned(config_dict, profile(n_rows = 100000))[0]
+    planned_dict, changes = planned(config_dict, profile(n_rows = 100001))
+    assert KNN not in planned_dict
+    assert changes[KNN].startswith("removed")
+
+
+def test_knn_neighbors_are_limited_to_the_rows_of_a_fold(config_dict):
+    planned_dict, changes = planned(config_dict, profile(n_rows = 50), cv = 5)
+    assert planned_dict[KNN]["n_neighbors"] == list(range(1, 41))
+    assert "n_neighbors limited to 1..40" in changes[KNN]
+
+
+def test_polynomial_features_are_removed_above_the_column_limit(config_dict):
+    assert POLYNOMIAL_FEATURES in planned(config_dict, profile(n_features = 50))[0]
+    assert POLYNOMIAL_FEATURES not in planned(config_dict, profile(n_features = 51))[0]
+
+
+def test_fast_ica_is_removed_above_the_column_limit(config_dict):
+    assert FAST_ICA in planned(config_dict, profile(n_features = 100))[0]
+    assert FAST_ICA not in planned(config_dict, profile(n_features = 101))[0]
+
+
+def test_nystroem_keeps_the_kernels_valid_for_negative_features(config_dict):
+    planned_dict, changes = planned(config_dict, profile(min = [0., -1., None, 2., 0.]))
+    kernels = planned_dict[NYSTROEM]["kernel"]
+    assert "chi2" not in kernels and "additive_chi2" not in kernels
+    assert "rbf" in kernels
+    assert "negative feature values" in changes[NYSTROEM]
+    assert planned(config_dict, profile(min = [0., None, 2., 0., 0.]))[0][NYSTROEM]["kernel"] == \
+        config_dict[NYSTROEM]["kernel"]
+
+
+@pytest.mark.parametrize("counts, kept", [
+    ([10] + [100] * 4, True),
+    ([2] + [100] * 4, True),
+    ([11] + [100] * 4, False),
+    ([1] * 5, False),
+])
+def test_one_hot_encoder_needs_a_column_within_its_threshold(config_dict, counts, kept):
+    # TPOT encodes the columns with at most `threshold` (10) distinct values
+    planned_dict, changes = planned(config_dict, profile(n_unique = counts))
+    assert (ONE_HOT_ENCODER in planned_dict) == kept
+    if not kept:
+        assert changes[ONE_HOT_ENCODER] == "removed, no column with 2 to 10 distinct values"
+
+
+def test_zero_count_needs_zeros(config_dict):
+    assert ZERO_COUNT in planned(config_dict, profile(zero_rate = [0.] * 4 + [0.01]))[0]
+    assert ZERO_COUNT not in planned(config_dict, profile(zero_rate = [0.] * 5))[0]
+
+
+def test_n_unique_counts_nan_apart():
+    sample = np.array([[1., np.nan, np.nan], [2., 5., np.nan], [1., 5., np.nan], [3., np.nan, np.nan]])
+    assert list(n_unique(sample)) == [3, 1, 0]
+    assert list(n_unique(np.empty((0, 2)))) == [0, 0]
+
+
+def test_n_unique_is_capped():
+    assert list(n_unique(np.arange(5000.)[:, None])) == [1001]
+
+
+def test_profile_rows_are_evenly_spaced():
+    X = np.arange(250000.)[:, None]
+    rows = profile_rows(X)
+    assert len(rows) <= 100000
+    assert rows[0, 0] == 0. and np.all(np.diff(rows[:, 0]) == 3.)
+    assert len(profile_rows(X[:1000])) == 1000
+
+
+def test_profile_data():
+    X = np.array([[0., 1.5, np.nan], [2., -1., np.nan], [0., 3., np.nan], [4., 1.5, np.nan]])
+    y = np.array([1., 2., 3., 4.])
+    result = profile_data(X, y)
+    assert result["n_rows"] == 4 and result["n_features"] == 3 and result["n_profiled_rows"] == 4
+    assert result["nan_rate"] == [0., 0., 1.]
+    assert result["zero_rate"] == [0.5, 0., 0.]
+    assert result["n_unique"] == [3, 3, 0]
+    assert result["integral"] == [True, False, True]
+    assert result["min"] == [0., -1., None]
+    assert result["max"] == [4., 3., None]
+    assert result["variance"][0] == pytest.approx(2.75) and result["variance"][2] is None
+    assert result["target_n_unique"] == 4
+    assert result["target_variance"] == pytest.approx(1.25)
+
+
+def test_fingerprint_depends_on_the_profiled_rows():
+    rng = np.random.RandomState(0)
+    X, y = rng.randn(100, 3), rng.randn(100)
+    changed = X.copy()
+    changed[50, 1] += 1.
+    assert fingerprint(X, y) == fingerprint(X.copy(), y.copy())
+    assert fingerprint(X, y) != fingerprint(changed, y)
+    assert fingerprint(X, y) != fingerprint(X[:99], y[:99])
+    assert fingerprint(X, y) != fingerprint(X.astype(np.float32), y)
+
+
+def test_profile_cache_stores_and_reloads(tmp_path):
+    rng = np.random.RandomState(0)
+    X, y = rng.randn(100, 3), rng.randn(100)
+    cache = ProfileCache(str(tmp_path / "dataset_profile"))
+    first = cache.profile(X, y)
+    assert first == profile_data(X, y)
+    stored, = (tmp_path / "dataset_profile").iterdir()
+    assert stored.name == f"{fingerprint(X, y)}.json"
+    assert cache.profile(X, y) == first
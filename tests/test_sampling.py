@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aiflib.data_manager import DataManager
+from aiflib.sampling import Reservoir, allocate, quantile_edges
+
+
+def frame(n_rows, seed = 0, start = 0):
+    """Rows with a unique id, a skewed target and a feature."""
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({"id": np.arange(start, start + n_rows, dtype = np.float64),
+                         "x": rng.randn(n_rows), "target": rng.lognormal(0, 1, n_rows)})
+
+
+def test_quantile_edges():
+    values = np.arange(100.)
+    np.testing.assert_allclose(quantile_edges(values, 4), [24.75, 49.5, 74.25])
+    # Tied quantiles are merged, NaN are ignored
+    assert list(quantile_edges(np.array([1., 1., 1., 1., 2., np.nan]), 4)) == [1.]
+    assert len(quantile_edges(values, 1)) == 0
+    assert len(quantile_edges(np.array([np.nan]), 4)) == 0
+
+
+def test_allocate_splits_the_rows_in_proportion():
+    quotas = allocate(10, [1, 1, 1])
+    assert quotas.sum() == 10 and sorted(quotas) == [3, 3, 4]
+    assert list(allocate(100, [50, 30, 20])) == [50, 30, 20]
+
+
+@pytest.mark.parametrize("n_rows, quota", [(100, 1000), (5000, 1000), (1000, 1000)])
+def test_sample_size_is_bounded_by_the_quota(n_rows, quota):
+    data = frame(n_rows)
+    keys = np.random.default_rng(0).random(n_rows)
+    reservoir = Reservoir([quota], "target")
+    # Added in chunks, as files are streamed
+    for start in range(0, n_rows, 300):
+        reservoir.add(data.iloc[start:start + 300], keys[start:start + 300])
+    sample = reservoir.sample()
+    assert len(sample) == min(n_rows, quota)
+    assert sample["id"].is_unique
+    # The rows with the smallest keys
+    assert set(sample["id"]) == set(data["id"][np.argsort(keys)[:quota]])
+
+
+def test_stratified_sample_fills_every_stratum_quota():
+    data = frame(20000)
+    edges = quantile_edges(data["target"].to_numpy(), 4)
+    quotas = [100, 200, 300, 400]
+    reservoir = Reservoir(quotas, "target", edges)
+    reservoir.add(data, np.random.default_rng(0).random(len(data)))
+    sample = reservoir.sample()
+    counts = np.bincount(np.searchsorted(edges, sample["target"], side = "right"), minlength = 4)
+    assert list(counts) == quotas
+
+
+def test_merged_reservoirs_hold_the_sample_of_all_the_rows():
+    data = frame(3000)
+    keys = np.random.default_rng(0).random(len(data))
+    whole = Reservoir([500], "target")
+    whole.add(data, keys)
+    merged = Reservoir([500], "target")
+    for start in (0, 1000, 2000):
+        part = merged.empty()
+        part.add(data.iloc[start:start + 1000], keys[start:start + 1000])
+        merged.merge(part)
+    assert set(merged.sample()["id"]) == set(whole.sample()["id"])
+
+
+def test_selection_contains_exactly_the_sampled_rows():
+    data = frame(5000)
+    keys = np.random.default_rng(0).random(len(data))
+    edges = quantile_edges(data["target"].to_numpy(), 5)
+    reservoir = Reservoir(allocate(800, [1] * 6), "target", edges)
+    reservoir.add(data, keys)
+    selection = reservoir.selection()
+    assert set(data["id"][selection.contains(data, keys)]) == set(reservoir.sample()["id"])
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    """Three csv files of 4000, 3000 and 5000 rows, sampled with the given configuration."""
+    directory = tmp_path / "data"
+    directory.mkdir()
+    frames = [frame(n_rows, seed, start) for seed, (n_rows, start) in enumerate([(4000, 0), (3000, 4000),
+                                                                                  (5000, 7000)])]
+    for i, part in enumerate(frames):
+        part.to_csv(directory / f"part{i}.csv", index = False)
+    monkeypatch.setenv("artifacts_directory", str(tmp_path))
+    monkeypatch.setenv("search_sample_rows", "1000")
+    monkeypatch.setenv("refit_sample_rows", "0")
+    monkeypatch.setenv("read_workers", "1")
+
+    def sampled(**options):
+        for name, value in options.items():
+            monkeypatch.setenv(name, str(value))
+        return DataManager(str(directory), sample = True)
+
+    return pd.concat(frames, ignore_index = True), sampled
+
+
+@pytest.mark.parametrize("search_sample", ["uniform", "stratified"])
+def test_search_sample_size(dataset, search_sample):
+    data, sampled = dataset
+    manager = sampled(search_sample = search_sample)
+    assert len(manager.get_data()) == 1000
+    assert manager.n_rows == len(data)
+    assert manager.get_refit_data() is None
+    # Fewer rows than the sample size: every row
+    manager = sampled(search_sample = search_sample, search_sample_rows = 50000)
+    assert sorted(manager.get_data()["id"]) == list(data["id"])
+
+
+def test_stratified_sample_keeps_the_target_quantiles(dataset):
+    data, sampled = dataset
+    manager = sampled(search_sample = "stratified", search_strata = 10)
+    sample = manager.get_data()["target"].to_numpy()
+    edges = quantile_edges(data["target"].to_numpy(), 10)
+    # As many rows of every decile of the target, up to the rounding of the quotas
+    counts = np.bincount(np.searchsorted(edges, sample, side = "right"), minlength = 10)
+    assert counts.min() >= 99 and counts.max() <= 101
+    np.testing.assert_allclose(np.quantile(sample, [0.1, 0.5, 0.9]),
+                               np.quantile(data["target"], [0.1, 0.5, 0.9]), rtol = 0.05)
+
+
+def test_sample_does_not_depend_on_the_read_workers(dataset):
+    _, sampled = dataset
+    first = sampled(search_sample = "stratified", read_workers = 1).get_data()
+    second = sampled(search_sample = "stratified", read_workers = 3).get_data()
+    pd.testing.assert_frame_equal(first, second)
+
+
+@pytest.mark.parametrize("search_sample, refit_sample_rows", [
+    ("uniform", 0), ("stratified", 0), ("uniform", 3000), ("stratified", 3000)])
+def test_unsampled_rows_are_the_rows_outside_the_fitted_sample(dataset, search_sample, refit_sample_rows):
+    data, sampled = dataset
+    manager = sampled(search_sample = search_sample, refit_sample_rows = refit_sample_rows)
+    fitted = manager.get_refit_data() if refit_sample_rows else manager.get_data()
+    assert len(fitted) == (refit_sample_rows or 1000)
+    unsampled = pd.concat(list(manager.iter_chunks()), ignore_index = True)
+    # Every row exactly once, in the sample or out of it
+    ids = np.concatenate([fitted["id"], unsampled["id"]])
+    assert sorted(ids) == list(data["id"])
+    if search_sample == "uniform":
+        # Drawn with the same keys, the search sample is nested in the refit sample
+        assert set(manager.get_data()["id"]) <= set(fitted["id"])
+
+
+def test_unsampled_rows_of_a_frame_kept_in_memory(dataset, tmp_path):
+    data, _ = dataset
+    manager = DataManager(str(tmp_path), sample = True, data = data)
+    unsampled = pd.concat(list(manager.iter_chunks()), ignore_index = True)
+    assert sorted(np.concatenate([manager.get_data()["id"], unsampled["id"]])) == list(data["id"])
+    assert len(manager.get_data()) == 1000
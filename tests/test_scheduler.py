@@ -0,0 +1,113 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from aiflib.scheduler import BudgetScheduler, ScheduledTPOTRegressor
+
+CONFIG = {
+    "sklearn.linear_model.RidgeCV": {},
+    "sklearn.tree.DecisionTreeRegressor": {"max_depth": range(1, 6), "min_samples_leaf": range(1, 21)},
+    "sklearn.preprocessing.StandardScaler": {},
+}
+
+
+def recorded(scheduler, generations):
+    """Record (minute, best score, best pipeline seconds) generations with a given elapsed time."""
+    for minute, best, seconds in generations:
+        scheduler.elapsed = lambda: minute * 60.
+        scheduler.record(best, seconds)
+    return scheduler
+
+
+def test_reserve_is_one_fit_of_the_best_pipeline_on_all_rows():
+    # 5-fold cross-validation: 5 fits on 4 / 5 of the rows each, as long as 4 fits on all rows
+    scheduler = recorded(BudgetScheduler(60, cv = 5), [(1, 0.5, 40.)])
+    assert scheduler.reserve_seconds() == pytest.approx(10.)
+    assert scheduler.search_minutes() == pytest.approx(60 - 10. / 60)
+    # Cross-validated on half of the rows, refitted on all of them and on 3 times more
+    scheduler = recorded(BudgetScheduler(60, cv = 5, subsample = 0.5, refit_scale = 3.), [(1, 0.5, 40.)])
+    assert scheduler.reserve_seconds() == pytest.approx(20. * 4)
+
+
+def test_reserve_follows_the_best_pipeline():
+    scheduler = recorded(BudgetScheduler(60, cv = 3), [(1, 0.5, 100.), (2, 0.6, 10.)])
+    assert scheduler.reserve_seconds() == pytest.approx(5.)
+    # Unknown time of the best pipeline, the last estimate is kept
+    recorded(scheduler, [(3, 0.7, None)])
+    assert scheduler.reserve_seconds() == pytest.approx(5.)
+
+
+def test_reserve_is_capped_at_half_of_the_budget():
+    scheduler = recorded(BudgetScheduler(2, cv = 2), [(1, 0.5, 1000.)])
+    assert scheduler.reserve_seconds() == pytest.approx(60.)
+    assert scheduler.search_minutes() == pytest.approx(1.)
+
+
+def test_no_reserve():
+    assert recorded(BudgetScheduler(60, reserve_refit = False), [(1, 0.5, 40.)]).reserve_seconds() == 0.
+    scheduler = recorded(BudgetScheduler(None), [(1, 0.5, 40.)])
+    assert scheduler.reserve_seconds() == 0.
+    assert scheduler.search_minutes() is None
+
+
+def test_gain_per_minute_over_the_window():
+    scheduler = recorded(BudgetScheduler(None, window = 2), [(0, 1.0, None), (1, 1.1, None)])
+    # Fewer generations than the window
+    assert scheduler.gain_per_min() is None
+    recorded(scheduler, [(4, 1.2, None)])
+    # 0.2 in 4 minutes, relative to the best score 1.2
+    assert scheduler.gain_per_min() == pytest.approx(0.2 / 1.2 / 4)
+    recorded(scheduler, [(5, 1.2, None)])
+    assert scheduler.gain_per_min() == pytest.approx(0.1 / 1.2 / 4)
+
+
+def test_gain_of_a_failed_generation_is_unknown():
+    scheduler = recorded(BudgetScheduler(None, window = 1), [(0, -np.inf, None), (1, 1.0, None)])
+    assert scheduler.gain_per_min() is None
+
+
+def test_stop_once_the_gain_per_minute_is_too_small():
+    generations = [(0, -2.0, None), (1, -1.0, None), (2, -0.99, None), (3, -0.989, None)]
+    scheduler = recorded(BudgetScheduler(None, min_gain_per_min = 0.005, window = 1), generations[:2])
+    # The score of negative scorers improves towards 0
+    assert scheduler.gain_per_min() == pytest.approx(1.)
+    assert scheduler.stop_reason() is None
+    recorded(scheduler, generations[2:3])
+    assert scheduler.stop_reason() is None
+    recorded(scheduler, generations[3:])
+    assert "improved by less than [0.005]" in scheduler.stop_reason()
+    # Never with min_gain_per_min = 0
+    assert recorded(BudgetScheduler(None, window = 1), generations).stop_reason() is None
+
+
+@pytest.fixture(scope = "module")
+def searched():
+    rng = np.random.RandomState(0)
+    X = rng.randn(1000, 5)
+    y = X[:, 0] * 3 + np.sin(X[:, 1] * 2) + 0.1 * rng.randn(1000)
+    scheduler = BudgetScheduler(60, cv = 3)
+    regressor = ScheduledTPOTRegressor(
+        scheduler = scheduler, generations = 2, population_size = 8, cv = 3, random_state = 0,
+        n_jobs = 1, verbosity = 0, config_dict = CONFIG)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        regressor.fit(X, y)
+    return regressor, scheduler
+
+
+def test_every_generation_is_recorded(searched):
+    regressor, scheduler = searched
+    assert len(scheduler.history) == 3
+    scores = [stats["internal_cv_score"] for stats in regressor.evaluated_individuals_.values()]
+    assert scheduler.history[-1][1] == pytest.approx(max(scores))
+
+
+def test_reserve_is_that_of_the_best_pipeline(searched):
+    regressor, scheduler = searched
+    evaluated = {ind_str: stats for ind_str, stats in regressor.evaluated_individuals_.items()
+                 if np.isfinite(stats["internal_cv_score"])}
+    assert all(stats["cv_seconds"] > 0 for stats in evaluated.values())
+    best = evaluated[str(regressor._optimized_pipeline)]
+    assert scheduler.fit_seconds == pytest.approx(best["cv_seconds"] / 2)
+    assert scheduler.reserve_seconds() == pytest.approx(best["cv_seconds"] / 2)
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+import pytest
+
+from aiflib.config import Config
+from aiflib.serving import BatchingPredictor, RequestTimeout, _handle_http
+
+
+class SumModel:
+    """Stand-in for Model: JSON rows in, the sum of every row out."""
+    input_schema = None
+
+    def __init__(self, seconds = 0., fail = False):
+        self.config = Config()
+        self.seconds = seconds
+        self.fail = fail
+        self.batches = []
+
+    def decode_input(self, payload):
+        return np.asarray(json.loads(payload), dtype = np.float64)
+
+    def predict_array(self, data):
+        self.batches.append(len(data))
+        time.sleep(self.seconds)
+        if self.fail:
+            raise RuntimeError("model failed")
+        return data.sum(axis = 1)
+
+    def encode_output(self, predictions, output_format = None):
+        return json.dumps(predictions.tolist())
+
+    def cache_stats(self):
+        return None
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_requests_are_scored_in_one_batch():
+    async def scenario():
+        model = SumModel()
+        async with BatchingPredictor(model, max_batch_size = 100, max_wait_ms = 20, max_queue = 10,
+                                     timeout_ms = 1000) as predictor:
+            results = await asyncio.gather(*[predictor.predict(json.dumps([[i, 1.]])) for i in range(5)])
+        return model, results
+
+    model, results = run(scenario())
+    assert results == [json.dumps([i + 1.]) for i in range(5)]
+    assert model.batches == [5]
+
+
+def test_deadline_is_enforced_while_the_batch_runs():
+    async def scenario():
+        async with BatchingPredictor(SumModel(seconds = 1.), max_wait_ms = 0, timeout_ms = 100) as predictor:
+            start = time.perf_counter()
+            with pytest.raises(RequestTimeout):
+                await predictor.predict(json.dumps([[1., 2.]]))
+            return time.perf_counter() - start, predictor.metrics.expired
+
+    seconds, expired = run(scenario())
+    assert seconds < 0.5
+    assert expired == 1
+
+
+def test_request_of_another_width_fails_alone():
+    async def scenario():
+        async with BatchingPredictor(SumModel(), max_batch_size = 100, max_wait_ms = 20,
+                                     timeout_ms = 1000) as predictor:
+            results = await asyncio.gather(
+                predictor.predict_array(np.ones((2, 3))),
+                predictor.predict_array(np.ones((1, 2))),
+                predictor.predict_array(np.ones((1, 3))),
+                return_exceptions = True)
+            # The predictor keeps serving
+            after = await predictor.predict_array(np.ones((1, 2)))
+        return results, after
+
+    (wide, narrow, other), after = run(scenario())
+    np.testing.assert_array_equal(wide, [3., 3.])
+    assert isinstance(narrow, ValueError)
+    np.testing.assert_array_equal(other, [3.])
+    np.testing.assert_array_equal(after, [2.])
+
+
+def test_input_of_the_wrong_width_is_rejected_before_it_is_queued():
+    class SchemaModel(SumModel):
+        class input_schema:
+            columns = ["a", "b", "c"]
+
+    predictor = BatchingPredictor(SchemaModel())
+    with pytest.raises(ValueError, match = "columns"):
+        predictor.decode(json.dumps([[1., 2.]]))
+    with pytest.raises(ValueError, match = "table of rows"):
+        predictor.decode(json.dumps([1., 2., 3.]))
+
+
+class _Writer:
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def http_status(model, body):
+    async def scenario():
+        reader = asyncio.StreamReader()
+        reader.feed_data(f"POST /predict HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                         f"Connection: close\r\n\r\n".encode("latin-1") + body)
+        reader.feed_eof()
+        writer = _Writer()
+        async with BatchingPredictor(model, max_wait_ms = 0, timeout_ms = 1000) as predictor:
+            await _handle_http(predictor, reader, writer)
+        return writer.data.split(b"\r\n")[0].decode("latin-1")
+
+    return run(scenario())
+
+
+def test_http_status_of_the_prediction_errors():
+    assert http_status(SumModel(), b"[[1, 2]]") == "HTTP/1.1 200 OK"
+    assert http_status(SumModel(), b"[[1, 2") == "HTTP/1.1 400 Bad Request"
+    assert http_status(SumModel(fail = True), b"[[1, 2]]") == "HTTP/1.1 500 Internal Server Error"
+    assert http_status(SumModel(seconds = 2.), b"[[1, 2]]") == "HTTP/1.1 503 Service Unavailable"
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline, make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeRegressor
+
+from aiflib.compiler import compile_pipeline
+from aiflib.trees import FlatTreeEnsemble, TreeEnsemblePipeline
+
+MODELS = [
+    DecisionTreeRegressor(random_state = 0),
+    DecisionTreeRegressor(max_depth = 3, random_state = 0),
+    RandomForestRegressor(n_estimators = 20, random_state = 0),
+    RandomForestRegressor(n_estimators = 20, max_depth = 5, bootstrap = False, random_state = 0),
+    ExtraTreesRegressor(n_estimators = 20, random_state = 0),
+    ExtraTreesRegressor(n_estimators = 20, min_samples_leaf = 10, random_state = 0),
+    GradientBoostingRegressor(n_estimators = 30, random_state = 0),
+    GradientBoostingRegressor(n_estimators = 30, loss = "huber", subsample = 0.5, random_state = 0),
+    GradientBoostingRegressor(n_estimators = 30, loss = "lad", random_state = 0),
+    GradientBoostingRegressor(n_estimators = 30, init = "zero", random_state = 0),
+]
+
+
+def regression(n_rows, seed, nan_fraction = 0.05):
+    rng = np.random.RandomState(seed)
+    X = rng.randn(n_rows, 8) * rng.uniform(0.5, 20, 8)
+    y = np.sin(X[:, 0]) * 10 + X[:, 1] * X[:, 2] + 0.1 * rng.randn(n_rows)
+    X[rng.rand(n_rows, 8) < nan_fraction] = np.nan
+    return X, y
+
+
+def fitted(*steps):
+    X, y = regression(2000, 0)
+    # Same layout as Model.build_model: the imputer wraps the TPOT pipeline
+    return Pipeline([("nan_imputer", SimpleImputer(strategy = "median")),
+                     ("tpot_pipeline", make_pipeline(*steps))]).fit(X, y), X
+
+
+@pytest.mark.parametrize("model", MODELS, ids = lambda model: type(model).__name__)
+def test_flat_trees_match_scikit_learn(model):
+    X, y = regression(2000, 0, nan_fraction = 0.)
+    model.fit(X, y)
+    ensemble = FlatTreeEnsemble.from_estimator(model)
+    X_check, _ = regression(700, 1, nan_fraction = 0.)
+    # Features exactly on a threshold go left, as in scikit-learn
+    nodes = np.flatnonzero(ensemble.threshold < np.inf)[:len(X_check)]
+    X_check[np.arange(len(nodes)), ensemble.feature[nodes]] = ensemble.threshold[nodes].astype(np.float32)
+    np.testing.assert_allclose(ensemble.predict(X_check), model.predict(X_check), rtol = 1e-9, atol = 1e-9)
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 1 << 16])
+def test_prediction_does_not_depend_on_the_block_size(block_size):
+    X, y = regression(500, 0, nan_fraction = 0.)
+    model = RandomForestRegressor(n_estimators = 5, random_state = 0).fit(X, y)
+    ensemble = FlatTreeEnsemble.from_estimator(model)
+    np.testing.assert_allclose(ensemble.predict(X, block_size = block_size), model.predict(X), rtol = 1e-9)
+
+
+@pytest.mark.parametrize("model", MODELS[::2], ids = lambda model: type(model).__name__)
+def test_compiled_tree_pipeline_matches_scikit_learn(model):
+    pipeline, X = fitted(StandardScaler(), model)
+    compiled = compile_pipeline(pipeline, X[:1000])
+    assert isinstance(compiled, TreeEnsemblePipeline)
+    X_check, _ = regression(500, 1)
+    np.testing.assert_allclose(compiled.predict(X_check), pipeline.predict(X_check), rtol = 1e-6, atol = 1e-6)
+    assert compiled.predict(X_check[:1]).shape == (1,)
+
+
+def test_unsupported_init_estimator_is_not_compiled():
+    pipeline, X = fitted(GradientBoostingRegressor(n_estimators = 5, init = LinearRegression()))
+    assert compile_pipeline(pipeline, X[:1000]) is None
+
+
+def test_multiple_targets_are_not_flattened():
+    X, y = regression(200, 0, nan_fraction = 0.)
+    model = DecisionTreeRegressor(max_depth = 3).fit(X, np.stack([y, -y], axis = 1))
+    with pytest.raises(ValueError, match = "multiple targets"):
+        FlatTreeEnsemble.from_estimator(model)